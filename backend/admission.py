@@ -0,0 +1,274 @@
+"""Admission control for chat requests: a global concurrency limit with a
+bounded wait queue, and a token bucket per client.
+
+A chat that finds every slot busy waits in a FIFO queue for up to
+``queue_timeout`` seconds; when the queue is full or the wait runs out it is
+shed with 503, and a client over its rate is refused with 429. Both carry a
+``Retry-After`` estimate. The limiter is thread-safe and can be waited on
+from Flask's request threads and from the ASGI event loop alike.
+"""
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Mapping, Optional
+
+from metrics import REGISTRY
+
+SHED = REGISTRY.counter("chat_shed_total", "Chat requests refused by admission control", ["reason"])
+WAIT_SECONDS = REGISTRY.histogram(
+    "chat_admission_wait_seconds", "Time chats waited for a concurrency slot", ["outcome"]
+)
+
+
+class Overloaded(Exception):
+    """A request was refused; ``status`` is 429 or 503 and ``retry_after`` is in whole seconds."""
+
+    def __init__(self, reason: str, message: str, retry_after: int):
+        super().__init__(message)
+        self.reason = reason
+        self.status = 429 if reason == "rate_limited" else 503
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, wake: Callable[[], None]):
+        self.wake = wake
+        self.granted = False
+
+
+class Ticket:
+    """A held concurrency slot; ``release`` it (once is enough) when the chat ends."""
+
+    def __init__(self, limiter: "ConcurrencyLimiter", waited: float):
+        self.waited = waited
+        self._limiter = limiter
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter.release(time.monotonic() - self._started)
+
+
+class ConcurrencyLimiter:
+    """At most ``max_concurrency`` chats at once, ``max_queued`` more waiting.
+
+    Slots are handed to waiters in arrival order. ``max_concurrency`` of 0
+    admits everything (only counting what is in flight). Retry-After for a
+    shed request is the time the queue ahead of it would take to drain at
+    the recent average chat duration.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queued: int = 32, queue_timeout: float = 15.0):
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.admitted_after_wait = 0
+        self.shed = {"queue_full": 0, "timeout": 0}
+        self._average_seconds: Optional[float] = None
+        self._waiters: Deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _retry_after(self) -> int:
+        average = self._average_seconds or 1.0
+        slots = max(1, self.max_concurrency)
+        return max(1, min(60, math.ceil(average * (len(self._waiters) + 1) / slots)))
+
+    def _enter(self, wake: Callable[[], None]) -> Optional[_Waiter]:
+        """Take a free slot (None) or join the queue (the waiter); call with the lock held."""
+        if self.max_concurrency <= 0 or (self.in_flight < self.max_concurrency and not self._waiters):
+            self.in_flight += 1
+            return None
+        if len(self._waiters) >= self.max_queued:
+            self.shed["queue_full"] += 1
+            SHED.inc(reason="queue_full")
+            raise Overloaded(
+                "queue_full", f"Server busy: {len(self._waiters)} chats already waiting", self._retry_after()
+            )
+        waiter = _Waiter(wake)
+        self._waiters.append(waiter)
+        return waiter
+
+    def _withdraw(self, waiter: _Waiter) -> bool:
+        """Leave the queue; False if a slot was handed over in the meantime."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters.remove(waiter)
+            return True
+
+    def _timed_out(self, started: float):
+        waited = time.monotonic() - started
+        WAIT_SECONDS.observe(waited, outcome="timeout")
+        SHED.inc(reason="timeout")
+        with self._lock:
+            self.shed["timeout"] += 1
+            retry_after = self._retry_after()
+        raise Overloaded("timeout", f"Server busy: no chat slot freed up within {waited:.0f}s", retry_after)
+
+    def _admitted(self, started: float, waited_in_queue: bool) -> Ticket:
+        waited = time.monotonic() - started
+        WAIT_SECONDS.observe(waited, outcome="admitted")
+        with self._lock:
+            self.admitted += 1
+            self.admitted_after_wait += int(waited_in_queue)
+        return Ticket(self, waited)
+
+    def acquire(self) -> Ticket:
+        """Wait in the calling thread for a slot; raises ``Overloaded`` if none comes."""
+        started = time.monotonic()
+        event = threading.Event()
+        with self._lock:
+            waiter = self._enter(event.set)
+        if waiter is not None and not event.wait(self.queue_timeout) and self._withdraw(waiter):
+            self._timed_out(started)
+        return self._admitted(started, waiter is not None)
+
+    async def acquire_async(self) -> Ticket:
+        """Wait on the running event loop for a slot; raises ``Overloaded`` if none comes."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            # Slots are released from any thread
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        started = time.monotonic()
+        with self._lock:
+            waiter = self._enter(wake)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(granted, self.queue_timeout)
+            except asyncio.TimeoutError:
+                if self._withdraw(waiter):
+                    self._timed_out(started)
+            except asyncio.CancelledError:
+                if not self._withdraw(waiter):
+                    self.release(None)
+                raise
+        return self._admitted(started, waiter is not None)
+
+    def release(self, seconds: Optional[float]):
+        """Free a slot, handing it straight to the longest waiter if there is one."""
+        with self._lock:
+            if seconds is not None:
+                self._average_seconds = (
+                    seconds if self._average_seconds is None else 0.8 * self._average_seconds + 0.2 * seconds
+                )
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "admitted": self.admitted,
+                "admitted_after_wait": self.admitted_after_wait,
+                "shed": dict(self.shed),
+                "average_seconds": round(self._average_seconds or 0.0, 3),
+            }
+
+
+class ClientRateLimiter:
+    """Token bucket per client: bursts of ``burst`` requests, refilled at ``per_minute``.
+
+    ``per_minute`` of 0 disables the limit. Only the ``max_clients`` most
+    recently seen clients are tracked; a forgotten client starts again with
+    a full bucket.
+    """
+
+    def __init__(self, per_minute: float = 30.0, burst: int = 10, max_clients: int = 10000):
+        self.per_minute = per_minute
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self.rejected = 0
+        self._buckets: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def check(self, client: str) -> float:
+        """Take a token for ``client``: 0.0 if it had one, else seconds until it will."""
+        if self.per_minute <= 0:
+            return 0.0
+        rate = self.per_minute / 60
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+                self.rejected += 1
+            # Re-inserted so the dict stays ordered by last use
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.pop(next(iter(self._buckets)))
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        return {"per_minute": self.per_minute, "burst": self.burst,
+                "clients_tracked": len(self._buckets), "rejected": self.rejected}
+
+
+def client_id(headers: Mapping[str, str], remote_addr: Optional[str],
+              key_header: str = "", trust_proxy: bool = False) -> str:
+    """Rate limit key for a request: its API key header if configured and present, else its address.
+
+    API keys are hashed so they are never kept in memory. ``X-Forwarded-For``
+    is only believed behind a trusted proxy.
+    """
+    key = headers.get(key_header) if key_header else None
+    if key:
+        if key_header.lower() == "authorization" and key.lower().startswith("bearer "):
+            key = key[7:].strip()
+        return "key:" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    forwarded = headers.get("X-Forwarded-For") if trust_proxy else None
+    if forwarded:
+        return "ip:" + forwarded.split(",")[0].strip()
+    return "ip:" + (remote_addr or "unknown")
+
+
+class AdmissionControl:
+    """Rate check per client, then a concurrency slot, for each chat."""
+
+    def __init__(self, limiter: ConcurrencyLimiter, rate_limiter: ClientRateLimiter):
+        self.limiter = limiter
+        self.rate_limiter = rate_limiter
+
+    def check_rate(self, client: str):
+        """Spend one of ``client``'s tokens; raises ``Overloaded`` (429) if it has none."""
+        wait = self.rate_limiter.check(client)
+        if wait > 0:
+            SHED.inc(reason="rate_limited")
+            raise Overloaded(
+                "rate_limited", f"Rate limit of {self.rate_limiter.per_minute:g} chats per minute exceeded",
+                math.ceil(wait)
+            )
+
+    def admit(self, client: str) -> Ticket:
+        self.check_rate(client)
+        return self.limiter.acquire()
+
+    async def admit_async(self, client: str) -> Ticket:
+        self.check_rate(client)
+        return await self.limiter.acquire_async()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"concurrency": self.limiter.stats(), "rate_limit": self.rate_limiter.stats()}
@@ -1,11 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import asyncio
+import atexit
+import contextlib
 import json
 import logging
 import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+from together.types.chat_completions import FunctionCall, ToolCalls
 from together_client import TogetherAIClient
 from mcp_client import MCPWebScraperClient
+from admission import AdmissionControl, ClientRateLimiter, ConcurrencyLimiter, Overloaded, client_id
+from compaction import CHUNK_SUMMARY_PROMPT, ContentCompactor
+from conversations import HISTORY_SUMMARY_PROMPT, ConversationStore
+from fingerprints import (
+    FingerprintStore,
+    changed_since,
+    content_hash,
+    extract_urls,
+    hamming,
+    normalize_question,
+    simhash,
+)
+from job_queue import FINISHED, JobQueue, JobStore, QueueFull
+from metrics import REGISTRY, Histogram, RequestTimer
+from prefetch import ScrapePrefetch, prefetchable
+from router import ScrapeRouter
+from scrape_cache import canonicalize_url
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,14 +36,146 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+# Tool calls from one assistant turn run concurrently, up to this many at once
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "4"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "90"))  # seconds
+
+# Tool results are compacted to fit this many (estimated) prompt tokens in total
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "true").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+COMPACTION_CHUNK_TOKENS = int(os.getenv("COMPACTION_CHUNK_TOKENS", "3000"))
+COMPACTION_CONCURRENCY = int(os.getenv("COMPACTION_CONCURRENCY", "4"))
+
+# Repeat questions about an unchanged page reuse the stored summary
+FINGERPRINT_ENABLED = os.getenv("FINGERPRINT_ENABLED", "true").lower() == "true"
+FINGERPRINT_DB = os.getenv(
+    "FINGERPRINT_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "fingerprints.sqlite3")
+)
+FINGERPRINT_MAX_AGE = float(os.getenv("FINGERPRINT_MAX_AGE", "86400"))  # seconds
+# SimHash bits that may differ for a page to count as nearly unchanged
+FINGERPRINT_NEAR_DUPLICATE_BITS = int(os.getenv("FINGERPRINT_NEAR_DUPLICATE_BITS", "3"))
+
+# Server-side history of chats that send a session_id
+CONVERSATION_DB = os.getenv(
+    "CONVERSATION_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "conversations.sqlite3")
+)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "8000"))
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "6"))  # older turns are summarized
+CONVERSATION_RETENTION = float(os.getenv("CONVERSATION_RETENTION", "604800"))  # seconds idle
+
+# Plain "summarize <url>" messages skip the model's tool selection
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+ROUTER_MAX_URLS = int(os.getenv("ROUTER_MAX_URLS", "20"))  # keep within the server's SCRAPE_MANY_MAX_URLS
+
+# Scrape the message's URLs while the first LLM call decides on tools
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_MAX_URLS = int(os.getenv("PREFETCH_MAX_URLS", "2"))  # messages with more URLs are not prefetched
+
+# Background chat jobs (/jobs)
+JOB_DB = os.getenv(
+    "JOB_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "jobs.sqlite3")
+)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))  # per priority lane
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "86400"))  # seconds a finished job is kept
+JOB_LEASE = float(os.getenv("JOB_LEASE", "60"))  # seconds before a silent worker's job is taken over
+JOB_EVENT_POLL = 0.1  # seconds between checks for new job events
+
+# Admission control for /chat and /chat/stream: chats in flight, waiting, and per-client rate
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "8"))  # 0 disables the limit
+CHAT_MAX_QUEUED = int(os.getenv("CHAT_MAX_QUEUED", "32"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "15"))  # seconds a chat may wait for a slot
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))  # per client; 0 disables
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+RATE_LIMIT_KEY_HEADER = os.getenv("RATE_LIMIT_KEY_HEADER", "")  # e.g. X-API-Key; empty keys clients by address
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+
+# Chats slower than this many seconds log their stage breakdown (0 disables)
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))
+
 # Initialize clients
 together_client = TogetherAIClient()
+# Shared by every request; server sessions are spawned lazily and kept warm
 mcp_client = MCPWebScraperClient()
+atexit.register(mcp_client.close)
+REGISTRY.gauge("mcp_pool_queued", "MCP calls waiting for a pooled session",
+               lambda: mcp_client.stats()["queued"])
+
+admission = AdmissionControl(
+    ConcurrencyLimiter(CHAT_MAX_CONCURRENCY, CHAT_MAX_QUEUED, CHAT_QUEUE_TIMEOUT),
+    ClientRateLimiter(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+)
+REGISTRY.gauge("chat_in_flight", "Chats holding an admission slot", lambda: admission.limiter.in_flight)
+REGISTRY.gauge("chat_queued", "Chats waiting for an admission slot", lambda: admission.limiter.queued)
+
+async def summarize_chunk(chunk: str) -> str:
+    """Map step of compaction: condense one chunk of a large page"""
+    response = await together_client.achat_with_tools([
+        {"role": "system", "content": CHUNK_SUMMARY_PROMPT},
+        {"role": "user", "content": chunk}
+    ])
+    return response.choices[0].message.content or ""
+
+async def summarize_history(summary: str, turns: str) -> str:
+    """Fold old conversation turns into the session's running summary"""
+    response = await together_client.achat_with_tools([
+        {"role": "system", "content": HISTORY_SUMMARY_PROMPT},
+        {"role": "user", "content": f"Earlier summary:\n{summary or '(none)'}\n\nNew turns:\n{turns}"}
+    ])
+    return response.choices[0].message.content or ""
+
+conversation_store = ConversationStore(
+    CONVERSATION_DB,
+    summarize_history,
+    budget=HISTORY_TOKEN_BUDGET,
+    max_turns=HISTORY_MAX_TURNS
+)
+conversation_store.purge(time.time() - CONVERSATION_RETENTION)
+
+fingerprint_store = FingerprintStore(FINGERPRINT_DB, FINGERPRINT_MAX_AGE) if FINGERPRINT_ENABLED else None
+
+router = ScrapeRouter(enabled=ROUTER_ENABLED, max_urls=ROUTER_MAX_URLS)
+
+job_queue = JobQueue(
+    JobStore(JOB_DB, lease=JOB_LEASE),
+    # Streamed so readers of /jobs/<id>/events see the reply as it is written
+    run=lambda message, session_id: chat_events(message, mcp_client, session_id=session_id),
+    workers=JOB_WORKERS,
+    max_queued=JOB_MAX_QUEUED,
+    retention=JOB_RETENTION
+)
+atexit.register(job_queue.close)
+REGISTRY.gauge("jobs_queued", "Background chat jobs waiting for a worker",
+               lambda: sum(job_queue.queued.values()))
+REGISTRY.gauge("jobs_running", "Background chat jobs being processed", lambda: job_queue.running)
+
+compactor = ContentCompactor(
+    summarize_chunk,
+    token_budget=CONTEXT_TOKEN_BUDGET,
+    chunk_tokens=COMPACTION_CHUNK_TOKENS,
+    concurrency=COMPACTION_CONCURRENCY
+)
 
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy"}), 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for the backend and its pooled MCP servers"""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+def render_metrics() -> str:
+    """Backend metrics plus the servers' metrics as of their last health check"""
+    external = []
+    for server in mcp_client.stats().get("servers", []):
+        for snapshot in (server.get("server_stats") or {}).get("metrics", []):
+            external.append(({"server": str(server["index"])}, Histogram.from_snapshot(snapshot)))
+    return REGISTRY.render(external)
+
 @app.route('/debug/mcp', methods=['GET'])
 def debug_mcp():
     """Debug MCP connection"""
@@ -40,7 +194,14 @@ async def test_mcp_connection_no_cleanup():
         return {
             "status": "success",
             "tools_count": len(tools),
-            "tools": [t['function']['name'] for t in tools]
+            "tools": [t['function']['name'] for t in tools],
+            "tool_cache": mcp_client.tool_cache_stats(),
+            "pool": mcp_client.stats(),
+            "scrape_breakers": mcp_client.breaker_states(),
+            "scrape_responses": mcp_client.response_stats(),
+            "fingerprints": fingerprint_store.stats() if fingerprint_store else None,
+            "jobs": job_queue.stats(),
+            "conversations": conversation_store.stats()
         }
     except Exception as e:
         return {
@@ -53,11 +214,14 @@ def debug_together():
     try:
         # Test Together AI connection
         test_messages = [{"role": "user", "content": "Hello, can you respond?"}]
-        response = together_client.chat_with_tools(test_messages)
+        # ?refresh=1 skips the completion cache to test the connection itself
+        response = together_client.chat_with_tools(test_messages, cache=not request.args.get('refresh'))
         return jsonify({
             "status": "success",
             "model": together_client.model,
-            "response": response.choices[0].message.content
+            "response": response.choices[0].message.content,
+            "cached": bool(getattr(response, "cached", False)),
+            "completion_cache": together_client.cache_stats()
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -66,11 +230,14 @@ def debug_together():
 def debug_tools():
     """Debug available MCP tools"""
     try:
+        if request.args.get('refresh'):
+            asyncio.run(mcp_client.tools.refresh())
         tools = asyncio.run(mcp_client.get_available_tools())
         return jsonify({
             "status": "success",
             "tools_count": len(tools),
-            "tools": tools
+            "tools": tools,
+            "tool_cache": mcp_client.tool_cache_stats()
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -78,23 +245,126 @@ def debug_tools():
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
-        local_mcp_client = MCPWebScraperClient()
         data = request.json
         user_message = data.get('message', '')
         
         if not user_message:
             return jsonify({"error": "No message provided"}), 400
         
+        try:
+            ticket = admission.admit(request_client())
+        except Overloaded as e:
+            return overloaded_response(e)
+        
         logger.info(f"Processing chat message: {user_message[:100]}...")
         
         # Run async chat processing
-        result = asyncio.run(process_chat(user_message, local_mcp_client))
+        try:
+            result = asyncio.run(process_chat(user_message, mcp_client, data.get('session_id')))
+        finally:
+            ticket.release()
         return jsonify(result)
         
     except Exception as e:
         logger.error(f"Chat error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream progress events and reply tokens as newline-delimited JSON"""
+    data = request.json or {}
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+    
+    try:
+        ticket = admission.admit(request_client())
+    except Overloaded as e:
+        return overloaded_response(e)
+    
+    logger.info(f"Streaming chat message: {user_message[:100]}...")
+    response = Response(
+        stream_with_context(iterate_events(chat_events(user_message, mcp_client, session_id=data.get('session_id')))),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Hold the slot until the stream ends or the client goes away
+    response.call_on_close(ticket.release)
+    return response
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a chat to run in the background and return its id immediately"""
+    data = request.json or {}
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+    
+    try:
+        # Jobs have their own workers and queue, but count against the client's rate
+        admission.check_rate(request_client())
+        job = submit_job(user_message, data.get('priority', 'normal'), data.get('session_id'))
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "5"}
+    return jsonify(job), 202, {"Location": f"/jobs/{job['id']}"}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of a background chat, with its result once finished"""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def get_job_events(job_id):
+    """Stream a background chat's events as newline-delimited JSON"""
+    if job_queue.store.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    after = request.args.get('after', 0, type=int)
+    follow = request.args.get('follow', 'true').lower() == 'true'
+    return Response(
+        stream_with_context(job_event_lines(job_id, after, follow)),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def request_client() -> str:
+    return client_id(request.headers, request.remote_addr, RATE_LIMIT_KEY_HEADER, RATE_LIMIT_TRUST_PROXY)
+
+def overloaded_response(e: Overloaded):
+    logger.info(f"Chat refused ({e.reason}): {e}")
+    return jsonify({"error": str(e), "reason": e.reason}), e.status, {"Retry-After": str(e.retry_after)}
+
+def submit_job(user_message: str, priority: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    logger.info(f"Queueing {priority} priority chat job: {user_message[:100]}...")
+    return job_queue.submit(user_message, priority, session_id)
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """Forget a conversation's stored history"""
+    if not conversation_store.delete(session_id):
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify({"status": "deleted", "session_id": session_id})
+
+def job_event_lines(job_id: str, after: int = 0, follow: bool = True) -> Iterator[str]:
+    """Job events after sequence number ``after``; with ``follow``, until the job finishes"""
+    while True:
+        # Read the status first so no event written before it finished is missed
+        finished = job_queue.store.get(job_id)["status"] in FINISHED
+        for event in job_queue.store.events(job_id, after):
+            after = event["seq"]
+            yield json.dumps(event) + "\n"
+        if finished or not follow:
+            return
+        time.sleep(JOB_EVENT_POLL)
+
 async def test_mcp_connection():
     """Test MCP server connection"""
     try:
@@ -111,53 +381,289 @@ async def test_mcp_connection():
             "error": str(e)
         }
 
-async def process_chat(user_message: str, mcp_client: MCPWebScraperClient):
-    """Process chat message with MCP tools"""
+def single_url_question(user_message: str):
+    """(url, normalized question) when the message is about exactly one page"""
+    urls = extract_urls(user_message)
+    if fingerprint_store is None or len(set(urls)) != 1:
+        return None, None
+    return urls[0], normalize_question(user_message)
+
+def compare_with_summary(previous: Dict[str, Any], content: str) -> Dict[str, Any]:
+    """How far a freshly scraped page has moved from the one last summarized"""
+    summarized_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(previous["updated_at"]))
+    if content_hash(content) == previous["content_hash"]:
+        return {"status": "unchanged", "distance": 0, "summarized_at": summarized_at, "changed_since": ""}
+    distance = hamming(simhash(content), previous["simhash"])
+    status = "near_duplicate" if distance <= FINGERPRINT_NEAR_DUPLICATE_BITS else "changed"
+    return {
+        "status": status,
+        "distance": distance,
+        "summarized_at": summarized_at,
+        "changed_since": changed_since(previous["content"], content)
+    }
+
+def is_default_scrape(tool_call, url: str) -> bool:
+    """Whether a tool call scrapes url with the output format the fingerprints use"""
+    if tool_call.function.name != "scrape_url":
+        return False
     try:
+        args = json.loads(tool_call.function.arguments or "{}")
+    except json.JSONDecodeError:
+        return False
+    return (
+        canonicalize_url(args.get("url", "")) == canonicalize_url(url)
+        and args.get("get_full_content", True) and args.get("only_main_content", True)
+    )
+
+async def remember_turn(session_id: str, user_message: str, reply: str, tool_results: List[tuple]):
+    """Store a finished turn; tool_results are (name, arguments, content sent to the LLM)"""
+    tools = []
+    for name, arguments, content in tool_results:
+        try:
+            url = json.loads(arguments or "{}").get("url")
+        except json.JSONDecodeError:
+            url = None
+        tools.append({"name": name, "arguments": arguments, "url": url, "content": content})
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, conversation_store.append, session_id, user_message, reply, tools)
+
+async def execute_tool_calls(tool_calls, mcp_client: MCPWebScraperClient,
+                             on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                             timer: Optional[RequestTimer] = None,
+                             prefetch: Optional[ScrapePrefetch] = None,
+                             fetched: Optional[Dict[str, str]] = None) -> List[str]:
+    """Run one turn's tool calls concurrently; results keep the model's order
+
+    Calls matching a speculative scrape in ``prefetch`` take over its result.
+    ``fetched`` maps canonical URLs to pages this request already scraped with
+    the default arguments; the first matching ``scrape_url`` call uses the page
+    instead of fetching it again.
+    """
+    fetched = dict(fetched or {})
+    semaphore = asyncio.Semaphore(TOOL_CALL_CONCURRENCY)
+    emit = on_event or (lambda event: None)
+    call_tool = prefetch.claim_call if prefetch is not None else mcp_client.call_tool
+    if timer is not None:
+        # Pool waits recorded inside the calls below count toward this request
+        timer.bind()
+
+    async def run_tool_call(index: int, tool_call) -> str:
+        tool_name = tool_call.function.name
+        try:
+            tool_args = json.loads(tool_call.function.arguments or "{}")
+        except json.JSONDecodeError as e:
+            return f"Error: invalid arguments for {tool_name}: {e}"
+
+        async with semaphore:
+            logger.info(f"Executing tool: {tool_name}")
+            emit({"event": "scrape_started", "index": index, "tool": tool_name, "url": tool_args.get("url")})
+            url = prefetchable(tool_name, tool_args)
+            try:
+                if url in fetched:
+                    result = fetched.pop(url)
+                else:
+                    with timer.stage("call_tool") if timer else contextlib.nullcontext():
+                        result = await asyncio.wait_for(
+                            call_tool(
+                                tool_name, tool_args,
+                                on_progress=lambda progress, total, message: emit({
+                                    "event": "tool_progress",
+                                    "index": index,
+                                    "tool": tool_name,
+                                    "progress": progress,
+                                    "total": total,
+                                    "message": message
+                                })
+                            ),
+                            TOOL_CALL_TIMEOUT
+                        )
+            except asyncio.TimeoutError:
+                logger.error(f"Tool {tool_name} timed out after {TOOL_CALL_TIMEOUT}s")
+                result = f"Error: {tool_name} timed out after {TOOL_CALL_TIMEOUT:.0f} seconds"
+            except Exception as e:
+                logger.error(f"Tool {tool_name} failed: {e}")
+                result = f"Error calling tool: {str(e)}"
+            emit({
+                "event": "scrape_finished",
+                "index": index,
+                "tool": tool_name,
+                "bytes": len(result.encode("utf-8")),
+                "error": result.startswith("Error")
+            })
+            return result
+
+    return await asyncio.gather(*(run_tool_call(i, tc) for i, tc in enumerate(tool_calls)))
+
+async def chat_events(user_message: str, mcp_client: MCPWebScraperClient,
+                      stream: bool = True, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Process a chat message, yielding progress events as they happen.
+
+    Yields ``tool_selected``, ``scrape_started`` and ``scrape_finished`` events
+    while tools run, ``token`` events for the reply text (streamed from Together
+    when ``stream`` is true), and always ends with a ``done`` event whose
+    ``result`` has the same shape as the ``/chat`` response.
+
+    With a ``session_id`` the session's earlier turns are replayed before the
+    message, and the finished turn is stored for the next one.
+    """
+    timer = RequestTimer(SLOW_REQUEST_SECONDS)
+    outcome = "cancelled"
+    prefetch = None
+    try:
+        # A repeat question about one page skips the LLM if the page has not moved
+        target_url, question = single_url_question(user_message)
+        previous = None
+        fingerprint = None
+        fetched = {}
+        if target_url:
+            loop = asyncio.get_running_loop()
+            previous = await loop.run_in_executor(None, fingerprint_store.get, target_url, question)
+        
+        # Start on the message's URLs now; a matching tool call picks the result up later.
+        # A page with a stored summary is revalidated below instead, bypassing the scrape cache
+        if PREFETCH_ENABLED and previous is None:
+            timer.bind()
+            prefetch = ScrapePrefetch(mcp_client.call_tool, extract_urls(user_message), PREFETCH_MAX_URLS)
+            prefetch.start()
+        call_tool = prefetch.claim_call if prefetch is not None else mcp_client.call_tool
+        
         # Get available MCP tools
-        tools = await mcp_client.get_available_tools()
+        with timer.stage("tool_discovery"):
+            tools = await mcp_client.get_available_tools()
         logger.info(f"Available tools: {[t['function']['name'] for t in tools]}")
         
         # Prepare messages for Together AI
         messages = [
             {
                 "role": "system", 
-                "content": "You are a helpful assistant that can scrape and summarize web content. When a user provides a URL or asks to scrape content, use the scrape_url tool. Always provide detailed summaries of the scraped content."
-            },
-            {
-                "role": "user",
-                "content": user_message
+                "content": "You are a helpful assistant that can scrape and summarize web content. When a user provides a URL or asks to scrape content, use the scrape_url tool. When several pages are needed, use scrape_many with all of the URLs in one call. To summarize a whole site or its documentation, use crawl_site. If earlier tool results in this conversation already hold the content needed, answer from them without calling a tool again. For follow-up questions about a page scraped before but not in this conversation, use search_scraped to retrieve just the relevant passages. Always provide detailed summaries of the scraped content."
             }
         ]
+        if session_id:
+            with timer.stage("history"):
+                messages.extend(await conversation_store.history(session_id))
+        messages.append({
+            "role": "user",
+            "content": user_message
+        })
         
-        # Send to Together AI with tools
-        response = together_client.chat_with_tools(messages, tools)
+        if previous is not None:
+            yield {"event": "scrape_started", "index": 0, "tool": "scrape_url", "url": target_url}
+            # A cached copy would match the stored summary even after the page changed
+            with timer.stage("call_tool"):
+                content = await call_tool("scrape_url", {"url": target_url, "force_refresh": True})
+            yield {
+                "event": "scrape_finished",
+                "index": 0,
+                "tool": "scrape_url",
+                "bytes": len(content.encode("utf-8")),
+                "error": content.startswith("Error")
+            }
+            if not content.startswith("Error"):
+                # A changed page is summarized from this copy rather than scraped again
+                fetched[canonicalize_url(target_url)] = content
+                fingerprint = compare_with_summary(previous, content)
+                logger.info(f"Stored summary for {target_url} is {fingerprint['status']} (distance {fingerprint['distance']})")
+                if fingerprint["status"] != "changed":
+                    reply = previous["summary"]
+                    if fingerprint["changed_since"]:
+                        reply += (
+                            f"\n\n_Minor changes since this summary was written ({fingerprint['summarized_at']}):_"
+                            f"\n```diff\n{fingerprint['changed_since']}\n```"
+                        )
+                    if stream:
+                        yield {"event": "token", "content": reply}
+                    if session_id:
+                        await remember_turn(session_id, user_message, reply, [
+                            ("scrape_url", json.dumps({"url": target_url}), content)
+                        ])
+                    outcome = "reused"
+                    yield {"event": "done", "result": {
+                        "response": reply,
+                        "tool_used": True,
+                        "tool_results": content,
+                        "fingerprint": fingerprint
+                    }}
+                    return
         
-        # Check if AI wants to call a tool
-        assistant_message = response.choices[0].message
+        # Plain scrape requests call the tool directly; the rest let the model choose
+        route = router.decide(user_message, tools, messages[1:-1])
+        router.record(route, messages, tools)
+        if route["tool"]:
+            logger.info(f"Routing directly to {route['tool']} ({route['reason']})")
+            tool_calls = [ToolCalls(
+                id="route_0",
+                type="function",
+                function=FunctionCall(name=route["tool"], arguments=json.dumps(route["arguments"]))
+            )]
+            assistant_content = ""
+        else:
+            # Send to Together AI with tools
+            started = time.perf_counter()
+            with timer.stage("llm_first"):
+                response = await together_client.achat_with_tools(messages, tools)
+            timer.add_usage(response)
+            
+            # Check if AI wants to call a tool
+            assistant_message = response.choices[0].message
+            tool_calls = assistant_message.tool_calls
+            assistant_content = assistant_message.content
+            if tool_calls:
+                router.observe_selection(time.perf_counter() - started)
         
-        if assistant_message.tool_calls:
-            logger.info(f"AI wants to call {len(assistant_message.tool_calls)} tools")
+        if tool_calls:
+            logger.info(f"AI wants to call {len(tool_calls)} tools")
+            yield {
+                "event": "tool_selected",
+                "routed": bool(route["tool"]),
+                "tools": [
+                    {"name": tc.function.name, "arguments": tc.function.arguments}
+                    for tc in tool_calls
+                ]
+            }
             
-            # Execute the tool calls
-            tool_results = []
-            for tool_call in assistant_message.tool_calls:
-                tool_name = tool_call.function.name
-                tool_args = json.loads(tool_call.function.arguments)
-                
-                logger.info(f"Executing tool: {tool_name}")
-                
-                # Call the MCP tool
-                tool_result = await mcp_client.call_tool(tool_name, tool_args)
-                tool_results.append(tool_result)
-                
-                # Add tool result to messages
-                messages.append({
-                    "role": "assistant",
-                    "content": assistant_message.content or "",
-                    "tool_calls": [tool_call.model_dump()]
-                })
-                
+            # Execute the tool calls concurrently, relaying their progress
+            progress: asyncio.Queue = asyncio.Queue()
+            tool_task = asyncio.ensure_future(
+                execute_tool_calls(tool_calls, mcp_client, progress.put_nowait, timer, prefetch, fetched)
+            )
+            try:
+                while not tool_task.done() or not progress.empty():
+                    next_event = asyncio.ensure_future(progress.get())
+                    await asyncio.wait({next_event, tool_task}, return_when=asyncio.FIRST_COMPLETED)
+                    if next_event.done():
+                        yield next_event.result()
+                    else:
+                        next_event.cancel()
+            finally:
+                # The consumer may stop listening mid-way (client disconnect)
+                if not tool_task.done():
+                    tool_task.cancel()
+            tool_results = tool_task.result()
+            if prefetch is not None:
+                await prefetch.aclose()
+            
+            # Shrink the results before they reach the prompt
+            llm_contents = tool_results
+            compaction = None
+            if COMPACTION_ENABLED:
+                with timer.stage("compaction"):
+                    compacted = await compactor.compact_all(tool_results)
+                llm_contents = compacted.pop("contents")
+                compaction = compacted
+                logger.info(
+                    f"Compacted tool results from ~{compaction['tokens_before']} "
+                    f"to ~{compaction['tokens_after']} tokens "
+                    f"({compaction['map_reduce_chunks']} chunks summarized)"
+                )
+            
+            # Add the assistant turn and its tool results in the model's order
+            messages.append({
+                "role": "assistant",
+                "content": assistant_content or "",
+                "tool_calls": [tool_call.model_dump() for tool_call in tool_calls]
+            })
+            for tool_call, tool_result in zip(tool_calls, llm_contents):
                 messages.append({
                     "role": "tool",
                     "tool_call_id": tool_call.id,
@@ -165,27 +671,103 @@ async def process_chat(user_message: str, mcp_client: MCPWebScraperClient):
                 })
             
             # Get final response from AI
-            final_response = together_client.chat_with_tools(messages)
+            with timer.stage("llm_final"):
+                if stream:
+                    parts = []
+                    async for token in together_client.astream_chat(messages, on_usage=timer.add_usage):
+                        parts.append(token)
+                        yield {"event": "token", "content": token}
+                    final_content = "".join(parts)
+                else:
+                    final_response = await together_client.achat_with_tools(messages)
+                    final_content = final_response.choices[0].message.content
+                    timer.add_usage(final_response)
             
-            return {
-                "response": final_response.choices[0].message.content,
+            result = {
+                "response": final_content,
                 "tool_used": True,
                 "tool_results": tool_results[0] if tool_results else ""
             }
+            if compaction is not None:
+                result["compaction"] = compaction
+            if route["tool"]:
+                result["routed"] = True
+            if (target_url and len(tool_results) == 1 and not tool_results[0].startswith("Error")
+                    and is_default_scrape(tool_calls[0], target_url)):
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(
+                    None, fingerprint_store.put, target_url, question, tool_results[0], final_content
+                )
+                result["fingerprint"] = fingerprint or {"status": "new"}
+            if session_id:
+                await remember_turn(session_id, user_message, final_content, [
+                    (tool_call.function.name, tool_call.function.arguments, content)
+                    for tool_call, content in zip(tool_calls, llm_contents)
+                ])
+            outcome = "routed" if route["tool"] else "tool"
+            yield {"event": "done", "result": result}
         else:
             logger.info("No tools called, returning direct response")
-            return {
-                "response": assistant_message.content,
+            if stream and assistant_content:
+                yield {"event": "token", "content": assistant_content}
+            if session_id:
+                await remember_turn(session_id, user_message, assistant_content, [])
+            outcome = "direct"
+            yield {"event": "done", "result": {
+                "response": assistant_content,
                 "tool_used": False
-            }
+            }}
             
     except Exception as e:
         logger.error(f"Error in process_chat: {e}")
-        return {
+        outcome = "error"
+        yield {"event": "done", "result": {
             "response": f"Sorry, I encountered an error: {str(e)}",
             "tool_used": False,
             "error": str(e)
-        }
+        }}
+    finally:
+        # Also runs when the consumer stops early (outcome stays "cancelled")
+        if prefetch is not None:
+            await prefetch.aclose()
+        timer.finish(outcome)
+
+async def process_chat(user_message: str, mcp_client: MCPWebScraperClient,
+                       session_id: Optional[str] = None):
+    """Process chat message with MCP tools"""
+    result = {}
+    async for event in chat_events(user_message, mcp_client, stream=False, session_id=session_id):
+        if event["event"] == "done":
+            result = event["result"]
+    return result
+
+def iterate_events(events: AsyncIterator[Dict[str, Any]]) -> Iterator[str]:
+    """Drive an async event generator on a private loop, yielding NDJSON lines"""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                event = loop.run_until_complete(events.__anext__())
+            except StopAsyncIteration:
+                break
+            yield json.dumps(event) + "\n"
+    finally:
+        # Also runs when the client disconnects mid-stream
+        loop.run_until_complete(events.aclose())
+        loop.close()
+
+def start_background():
+    """Warm the MCP pool and start the job workers, which also resume unfinished jobs.
+
+    Not done on import, so importing this module (asgi.py, benchmarks, tests)
+    starts nothing; a WSGI server should call it once per worker process.
+    Without it both still start lazily, on the first tool call and job.
+    """
+    mcp_client.warm_up()
+    job_queue.start()
 
 if __name__ == '__main__':
+    # Only the reloader's child process serves requests in debug mode
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background()
     app.run(debug=True, port=9000)
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""ASGI entry point serving the same routes as app.py from one long-lived event loop.
+
+Run with:  uvicorn asgi:app --port 9000   (from the backend/ directory)
+
+Unlike the Flask app, requests here never create their own event loop: chats
+share the MCP session pool and the async Together client, and a waiting chat
+holds no worker thread, so one process can keep many chats in flight.
+"""
+import json
+import logging
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from admission import Overloaded, Ticket, client_id
+from app import (
+    RATE_LIMIT_KEY_HEADER,
+    RATE_LIMIT_TRUST_PROXY,
+    admission,
+    chat_events,
+    conversation_store,
+    job_event_lines,
+    job_queue,
+    mcp_client,
+    process_chat,
+    render_metrics,
+    submit_job,
+    test_mcp_connection_no_cleanup,
+    together_client,
+)
+from job_queue import QueueFull
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    # The async Together client must be created on the loop that uses it
+    together_client.enable_async()
+    mcp_client.warm_up()
+    await run_in_threadpool(job_queue.start)
+    try:
+        yield
+    finally:
+        await run_in_threadpool(job_queue.close)
+        await mcp_client.cleanup()
+
+
+async def health_check(request: Request):
+    return JSONResponse({"status": "healthy"}, status_code=200)
+
+
+async def metrics(request: Request):
+    """Prometheus metrics for the backend and its pooled MCP servers"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+async def debug_mcp(request: Request):
+    """Debug MCP connection"""
+    try:
+        result = await test_mcp_connection_no_cleanup()
+        return JSONResponse(result, status_code=200)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def debug_together(request: Request):
+    """Debug Together AI connection"""
+    try:
+        test_messages = [{"role": "user", "content": "Hello, can you respond?"}]
+        # ?refresh=1 skips the completion cache to test the connection itself
+        response = await together_client.achat_with_tools(
+            test_messages, cache=not request.query_params.get('refresh')
+        )
+        return JSONResponse({
+            "status": "success",
+            "model": together_client.model,
+            "response": response.choices[0].message.content,
+            "cached": bool(getattr(response, "cached", False)),
+            "completion_cache": together_client.cache_stats()
+        }, status_code=200)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def debug_tools(request: Request):
+    """Debug available MCP tools"""
+    try:
+        if request.query_params.get('refresh'):
+            await mcp_client.tools.refresh()
+        tools = await mcp_client.get_available_tools()
+        return JSONResponse({
+            "status": "success",
+            "tools_count": len(tools),
+            "tools": tools,
+            "tool_cache": mcp_client.tool_cache_stats()
+        }, status_code=200)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+def request_client(request: Request) -> str:
+    remote_addr = request.client.host if request.client else None
+    return client_id(request.headers, remote_addr, RATE_LIMIT_KEY_HEADER, RATE_LIMIT_TRUST_PROXY)
+
+
+def overloaded_response(e: Overloaded) -> JSONResponse:
+    logger.info(f"Chat refused ({e.reason}): {e}")
+    return JSONResponse(
+        {"error": str(e), "reason": e.reason}, status_code=e.status, headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """Releases the chat's admission slot once the response is over, however it ends"""
+
+    def __init__(self, ticket: Ticket, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.ticket.release()
+
+
+async def chat(request: Request):
+    try:
+        data = await request.json()
+        user_message = data.get('message', '')
+
+        if not user_message:
+            return JSONResponse({"error": "No message provided"}, status_code=400)
+
+        try:
+            ticket = await admission.admit_async(request_client(request))
+        except Overloaded as e:
+            return overloaded_response(e)
+
+        logger.info(f"Processing chat message: {user_message[:100]}...")
+
+        try:
+            result = await process_chat(user_message, mcp_client, data.get('session_id'))
+        finally:
+            ticket.release()
+        return JSONResponse(result)
+
+    except Exception as e:
+        logger.error(f"Chat error: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def chat_stream(request: Request):
+    """Stream progress events and reply tokens as newline-delimited JSON"""
+    try:
+        data = await request.json()
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+    data = data or {}
+    user_message = data.get('message', '')
+
+    if not user_message:
+        return JSONResponse({"error": "No message provided"}, status_code=400)
+
+    try:
+        ticket = await admission.admit_async(request_client(request))
+    except Overloaded as e:
+        return overloaded_response(e)
+
+    logger.info(f"Streaming chat message: {user_message[:100]}...")
+
+    async def body():
+        async for event in chat_events(user_message, mcp_client, session_id=data.get('session_id')):
+            yield json.dumps(event) + "\n"
+
+    return AdmittedStreamingResponse(
+        ticket,
+        body(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def create_job(request: Request):
+    """Queue a chat to run in the background and return its id immediately"""
+    try:
+        data = await request.json()
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+    data = data or {}
+    user_message = data.get('message', '')
+
+    if not user_message:
+        return JSONResponse({"error": "No message provided"}, status_code=400)
+
+    try:
+        # Jobs have their own workers and queue, but count against the client's rate
+        admission.check_rate(request_client(request))
+        job = await run_in_threadpool(
+            submit_job, user_message, data.get('priority', 'normal'), data.get('session_id')
+        )
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except QueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": "5"})
+    return JSONResponse(job, status_code=202, headers={"Location": f"/jobs/{job['id']}"})
+
+
+async def get_job(request: Request):
+    """Status of a background chat, with its result once finished"""
+    job = await run_in_threadpool(job_queue.store.get, request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return JSONResponse(job)
+
+
+async def get_job_events(request: Request):
+    """Stream a background chat's events as newline-delimited JSON"""
+    job_id = request.path_params['job_id']
+    if await run_in_threadpool(job_queue.store.get, job_id) is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    try:
+        after = int(request.query_params.get('after', 0))
+    except ValueError:
+        after = 0
+    follow = request.query_params.get('follow', 'true').lower() == 'true'
+    # A plain iterator: Starlette steps it in a worker thread
+    return StreamingResponse(
+        job_event_lines(job_id, after, follow),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def delete_session(request: Request):
+    """Forget a conversation's stored history"""
+    session_id = request.path_params['session_id']
+    if not await run_in_threadpool(conversation_store.delete, session_id):
+        return JSONResponse({"error": "Session not found"}, status_code=404)
+    return JSONResponse({"status": "deleted", "session_id": session_id})
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/debug/mcp', debug_mcp, methods=['GET']),
+        Route('/debug/together', debug_together, methods=['GET']),
+        Route('/debug/tools', debug_tools, methods=['GET']),
+        Route('/chat', chat, methods=['POST']),
+        Route('/chat/stream', chat_stream, methods=['POST']),
+        Route('/jobs', create_job, methods=['POST']),
+        Route('/jobs/{job_id}', get_job, methods=['GET']),
+        Route('/jobs/{job_id}/events', get_job_events, methods=['GET']),
+        Route('/sessions/{session_id}', delete_session, methods=['DELETE']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,152 @@
+"""Shrinks scraped page content before it is sent to the LLM."""
+import asyncio
+import hashlib
+import logging
+import math
+import re
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # rough average for English text with Llama tokenizers
+
+CHUNK_SUMMARY_PROMPT = (
+    "You condense one part of a longer web page. Keep every fact, figure, name, "
+    "date and heading that matters; drop navigation, boilerplate and repetition. "
+    "Reply with the condensed text only."
+)
+
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]*)\]\((?:[^()]|\([^)]*\))*\)")
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_LINK_ONLY_LINE = re.compile(r"^\s*(?:[-*+]|\d+\.)?\s*(?:\[[^\]]*\]\([^)]*\)[\s|·•,-]*)+$")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; good enough for budgeting, not for billing."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def strip_boilerplate(markdown: str) -> str:
+    """Remove images, link-only lines (menus, footers) and inline link targets."""
+    text = _HTML_COMMENT.sub("", markdown)
+    text = _IMAGE.sub("", text)
+    lines = [line for line in text.split("\n") if not _LINK_ONLY_LINE.match(line)]
+    text = _LINK.sub(r"\1", "\n".join(lines))
+    return _BLANK_RUNS.sub("\n\n", text).strip()
+
+
+def dedupe_blocks(markdown: str, min_chars: int = 20) -> str:
+    """Drop repeated paragraphs (cookie banners, repeated CTAs, sidebars)."""
+    seen = set()
+    kept = []
+    for block in markdown.split("\n\n"):
+        normalized = " ".join(block.lower().split())
+        if len(normalized) >= min_chars:
+            digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+        kept.append(block)
+    return "\n\n".join(kept)
+
+
+def split_chunks(text: str, chunk_tokens: int) -> List[str]:
+    """Split on paragraph boundaries into pieces of roughly chunk_tokens."""
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for block in text.split("\n\n"):
+        # Hard-split paragraphs that are larger than a chunk on their own
+        pieces = [block[i:i + max_chars] for i in range(0, len(block), max_chars)] or [block]
+        for piece in pieces:
+            if current and size + len(piece) > max_chars:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+class ContentCompactor:
+    """Fits tool results into a token budget.
+
+    Every result is cleaned (boilerplate stripped, repeated blocks removed).
+    Results still over budget are split into chunks that are summarized in
+    parallel by ``summarize``; the final completion then works from the chunk
+    summaries (map-reduce).
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str], Awaitable[str]],
+        token_budget: int = 6000,
+        chunk_tokens: int = 3000,
+        concurrency: int = 4,
+    ):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.chunk_tokens = chunk_tokens
+        self.concurrency = concurrency
+
+    async def compact(self, text: str, budget: Optional[int] = None) -> Dict:
+        """Return ``{"content", "tokens_before", "tokens_after", "chunks"}`` for one result."""
+        budget = budget or self.token_budget
+        tokens_before = estimate_tokens(text)
+        cleaned = dedupe_blocks(strip_boilerplate(text))
+        chunks = 0
+
+        if estimate_tokens(cleaned) > budget:
+            pieces = split_chunks(cleaned, self.chunk_tokens)
+            chunks = len(pieces)
+            cleaned = await self._map_reduce(pieces, budget)
+
+        return {
+            "content": cleaned,
+            "tokens_before": tokens_before,
+            "tokens_after": estimate_tokens(cleaned),
+            "chunks": chunks,
+        }
+
+    async def compact_all(self, texts: List[str]) -> Dict:
+        """Compact several tool results sharing one budget; errors pass through."""
+        budget = max(1, self.token_budget // max(1, len(texts)))
+        results = await asyncio.gather(*(
+            self.compact(text, budget) if not text.startswith("Error") else self._passthrough(text)
+            for text in texts
+        ))
+        return {
+            "contents": [r["content"] for r in results],
+            "tokens_before": sum(r["tokens_before"] for r in results),
+            "tokens_after": sum(r["tokens_after"] for r in results),
+            "map_reduce_chunks": sum(r["chunks"] for r in results),
+        }
+
+    async def _passthrough(self, text: str) -> Dict:
+        tokens = estimate_tokens(text)
+        return {"content": text, "tokens_before": tokens, "tokens_after": tokens, "chunks": 0}
+
+    async def _map_reduce(self, pieces: List[str], budget: int) -> str:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def summarize_piece(piece: str) -> str:
+            async with semaphore:
+                try:
+                    return await self.summarize(piece)
+                except Exception as e:
+                    # Fall back to the raw piece's opening rather than losing it
+                    logger.warning(f"Chunk summary failed: {e}")
+                    return piece[:len(piece) // 4]
+
+        summaries = await asyncio.gather(*(summarize_piece(piece) for piece in pieces))
+        combined = "\n\n".join(
+            f"[Part {i}/{len(pieces)}]\n{summary.strip()}" for i, summary in enumerate(summaries, 1)
+        )
+        max_chars = budget * CHARS_PER_TOKEN
+        if len(combined) > max_chars:
+            combined = combined[:max_chars] + "\n\n[... condensed content truncated]"
+        return combined
@@ -0,0 +1,212 @@
+"""Server-side chat history per session, compacted to fit a token budget."""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from compaction import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SUMMARY_PROMPT = (
+    "You maintain the running summary of a conversation between a user and an "
+    "assistant that scrapes and summarizes web pages. Merge the earlier summary "
+    "with the new turns. Keep the URLs discussed, what the user asked, and the "
+    "key facts of each answer. Reply with the updated summary only."
+)
+
+
+def tool_reference(tool: Dict[str, Any]) -> str:
+    """Stand-in for a tool result that no longer fits in the history budget."""
+    target = tool.get("url") or tool["name"]
+    scraped_at = time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(tool["at"]))
+    return (
+        f"[Result of {tool['name']} for {target} at {scraped_at} "
+        f"(~{estimate_tokens(tool['content'])} tokens) omitted from this history. "
+        f"Call the tool again if its content is needed.]"
+    )
+
+
+def turn_text(turn: Dict[str, Any]) -> str:
+    """User and assistant text of a turn, without tool payloads, for summarizing."""
+    tools = "".join(f"\n(Used {tool['name']} on {tool.get('url') or tool['arguments']})" for tool in turn["tools"])
+    return f"User: {turn['user']}{tools}\nAssistant: {turn['assistant']}"
+
+
+def render_history(summary: str, turns: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    """Chat messages replaying ``turns`` (oldest first) after the running summary.
+
+    Tool payloads are kept newest first while they fit in ``budget`` estimated
+    tokens; older ones are replaced with a short reference.
+    """
+    remaining = budget - estimate_tokens(summary) - sum(
+        estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"]) for turn in turns
+    )
+    keep = set()
+    for index in range(len(turns) - 1, -1, -1):
+        for position, tool in enumerate(turns[index]["tools"]):
+            cost = estimate_tokens(tool["content"])
+            if cost <= remaining:
+                keep.add((index, position))
+                remaining -= cost
+
+    messages: List[Dict[str, Any]] = []
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    for index, turn in enumerate(turns):
+        messages.append({"role": "user", "content": turn["user"]})
+        if turn["tools"]:
+            calls = [
+                {
+                    "id": f"history_{index}_{position}",
+                    "type": "function",
+                    "function": {"name": tool["name"], "arguments": tool["arguments"]}
+                }
+                for position, tool in enumerate(turn["tools"])
+            ]
+            messages.append({"role": "assistant", "content": None, "tool_calls": calls})
+            for position, tool in enumerate(turn["tools"]):
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": f"history_{index}_{position}",
+                    "content": tool["content"] if (index, position) in keep else tool_reference(tool)
+                })
+        messages.append({"role": "assistant", "content": turn["assistant"]})
+    return messages
+
+
+class ConversationStore:
+    """SQLite store of each session's turns plus a running summary of older ones.
+
+    ``history`` folds the oldest turns into the summary once a session has more
+    than ``max_turns`` turns, or its text alone exceeds ``budget``, so the
+    replayed history stays bounded however long the conversation runs.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        summarize: Callable[[str, str], Awaitable[str]],
+        budget: int = 8000,
+        max_turns: int = 6,
+    ):
+        self.path = path
+        self.summarize = summarize
+        self.budget = budget
+        self.max_turns = max(1, max_turns)
+        self.folds = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS session_turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                turn TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS session_turns_session ON session_turns (session_id, id);"""
+        )
+        self._db.commit()
+
+    def load(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._db.execute("SELECT summary FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            rows = self._db.execute(
+                "SELECT id, turn FROM session_turns WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+        return {
+            "summary": row[0] if row else "",
+            "turn_ids": [turn_id for turn_id, _ in rows],
+            "turns": [json.loads(turn) for _, turn in rows],
+        }
+
+    def append(self, session_id: str, user: str, assistant: str, tools: List[Dict[str, Any]]):
+        """Record one finished turn; ``tools`` holds name, arguments, url and content."""
+        now = time.time()
+        turn = {"user": user, "assistant": assistant or "", "tools": [{**tool, "at": now} for tool in tools]}
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (session_id, updated_at) VALUES (?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (session_id, now)
+            )
+            self._db.execute(
+                "INSERT INTO session_turns (session_id, turn) VALUES (?, ?)", (session_id, json.dumps(turn))
+            )
+            self._db.commit()
+
+    def _fold(self, session_id: str, summary: str, through_id: int):
+        with self._lock:
+            self._db.execute("UPDATE sessions SET summary = ? WHERE session_id = ?", (summary, session_id))
+            self._db.execute(
+                "DELETE FROM session_turns WHERE session_id = ? AND id <= ?", (session_id, through_id)
+            )
+            self._db.commit()
+        self.folds += 1
+
+    async def history(self, session_id: str) -> List[Dict[str, Any]]:
+        """Messages replaying the session so far, compacting it first if needed."""
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, self.load, session_id)
+        summary, turns, turn_ids = state["summary"], state["turns"], state["turn_ids"]
+
+        fold = max(0, len(turns) - self.max_turns)
+        text_tokens = estimate_tokens(summary) + sum(
+            estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"]) for turn in turns[fold:]
+        )
+        # Over budget on text alone: fold turns until the rest fits (the newest always stays)
+        while fold < len(turns) - 1 and text_tokens > self.budget:
+            text_tokens -= estimate_tokens(turns[fold]["user"]) + estimate_tokens(turns[fold]["assistant"])
+            fold += 1
+
+        if fold:
+            folded = "\n\n".join(turn_text(turn) for turn in turns[:fold])
+            try:
+                summary = await self.summarize(summary, folded)
+            except Exception as e:
+                # Keep the turns for the next attempt; replay what fits
+                logger.warning(f"Could not summarize history of session {session_id}: {e}")
+            else:
+                await loop.run_in_executor(None, self._fold, session_id, summary, turn_ids[fold - 1])
+                turns = turns[fold:]
+                logger.info(f"Folded {fold} turns of session {session_id} into its summary")
+
+        return render_history(summary, turns, self.budget)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+            self._db.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+            self._db.commit()
+        return bool(deleted)
+
+    def purge(self, older_than: float) -> int:
+        """Delete sessions idle since before ``older_than``."""
+        with self._lock:
+            stale = "SELECT session_id FROM sessions WHERE updated_at < ?"
+            self._db.execute(f"DELETE FROM session_turns WHERE session_id IN ({stale})", (older_than,))
+            deleted = self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (older_than,)).rowcount
+            self._db.commit()
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (sessions,) = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            (turns,) = self._db.execute("SELECT COUNT(*) FROM session_turns").fetchone()
+        return {"sessions": sessions, "turns": turns, "folds": self.folds}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,62 @@
+"""Deduplicating, prioritized URL frontier for site crawls."""
+import hashlib
+import heapq
+from typing import List, Tuple
+from urllib.parse import urlsplit
+
+from scrape_cache import canonicalize_url
+
+# Links to files the scrape API cannot turn into useful text
+SKIP_EXTENSIONS = (
+    ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico", ".css", ".js",
+    ".zip", ".gz", ".tar", ".mp3", ".mp4", ".avi", ".mov", ".woff", ".woff2", ".exe", ".dmg"
+)
+
+
+def site_host(url: str) -> str:
+    """Host used for the same-site check; a leading "www." is ignored."""
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class CrawlFrontier:
+    """Priority frontier with a visited set of 8-byte URL hashes.
+
+    Pages closer to the seed come first; at equal depth, links under the
+    seed's path and shorter paths win. Each canonical URL is queued once.
+    """
+
+    def __init__(self, seed: str):
+        self.host = site_host(seed)
+        self.seed_path = urlsplit(canonicalize_url(seed)).path.rstrip("/") + "/"
+        self._heap: List[Tuple[int, int, int, int, str]] = []
+        self._seen = set()
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, url: str, depth: int) -> bool:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or site_host(url) != self.host:
+            return False
+        if parts.path.lower().endswith(SKIP_EXTENSIONS):
+            return False
+        canonical = canonicalize_url(url)
+        digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).digest()
+        if digest in self._seen:
+            return False
+        self._seen.add(digest)
+        path = urlsplit(canonical).path
+        outside_seed = 0 if path.startswith(self.seed_path) or path + "/" == self.seed_path else 1
+        self._counter += 1
+        heapq.heappush(self._heap, (depth, outside_seed, path.count("/"), self._counter, url))
+        return True
+
+    def pop(self) -> Tuple[str, int]:
+        depth, _, _, _, url = heapq.heappop(self._heap)
+        return url, depth
+
+    @property
+    def seen(self) -> int:
+        return len(self._seen)
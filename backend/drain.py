@@ -0,0 +1,101 @@
+"""Graceful restarts for the networked scrape server.
+
+Tool results travel back on a streamed response, and the SSE layer ends every
+open stream as soon as uvicorn starts shutting down, so uvicorn's own graceful
+timeout cannot protect a scrape that is already running. ``InFlightRequests``
+counts the calls in progress and turns new ones away once draining starts;
+``DrainingServer`` delays uvicorn's shutdown until they have finished.
+"""
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+Scope = Dict[str, Any]
+ASGIApp = Callable[[Scope, Callable, Callable], Awaitable[None]]
+
+
+class InFlightRequests:
+    """ASGI middleware tracking HTTP requests in progress.
+
+    GET requests are long-lived event streams that never finish on their own,
+    so only other methods (the POSTs carrying tool calls) are counted. While
+    ``draining`` is set, every new request gets a 503 so clients reconnect to
+    another (or the restarted) server.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.active = 0
+        self.rejected = 0
+        self.draining = False
+
+    async def __call__(self, scope: Scope, receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.draining:
+            self.rejected += 1
+            await self._unavailable(send)
+            return
+        counted = scope["method"] != "GET"
+        if counted:
+            self.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if counted:
+                self.active -= 1
+
+    @staticmethod
+    async def _unavailable(send: Callable):
+        body = json.dumps({"error": "Scrape server is restarting"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"retry-after", b"1"),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that drains in-flight requests before shutting down.
+
+    The first SIGINT/SIGTERM starts draining; shutdown proceeds once no
+    request is in flight or ``drain_timeout`` seconds have passed. A second
+    signal shuts down immediately.
+    """
+
+    def __init__(self, config: uvicorn.Config, requests: InFlightRequests, drain_timeout: float = 30.0):
+        super().__init__(config)
+        self.requests = requests
+        self.drain_timeout = drain_timeout
+        self.drain_started: Optional[float] = None
+        self._exit_args: tuple = ()
+
+    def handle_exit(self, sig, frame):
+        if self.drain_started is not None:
+            super().handle_exit(sig, frame)
+            return
+        self.drain_started = time.monotonic()
+        self._exit_args = (sig, frame)
+        self.requests.draining = True
+        logger.info(f"Draining {self.requests.active} in-flight requests before shutdown")
+
+    async def on_tick(self, counter: int) -> bool:
+        if self.drain_started is not None and not self.should_exit:
+            waited = time.monotonic() - self.drain_started
+            if self.requests.active == 0 or waited >= self.drain_timeout:
+                if self.requests.active:
+                    logger.warning(f"Drain timed out after {waited:.1f}s with {self.requests.active} requests in flight")
+                super().handle_exit(*self._exit_args)
+        return await super().on_tick(counter)
@@ -0,0 +1,143 @@
+"""Content fingerprints and stored summaries for change detection on repeat questions."""
+import difflib
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from scrape_cache import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+URL_PATTERN = re.compile(r"https?://[^\s<>\"'`]+")
+_WORD = re.compile(r"\w+")
+SHINGLE_SIZE = 3
+
+
+def extract_urls(text: str) -> List[str]:
+    """URLs in a chat message, without trailing punctuation."""
+    return [url.rstrip(".,;:!?)]}") for url in URL_PATTERN.findall(text)]
+
+
+def normalize_question(message: str) -> str:
+    """The question with URLs, case and punctuation removed."""
+    return " ".join(_WORD.findall(URL_PATTERN.sub(" ", message).lower()))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word shingles; similar texts differ in few bits."""
+    words = _WORD.findall(text.lower())
+    shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def changed_since(old: str, new: str, max_lines: int = 40) -> str:
+    """Added and removed lines between two versions of a page, capped at max_lines."""
+    lines = [
+        line for line in difflib.unified_diff(old.splitlines(), new.splitlines(), lineterm="", n=0)
+        if line[:1] in "+-" and not line.startswith(("+++", "---")) and line[1:].strip()
+    ]
+    if len(lines) > max_lines:
+        lines = lines[:max_lines] + [f"... {len(lines) - max_lines} more changed lines"]
+    return "\n".join(lines)
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class FingerprintStore:
+    """SQLite table of the last summary per (URL, question) and the content it was written from.
+
+    The content is kept compressed so a later version of the page can be
+    diffed against it.
+    """
+
+    def __init__(self, path: str, max_age: float = 86400.0):
+        self.path = path
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                question TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                simhash INTEGER NOT NULL,
+                content BLOB NOT NULL,
+                summary TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(url: str, question: str) -> str:
+        return content_hash(f"{canonicalize_url(url)}\n{question}")
+
+    def get(self, url: str, question: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_hash, simhash, content, summary, updated_at FROM summaries WHERE key = ?",
+                (self.key(url, question),)
+            ).fetchone()
+        if row is None or time.time() - row[4] > self.max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {
+            "content_hash": row[0],
+            "simhash": row[1] % (1 << 64),
+            "content": zlib.decompress(row[2]).decode("utf-8"),
+            "summary": row[3],
+            "updated_at": row[4],
+        }
+
+    def put(self, url: str, question: str, content: str, summary: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.key(url, question), canonicalize_url(url), question, content_hash(content),
+                    _to_signed(simhash(content)), zlib.compress(content.encode("utf-8"), 6),
+                    summary, time.time()
+                )
+            )
+            self._db.commit()
+        self.writes += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM summaries").fetchone()
+        return {"entries": entries, "hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,45 @@
+"""Per-host politeness for fan-out scraping."""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+from urllib.parse import urlsplit
+
+
+class _HostState:
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+
+
+class HostLimiter:
+    """Caps concurrent requests per host and spaces out their start times.
+
+    ``per_host_concurrency`` requests may be in flight to one host at a time,
+    and consecutive requests to that host start at least ``min_interval``
+    seconds apart, which bounds the rate at 1 / min_interval per second.
+    """
+
+    def __init__(self, per_host_concurrency: int = 2, min_interval: float = 0.25):
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.min_interval = min_interval
+        self._hosts: Dict[str, _HostState] = {}
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        host = (urlsplit(url).hostname or "").lower()
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.per_host_concurrency)
+
+        async with state.semaphore:
+            async with state.lock:
+                loop = asyncio.get_running_loop()
+                delay = state.next_start - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                state.next_start = loop.time() + self.min_interval
+            yield
+
+    def stats(self) -> Dict[str, int]:
+        return {"hosts_seen": len(self._hosts)}
@@ -0,0 +1,490 @@
+"""Background chat jobs: a SQLite job store and a priority worker pool."""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+FINISHED = ("succeeded", "failed")
+
+
+async def coalesce_tokens(events: AsyncIterator[Dict[str, Any]], interval: float) -> AsyncIterator[Dict[str, Any]]:
+    """Merge runs of ``token`` events so at most one is emitted per ``interval`` seconds.
+
+    Other events pass through unchanged, after any tokens received before them.
+    """
+    loop = asyncio.get_running_loop()
+    pending: List[str] = []
+    emitted_at = loop.time()
+    async for event in events:
+        if event.get("event") == "token":
+            pending.append(event["content"])
+            if loop.time() - emitted_at < interval:
+                continue
+        if pending:
+            yield {"event": "token", "content": "".join(pending)}
+            pending.clear()
+            emitted_at = loop.time()
+        if event.get("event") != "token":
+            yield event
+    if pending:
+        yield {"event": "token", "content": "".join(pending)}
+
+
+class QueueFull(Exception):
+    """A priority lane already holds its maximum number of queued jobs."""
+
+    def __init__(self, priority: str, limit: int):
+        super().__init__(f"The {priority} priority queue is full ({limit} jobs waiting)")
+        self.priority = priority
+        self.limit = limit
+
+
+class JobStore:
+    """Jobs and their event logs in SQLite, so they outlive the process.
+
+    Several processes may share one database. A worker claims a job with
+    ``mark_running``, which gives it a lease of ``lease`` seconds that it must
+    ``renew`` while the job runs; a running job is only handed to another
+    worker once its lease has expired.
+    """
+
+    def __init__(self, path: str, lease: float = 60.0):
+        self.path = path
+        self.lease = lease
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                priority TEXT NOT NULL,
+                status TEXT NOT NULL,
+                message TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result TEXT,
+                session_id TEXT,
+                owner TEXT,
+                lease_until REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            );"""
+        )
+        # Job databases created before jobs could belong to a chat session
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "session_id" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN session_id TEXT")
+        # ... and before running jobs were leased to a worker
+        if "owner" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._db.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+        self._db.commit()
+
+    def create(self, message: str, priority: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        job = {
+            "id": uuid.uuid4().hex,
+            "priority": priority,
+            "status": "queued",
+            "message": message,
+            "session_id": session_id,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, priority, status, message, session_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job["id"], priority, "queued", message, session_id, job["created_at"])
+            )
+            self._db.commit()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, priority, status, message, created_at, started_at, finished_at, result,"
+                " (SELECT COUNT(*) FROM job_events WHERE job_id = jobs.id), session_id"
+                " FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "priority": row[1],
+            "status": row[2],
+            "message": row[3],
+            "session_id": row[9],
+            "created_at": row[4],
+            "started_at": row[5],
+            "finished_at": row[6],
+            "result": json.loads(row[7]) if row[7] else None,
+            "events": row[8],
+        }
+
+    def mark_running(self, job_id: str, owner: str) -> bool:
+        """Claim a queued job, or a running one whose lease expired; False if another worker has it."""
+        now = time.time()
+        with self._lock:
+            claimed = self._db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, owner = ?, lease_until = ?"
+                " WHERE id = ? AND (status = 'queued'"
+                " OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)))",
+                (now, owner, now + self.lease, job_id, now)
+            ).rowcount
+            self._db.commit()
+        return claimed == 1
+
+    def renew(self, job_id: str, owner: str) -> bool:
+        """Extend ``owner``'s lease on a running job; False if the lease was lost."""
+        with self._lock:
+            renewed = self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (time.time() + self.lease, job_id, owner)
+            ).rowcount
+            self._db.commit()
+        return renewed == 1
+
+    def finish(self, job_id: str, status: str, result: Dict[str, Any], owner: Optional[str] = None):
+        """Record a job's outcome; with ``owner``, only while that worker still holds the lease."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, lease_until = NULL"
+                " WHERE id = ? AND (? IS NULL OR owner = ?)",
+                (status, time.time(), json.dumps(result), job_id, owner, owner)
+            )
+            self._db.commit()
+
+    def append_event(self, job_id: str, seq: int, event: Dict[str, Any]):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO job_events VALUES (?, ?, ?)", (job_id, seq, json.dumps(event))
+            )
+            self._db.commit()
+
+    def restart_events(self, job_id: str) -> int:
+        """Clear the events of an interrupted run before the job runs again.
+
+        The cleared events are replaced by one ``restarted`` event, numbered
+        after them, which tells readers following the old run to start over.
+        Returns the last sequence number in use (0 for a job with no events).
+        """
+        with self._lock:
+            last = self._db.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM job_events WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+            if last:
+                self._db.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+                last += 1
+                self._db.execute(
+                    "INSERT INTO job_events VALUES (?, ?, ?)", (job_id, last, json.dumps({"event": "restarted"}))
+                )
+                self._db.commit()
+        return last
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Events with a sequence number above ``after``, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after)
+            ).fetchall()
+        return [{"seq": seq, **json.loads(event)} for seq, event in rows]
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Queued jobs, and running jobs whose worker stopped renewing its lease."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, priority FROM jobs WHERE status = 'queued'"
+                " OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)) ORDER BY created_at",
+                (time.time(),)
+            ).fetchall()
+        return [{"id": row[0], "priority": row[1]} for row in rows]
+
+    def release(self, owner: str) -> int:
+        """Give up ``owner``'s leases so its running jobs can be resumed at once."""
+        with self._lock:
+            released = self._db.execute(
+                "UPDATE jobs SET lease_until = NULL WHERE owner = ? AND status = 'running'", (owner,)
+            ).rowcount
+            self._db.commit()
+        return released
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs (and their events) that finished before ``older_than``."""
+        with self._lock:
+            stale = "SELECT id FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?"
+            self._db.execute(f"DELETE FROM job_events WHERE job_id IN ({stale})", (older_than,))
+            deleted = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?", (older_than,)
+            ).rowcount
+            self._db.commit()
+        return deleted
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobQueue:
+    """Runs chat jobs on a fixed set of workers sharing one event loop thread.
+
+    Jobs wait in a priority queue (``high`` before ``normal`` before ``low``,
+    first come first served within a lane). Each lane holds at most
+    ``max_queued`` waiting jobs; ``submit`` raises ``QueueFull`` beyond that.
+    ``run(message, session_id)`` must return an async iterator of chat events
+    whose last event is ``done``; every event is appended to the job's log as
+    it arrives, except that reply tokens are written in batches of up to
+    ``token_interval`` seconds.
+
+    Queues in several processes may share one store: each job is run by the
+    worker that claims it, and jobs whose worker died are picked up by the
+    next sweep of the store (every lease period) in any live process.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        run: Callable[[str, Optional[str]], AsyncIterator[Dict[str, Any]]],
+        workers: int = 2,
+        max_queued: int = 100,
+        retention: float = 86400.0,
+        token_interval: float = 0.1,
+    ):
+        self.store = store
+        self.run = run
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention = retention
+        self.token_interval = token_interval
+        self.queued = {priority: 0 for priority in PRIORITIES}
+        self.running = 0
+        self.completed = {status: 0 for status in FINISHED}
+        self.rejected = 0
+        self.reclaimed = 0
+        self.lost_leases = 0
+        # Identifies this queue's workers in the store's leases
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pending: set = set()  # job ids in this process's queue
+        self._order = itertools.count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()  # guards the counters
+        self._lifecycle_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker loop and queue jobs that are waiting or were abandoned by a dead worker."""
+        if self._thread is not None:
+            return
+        with self._lifecycle_lock:
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run_loop, name="job-workers", daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._start_workers(), self._loop).result()
+
+        purged = self.store.purge(time.time() - self.retention)
+        recovered = self._reclaim()
+        logger.info(
+            f"Started {self.workers} job workers; requeued {recovered} unfinished jobs, purged {purged}"
+        )
+
+    def _reclaim(self) -> int:
+        jobs = [job for job in self.store.unfinished() if job["id"] not in self._pending]
+        for job in jobs:
+            self._enqueue(job["id"], job["priority"])
+        return len(jobs)
+
+    async def _sweep(self):
+        """Pick up jobs whose worker stopped renewing its lease, in this or another process."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.store.lease)
+            try:
+                reclaimed = await loop.run_in_executor(None, self._reclaim)
+            except Exception as e:
+                logger.warning(f"Could not check for abandoned jobs: {e}")
+                continue
+            if reclaimed:
+                self.reclaimed += reclaimed
+                logger.info(f"Requeued {reclaimed} jobs abandoned by their worker")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    async def _start_workers(self):
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.ensure_future(self._worker(index)) for index in range(self.workers)]
+        self._sweeper = asyncio.ensure_future(self._sweep())
+
+    def submit(self, message: str, priority: str = "normal", session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Persist a job and queue it; returns the stored job."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}; expected one of {', '.join(PRIORITIES)}")
+        self.start()
+        with self._lock:
+            if self.queued[priority] >= self.max_queued:
+                self.rejected += 1
+                raise QueueFull(priority, self.max_queued)
+            self.queued[priority] += 1
+        job = self.store.create(message, priority, session_id)
+        with self._lock:
+            self._pending.add(job["id"])
+        self._loop.call_soon_threadsafe(
+            self._queue.put_nowait, (PRIORITIES[priority], next(self._order), job["id"], priority)
+        )
+        return job
+
+    def _enqueue(self, job_id: str, priority: str):
+        with self._lock:
+            self.queued[priority] += 1
+            self._pending.add(job_id)
+        self._loop.call_soon_threadsafe(
+            self._queue.put_nowait, (PRIORITIES[priority], next(self._order), job_id, priority)
+        )
+
+    async def _worker(self, index: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job_id, priority = await self._queue.get()
+            with self._lock:
+                self.queued[priority] -= 1
+                self._pending.discard(job_id)
+            try:
+                claimed = await loop.run_in_executor(None, self.store.mark_running, job_id, self.owner)
+            except Exception as e:
+                logger.error(f"Job {job_id} could not be claimed: {e}")
+                continue
+            if not claimed:
+                # Finished, or being run by a worker that still holds its lease
+                continue
+            with self._lock:
+                self.running += 1
+            try:
+                status = await self._execute(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} could not be recorded: {e}")
+                status = "failed"
+            finally:
+                with self._lock:
+                    self.running -= 1
+            if status is None:
+                self.lost_leases += 1
+                logger.warning(f"Job {job_id} stopped on worker #{index}: its lease was taken over")
+                continue
+            self.completed[status] += 1
+            logger.info(f"Job {job_id} {status} on worker #{index}")
+
+    async def _renew(self, job_id: str, job: asyncio.Task):
+        """Keep the job's lease alive; stop the job if another worker took it over."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.store.lease / 3)
+            try:
+                renewed = await loop.run_in_executor(None, self.store.renew, job_id, self.owner)
+            except Exception as e:
+                logger.warning(f"Could not renew the lease on job {job_id}: {e}")
+                continue
+            if not renewed:
+                job.cancel()
+                return
+
+    async def _execute(self, job_id: str) -> Optional[str]:
+        """Run a claimed job to completion; None if its lease was lost on the way."""
+        run = asyncio.ensure_future(self._run_job(job_id))
+        heartbeat = asyncio.ensure_future(self._renew(job_id, run))
+        try:
+            return await asyncio.shield(run)
+        except asyncio.CancelledError:
+            if run.cancelled():
+                # Stopped by _renew
+                return None
+            # The worker is shutting down; close() gives up the lease
+            run.cancel()
+            raise
+        finally:
+            heartbeat.cancel()
+
+    async def _run_job(self, job_id: str) -> str:
+        loop = asyncio.get_running_loop()
+        job = await loop.run_in_executor(None, self.store.get, job_id)
+        # A job resumed after a restart or an expired lease runs from the start again
+        seq = await loop.run_in_executor(None, self.store.restart_events, job_id)
+        result: Dict[str, Any] = {}
+        try:
+            async for event in coalesce_tokens(self.run(job["message"], job["session_id"]), self.token_interval):
+                seq += 1
+                await loop.run_in_executor(None, self.store.append_event, job_id, seq, event)
+                if event["event"] == "done":
+                    result = event["result"]
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            result = {"response": f"Sorry, I encountered an error: {e}", "tool_used": False, "error": str(e)}
+            seq += 1
+            await loop.run_in_executor(None, self.store.append_event, job_id, seq, {"event": "done", "result": result})
+        status = "failed" if result.get("error") else "succeeded"
+        await loop.run_in_executor(None, self.store.finish, job_id, status, result, self.owner)
+        return status
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": dict(self.queued),
+            "max_queued": self.max_queued,
+            "completed": dict(self.completed),
+            "rejected": self.rejected,
+            "reclaimed": self.reclaimed,
+            "lost_leases": self.lost_leases,
+        }
+
+    def close(self, timeout: float = 5.0):
+        """Stop the workers; jobs still queued or running resume on the next start."""
+        with self._lifecycle_lock:
+            if self._thread is None:
+                return
+            future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+            try:
+                future.result(timeout)
+            except Exception as e:
+                logger.warning(f"Job workers did not shut down cleanly: {e}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self._loop.close()
+            self._thread = None
+            self._loop = None
+            self._pending.clear()
+            self.queued = {priority: 0 for priority in PRIORITIES}
+            try:
+                self.store.release(self.owner)
+            except Exception as e:
+                logger.warning(f"Could not release job leases: {e}")
+
+    async def _shutdown(self):
+        tasks = self._workers + ([self._sweeper] if self._sweeper else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
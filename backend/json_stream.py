@@ -0,0 +1,237 @@
+"""Incremental JSON parsing that keeps only selected fields of a document.
+
+The scrape API returns one large JSON object, most of which (HTML, raw HTML,
+screenshots) the tools never read. ``JsonProjector`` is fed the response in
+chunks as it arrives and only builds the fields named in its projection;
+everything else is scanned and dropped. Kept strings are capped, so even a
+kept field cannot grow without bound.
+"""
+import codecs
+import json
+import re
+from typing import Any, Dict, Generator, List, Optional, Union
+
+# A projection maps object keys to True (keep the whole value) or to a nested
+# projection; keys that are not listed are skipped.
+Projection = Dict[str, Union[bool, "Projection"]]
+
+_STRING_BODY = re.compile(r'(?:[^"\\]+|\\.)*', re.DOTALL)
+_WHITESPACE = " \t\r\n"
+_SCALAR_END = re.compile(r"[,}\]\s]")
+
+
+def truncation_marker(detail: str) -> str:
+    return f"\n\n[... {detail}]"
+
+
+def _decode_string(raw: str) -> str:
+    """Decode the body of a JSON string; a cut-off trailing escape is dropped."""
+    while True:
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            cut = raw.rfind("\\")
+            if cut < 0:
+                raise
+            raw = raw[:cut]
+
+
+def _store(container: Union[Dict[str, Any], List[Any]], key: Optional[str], value: Any):
+    if isinstance(container, list):
+        container.append(value)
+    else:
+        container[key] = value
+
+
+class JsonProjector:
+    """Push parser for one JSON document that materializes only ``projection``.
+
+    Call ``feed`` with each chunk of bytes and ``finish`` at the end (or when
+    giving up early). ``finish`` returns whatever was kept so far; a kept
+    string that was cut off mid-way ends with a truncation marker.
+    """
+
+    def __init__(self, projection: Projection, max_string_chars: int = 1_000_000, max_items: int = 1000):
+        self.projection = projection
+        self.max_string_chars = max_string_chars
+        self.max_items = max_items
+        self.done = False
+        self.dropped_chars = 0
+        self.dropped_items = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._holder: Dict[str, Any] = {}
+        # The kept string being read, so a cut-off document can still return it
+        self._open_string: Optional[tuple] = None
+        self._parser = self._document()
+        next(self._parser)
+
+    def feed(self, data: bytes):
+        if self.done:
+            return
+        self._buf = self._buf[self._pos:] + self._decoder.decode(data)
+        self._pos = 0
+        self._resume()
+
+    def finish(self, note: str = "response truncated") -> Any:
+        """The projected document; a partial one, with ``note`` on the cut-off string, if incomplete."""
+        if not self.done:
+            self._eof = True
+            self._buf = self._buf[self._pos:] + self._decoder.decode(b"", final=True)
+            self._pos = 0
+            try:
+                self._resume()
+            except ValueError:
+                pass  # incomplete document; keep what was read
+        if not self.done and self._open_string is not None:
+            container, key, pieces = self._open_string
+            _store(container, key, _decode_string("".join(pieces)) + truncation_marker(note))
+            self._open_string = None
+        return self._holder.get("value")
+
+    def _resume(self):
+        try:
+            self._parser.send(None)
+        except StopIteration:
+            self.done = True
+
+    # Each parsing step is a generator that yields when it needs more input
+
+    def _document(self) -> Generator[None, None, None]:
+        yield
+        yield from self._value(self.projection, self._holder, "value")
+
+    def _peek(self) -> Generator[None, None, str]:
+        while True:
+            buf = self._buf
+            while self._pos < len(buf) and buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(buf):
+                return buf[self._pos]
+            if self._eof:
+                raise ValueError("Unexpected end of JSON document")
+            yield
+
+    def _expect(self, char: str) -> Generator[None, None, None]:
+        found = yield from self._peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} at offset {self._pos}, found {found!r}")
+        self._pos += 1
+
+    def _value(self, keep, container, key) -> Generator[None, None, None]:
+        char = yield from self._peek()
+        if char == "{":
+            yield from self._object(keep, container, key)
+        elif char == "[":
+            yield from self._array(keep, container, key)
+        elif char == '"':
+            yield from self._string(keep, container, key, self.max_string_chars)
+        else:
+            yield from self._scalar(keep, container, key)
+
+    def _object(self, keep, container, key) -> Generator[None, None, None]:
+        self._pos += 1
+        obj = None
+        if keep:
+            obj = {}
+            _store(container, key, obj)
+        if (yield from self._peek()) == "}":
+            self._pos += 1
+            return
+        while True:
+            name_holder: Dict[str, Any] = {}
+            if (yield from self._peek()) != '"':
+                raise ValueError(f"Expected an object key at offset {self._pos}")
+            yield from self._string(True, name_holder, "name", None)
+            name = name_holder["name"]
+            yield from self._expect(":")
+            child = None if not keep else (True if keep is True else keep.get(name))
+            yield from self._value(child, obj, name)
+            char = yield from self._peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or '}}' at offset {self._pos - 1}, found {char!r}")
+
+    def _array(self, keep, container, key) -> Generator[None, None, None]:
+        self._pos += 1
+        items = None
+        if keep:
+            items = []
+            _store(container, key, items)
+        if (yield from self._peek()) == "]":
+            self._pos += 1
+            return
+        count = 0
+        while True:
+            child = keep if count < self.max_items else None
+            if keep and child is None:
+                self.dropped_items += 1
+            yield from self._value(child, items, None)
+            count += 1
+            char = yield from self._peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' at offset {self._pos - 1}, found {char!r}")
+
+    def _string(self, keep, container, key, cap: Optional[int]) -> Generator[None, None, None]:
+        self._pos += 1
+        pieces: List[str] = []
+        kept = 0
+        dropped = 0
+        if keep:
+            self._open_string = (container, key, pieces)
+
+        def add(segment: str):
+            nonlocal kept, dropped
+            if not keep or not segment:
+                return
+            room = len(segment) if cap is None else max(0, cap - kept)
+            if room:
+                pieces.append(segment[:room])
+                kept += min(room, len(segment))
+            dropped += max(0, len(segment) - room)
+
+        while True:
+            buf = self._buf
+            # Everything up to the closing quote, or to the end of the buffer
+            end = _STRING_BODY.match(buf, self._pos).end()
+            add(buf[self._pos:end])
+            self._pos = end
+            if end < len(buf) and buf[end] == '"':
+                self._pos += 1
+                break
+            # Out of input (possibly just after a backslash, kept for the next chunk)
+            if self._eof:
+                raise ValueError("Unterminated string")
+            yield
+
+        if keep:
+            self._open_string = None
+            value = _decode_string("".join(pieces))
+            if dropped:
+                self.dropped_chars += dropped
+                value += truncation_marker(f"truncated {dropped} characters")
+            _store(container, key, value)
+
+    def _scalar(self, keep, container, key) -> Generator[None, None, None]:
+        # Scalars are short: rescan from their start until the end is buffered
+        while True:
+            match = _SCALAR_END.search(self._buf, self._pos)
+            if match is not None or self._eof:
+                end = match.start() if match is not None else len(self._buf)
+                token = self._buf[self._pos:end]
+                self._pos = end
+                break
+            yield
+        try:
+            value = json.loads(token)
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid JSON value {token[:20]!r}")
+        if keep:
+            _store(container, key, value)
@@ -0,0 +1,756 @@
+"""Local fetch-and-extract engine for static pages.
+
+Plain HTML pages do not need the scrape service's browser: ``LocalScraper``
+fetches them with the pooled HTTP client and turns them into the same
+``{"metadata", "markdown", "links"}`` data the scrape API returns. Parsing
+runs in a process pool so large pages do not stall the event loop.
+
+``ScrapePolicy`` decides per request which engine to use, and
+``route_scrape`` falls back to the scrape API when a page turns out to be
+rendered by JavaScript, blocked, or not HTML.
+"""
+import asyncio
+import ipaddress
+import logging
+import multiprocessing
+import re
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+import httpx
+
+from metrics import Histogram
+from scrape_http import CONNECT_TIMEOUT, POOL_TIMEOUT, WRITE_TIMEOUT, get_http_client, pool_stats
+
+logger = logging.getLogger(__name__)
+
+# Shipped to the backend's /metrics with the scrape server's other histograms
+LOCAL_SCRAPE_SECONDS = Histogram(
+    "scrape_local_seconds", "Local engine fetch and extraction time", ["outcome"]
+)
+
+ENGINES = ("remote", "local", "auto")
+# The only formats the local engine can produce
+LOCAL_FORMATS = {"markdown", "links"}
+# Scrape options that need the scrape service's browser
+BROWSER_OPTIONS = ("mobile", "waitFor", "includeRawHtml", "includeScreenshot", "actions")
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"
+}
+# Never content
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "object", "head", "select", "button"}
+# Page furniture dropped when only the main content is wanted
+BOILERPLATE_TAGS = {"nav", "header", "footer", "aside", "form", "dialog"}
+BOILERPLATE_PATTERN = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|footer|header|sidebar|breadcrumbs?|comments?|cookies?|consent|banner|"
+    r"advert|ads?|promo|share|social|related|popup|modal|newsletter|subscribe|skip)([\s_-]|$)",
+    re.IGNORECASE
+)
+# Elements that are never dropped as boilerplate
+CONTAINER_TAGS = {"html", "body", "main", "article"}
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "dd", "details", "div", "dl", "dt", "fieldset", "figcaption",
+    "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol",
+    "p", "pre", "section", "summary", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "ul", "body", "html"
+}
+# A new one of these closes an open one that HTML leaves implicit
+IMPLIED_CLOSE = {
+    "p": {"p"}, "li": {"li"}, "dt": {"dt", "dd"}, "dd": {"dt", "dd"},
+    "tr": {"tr", "td", "th"}, "td": {"td", "th"}, "th": {"td", "th"}, "option": {"option"}
+}
+# Elements nested deeper than this are left out of the tree and their content
+# goes to the ancestor at this depth, keeping markdown rendering (which recurses
+# a few frames per level) well inside Python's recursion limit
+MAX_DEPTH = 200
+APP_ROOT_IDS = {"root", "app", "__next", "__nuxt", "svelte", "main-app"}
+NOSCRIPT_JS = re.compile(r"enable javascript|javascript (?:is )?(?:required|disabled)|requires javascript", re.IGNORECASE)
+META_CHARSET = re.compile(rb"<meta[^>]+charset=[\"']?([\w-]+)", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+# Stands in for <br> until inline whitespace has been collapsed
+LINE_BREAK = "\x00"
+
+
+def collapse(text: str, line_break: str = "\n") -> str:
+    """Collapse whitespace as a browser would, keeping ``<br>`` breaks as ``line_break``."""
+    text = WHITESPACE.sub(" ", text).replace(f" {LINE_BREAK}", LINE_BREAK).replace(f"{LINE_BREAK} ", LINE_BREAK)
+    return text.strip().replace(LINE_BREAK, line_break).strip()
+
+
+class Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["Node"] = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: List[Union["Node", str]] = []
+        self.parent = parent
+
+    def text(self) -> str:
+        parts = []
+        stack: List[Union[Node, str]] = list(reversed(self.children))
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+            elif item.tag not in SKIP_TAGS:
+                stack.extend(reversed(item.children))
+        return WHITESPACE.sub(" ", "".join(parts)).strip()
+
+    def iter(self, tag: Optional[str] = None):
+        stack: List[Union[Node, str]] = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                continue
+            if tag is None or item.tag == tag:
+                yield item
+            stack.extend(reversed(item.children))
+
+
+class TreeBuilder(HTMLParser):
+    """Forgiving HTML to ``Node`` tree parser; unmatched end tags are ignored.
+
+    The tree is at most ``MAX_DEPTH`` elements deep; deeper elements are
+    still tracked on the stack, so their end tags match, but are flattened.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document", {})
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        closes = IMPLIED_CLOSE.get(tag)
+        if closes and self.stack[-1].tag in closes:
+            self.stack.pop()
+        parent = self._parent()
+        node = Node(tag, {name: value or "" for name, value in attrs}, parent)
+        if tag in VOID_TAGS or len(self.stack) <= MAX_DEPTH:
+            parent.children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.stack[-1].tag == tag:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        self._parent().children.append(data)
+
+    def _parent(self) -> Node:
+        """The node new content goes into: the innermost open element within ``MAX_DEPTH``."""
+        return self.stack[min(len(self.stack), MAX_DEPTH + 1) - 1]
+
+
+def is_boilerplate(node: Node) -> bool:
+    if node.tag in CONTAINER_TAGS:
+        return False
+    if node.tag in BOILERPLATE_TAGS or node.attrs.get("aria-hidden") == "true" or "hidden" in node.attrs:
+        return True
+    if node.attrs.get("role") in ("navigation", "banner", "contentinfo", "complementary"):
+        return True
+    label = f"{node.attrs.get('id', '')} {node.attrs.get('class', '')}"
+    return bool(BOILERPLATE_PATTERN.search(label))
+
+
+def main_content(body: Node) -> Node:
+    """The element holding the page's main content.
+
+    ``<main>`` or ``role="main"`` if present, then the longest ``<article>``,
+    then the container whose paragraphs hold the most text (paragraph text
+    counts fully for its parent and half for the grandparent).
+    """
+    for node in body.iter():
+        if node.tag == "main" or node.attrs.get("role") == "main":
+            return node
+    articles = list(body.iter("article"))
+    if articles:
+        return max(articles, key=lambda node: len(node.text()))
+
+    scores: Dict[int, Tuple[float, Node]] = {}
+    for paragraph in body.iter("p"):
+        length = len(paragraph.text())
+        if length < 25:
+            continue
+        for weight, ancestor in ((1.0, paragraph.parent), (0.5, paragraph.parent and paragraph.parent.parent)):
+            if ancestor is None or ancestor.tag == "#document":
+                continue
+            score, _ = scores.get(id(ancestor), (0.0, ancestor))
+            scores[id(ancestor)] = (score + weight * length, ancestor)
+    if not scores:
+        return body
+    return max(scores.values(), key=lambda entry: entry[0])[1]
+
+
+class MarkdownRenderer:
+    """Renders a ``Node`` subtree as markdown, resolving URLs against ``base_url``."""
+
+    def __init__(self, base_url: str, drop_boilerplate: bool):
+        self.base_url = base_url
+        self.drop_boilerplate = drop_boilerplate
+
+    def render(self, node: Node) -> str:
+        blocks: List[str] = []
+        self._blocks(node, blocks, 0)
+        return "\n\n".join(block for block in blocks if block.strip()).strip()
+
+    def _skip(self, node: Node) -> bool:
+        return node.tag in SKIP_TAGS or (self.drop_boilerplate and is_boilerplate(node))
+
+    def _blocks(self, node: Node, blocks: List[str], depth: int):
+        inline: List[str] = []
+
+        def flush():
+            text = collapse("".join(inline))
+            if text:
+                blocks.append(text)
+            inline.clear()
+
+        for child in node.children:
+            if isinstance(child, str):
+                inline.append(child)
+                continue
+            if self._skip(child):
+                continue
+            if child.tag not in BLOCK_TAGS:
+                inline.append(self._inline(child))
+                continue
+            flush()
+            self._block(child, blocks, depth)
+        flush()
+
+    def _block(self, node: Node, blocks: List[str], depth: int):
+        tag = node.tag
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            text = collapse(self._inline_children(node), " ")
+            if text:
+                blocks.append(f"{'#' * int(tag[1])} {text}")
+        elif tag in ("ul", "ol"):
+            lines = self._list(node, depth)
+            if lines:
+                blocks.append("\n".join(lines))
+        elif tag == "pre":
+            code = self._raw_text(node).strip("\n")
+            if code.strip():
+                blocks.append(f"```\n{code}\n```")
+        elif tag == "blockquote":
+            inner = self.render(node)
+            if inner:
+                blocks.append("\n".join(f"> {line}" if line else ">" for line in inner.split("\n")))
+        elif tag == "hr":
+            blocks.append("---")
+        elif tag == "table":
+            table = self._table(node)
+            if table:
+                blocks.append(table)
+        else:
+            self._blocks(node, blocks, depth)
+
+    def _list(self, node: Node, depth: int) -> List[str]:
+        lines = []
+        ordered = node.tag == "ol"
+        number = 1
+        for item in node.children:
+            if isinstance(item, str) or self._skip(item):
+                continue
+            if item.tag in ("ul", "ol"):
+                lines.extend(self._list(item, depth + 1))
+                continue
+            if item.tag != "li":
+                continue
+            text_parts: List[str] = []
+            nested: List[str] = []
+            for child in item.children:
+                if isinstance(child, Node) and child.tag in ("ul", "ol") and not self._skip(child):
+                    nested.extend(self._list(child, depth + 1))
+                elif isinstance(child, Node) and child.tag in BLOCK_TAGS:
+                    if not self._skip(child):
+                        text_parts.append(" " + self._inline_children(child) + " ")
+                elif isinstance(child, Node):
+                    if not self._skip(child):
+                        text_parts.append(self._inline(child))
+                else:
+                    text_parts.append(child)
+            text = collapse("".join(text_parts), " ")
+            marker = f"{number}." if ordered else "-"
+            number += 1
+            if text:
+                lines.append(f"{'  ' * depth}{marker} {text}")
+            lines.extend(nested)
+        return lines
+
+    def _table(self, node: Node) -> str:
+        rows = []
+        for row in node.iter("tr"):
+            cells = [
+                collapse(self._inline_children(cell), " ").replace("|", "\\|")
+                for cell in row.children
+                if isinstance(cell, Node) and cell.tag in ("td", "th")
+            ]
+            if cells:
+                rows.append(cells)
+        if not rows:
+            return ""
+        width = max(len(row) for row in rows)
+        rows = [row + [""] * (width - len(row)) for row in rows]
+        lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+        lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+        return "\n".join(lines)
+
+    def _raw_text(self, node: Node) -> str:
+        return "".join(
+            child if isinstance(child, str) else ("\n" if child.tag == "br" else self._raw_text(child))
+            for child in node.children
+        )
+
+    def _inline_children(self, node: Node) -> str:
+        parts = []
+        for child in node.children:
+            if isinstance(child, str):
+                parts.append(child)
+            elif not self._skip(child):
+                parts.append(self._inline(child) if child.tag not in BLOCK_TAGS else f" {self._inline_children(child)} ")
+        return WHITESPACE.sub(" ", "".join(parts)).strip()
+
+    def _inline(self, node: Node) -> str:
+        tag = node.tag
+        if tag == "br":
+            return LINE_BREAK
+        if tag == "img":
+            src = node.attrs.get("src")
+            if not src or src.startswith("data:"):
+                return ""
+            return f"![{node.attrs.get('alt', '').strip()}]({urljoin(self.base_url, src)})"
+        text = self._inline_children(node)
+        if not text:
+            return ""
+        if tag == "a":
+            href = node.attrs.get("href", "").strip()
+            if not href or href.startswith(("javascript:", "#")):
+                return text
+            return f"[{text}]({urljoin(self.base_url, href)})"
+        if tag in ("strong", "b"):
+            return f"**{text}**"
+        if tag in ("em", "i"):
+            return f"*{text}*"
+        if tag == "code":
+            return f"`{text}`"
+        return text
+
+
+def page_links(root: Node, base_url: str) -> List[str]:
+    """Absolute http(s) link targets of the whole page, in order, without duplicates."""
+    links: Dict[str, None] = {}
+    for anchor in root.iter("a"):
+        href = anchor.attrs.get("href", "").strip()
+        if not href:
+            continue
+        target = urldefrag(urljoin(base_url, href))[0]
+        if urlsplit(target).scheme in ("http", "https"):
+            links.setdefault(target, None)
+    return list(links)
+
+
+def page_metadata(root: Node) -> Dict[str, Any]:
+    metadata: Dict[str, Any] = {}
+    meta = {}
+    for node in root.iter("meta"):
+        name = (node.attrs.get("name") or node.attrs.get("property") or "").lower()
+        if name and "content" in node.attrs:
+            meta.setdefault(name, node.attrs["content"].strip())
+    title = next(root.iter("title"), None)
+    metadata["title"] = (title.text() if title is not None else "") or meta.get("og:title", "")
+    metadata["description"] = meta.get("description") or meta.get("og:description", "")
+    html = next(root.iter("html"), None)
+    if html is not None and html.attrs.get("lang"):
+        metadata["language"] = html.attrs["lang"]
+    for name, key in (("og:image", "ogImage"), ("og:site_name", "ogSiteName"), ("author", "author")):
+        if meta.get(name):
+            metadata[key] = meta[name]
+    return metadata
+
+
+def client_rendering_signals(root: Node, body: Node) -> Dict[str, Any]:
+    """Hints that a page builds its content with JavaScript."""
+    app_root = any(
+        node.attrs.get("id") in APP_ROOT_IDS and not node.text()
+        for node in body.iter("div")
+    ) or any("data-reactroot" in node.attrs or "ng-app" in node.attrs for node in root.iter())
+    return {
+        "scripts": sum(1 for _ in root.iter("script")),
+        "app_root": app_root,
+        "noscript_js": any(NOSCRIPT_JS.search(node.text()) for node in root.iter("noscript")),
+        "text_chars": len(body.text()),
+    }
+
+
+def extract_page(html: str, url: str, formats: Iterable[str], only_main_content: bool = True) -> Dict[str, Any]:
+    """Scrape API ``data`` for an HTML document, plus client-rendering ``signals``.
+
+    Pure and picklable, so it can run in a worker process.
+    """
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    root = builder.root
+    base = next((node.attrs["href"] for node in root.iter("base") if node.attrs.get("href")), None)
+    base_url = urljoin(url, base) if base else url
+    body = next(root.iter("body"), root)
+
+    data: Dict[str, Any] = {"metadata": page_metadata(root)}
+    if "markdown" in formats:
+        content = main_content(body) if only_main_content else body
+        data["markdown"] = MarkdownRenderer(base_url, only_main_content).render(content)
+    if "links" in formats:
+        data["links"] = page_links(root, base_url)
+    data["signals"] = client_rendering_signals(root, body)
+    return data
+
+
+def client_rendered(signals: Dict[str, Any], markdown: str, min_chars: int) -> bool:
+    """Whether a page looks like an app shell whose text only exists after JavaScript runs."""
+    if len(markdown) >= min_chars * 4:
+        return False
+    if signals["app_root"] or signals["noscript_js"]:
+        return True
+    return len(markdown) < min_chars and signals["scripts"] > 0
+
+
+def host_matches(host: str, domains: Iterable[str]) -> bool:
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+class BlockedAddress(Exception):
+    """A page URL points at an address the local engine must not fetch."""
+
+
+async def resolve_host(host: str, port: int) -> List[str]:
+    """The IP addresses ``host`` resolves to."""
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise httpx.ConnectError(f"Cannot resolve {host}: {e}") from e
+    return [info[4][0] for info in infos]
+
+
+def is_public_address(address: str) -> bool:
+    """Whether an IP address is on the public internet (not loopback, private, link-local, ...)."""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def ensure_public(url: str):
+    """Raise ``BlockedAddress`` unless every address of the URL's host is public."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise BlockedAddress(f"Not an http(s) URL: {url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    for address in await resolve_host(parts.hostname, port):
+        if not is_public_address(address):
+            raise BlockedAddress(f"{parts.hostname} resolves to non-public address {address}")
+
+
+class ScrapePolicy:
+    """Chooses the scrape engine for a request.
+
+    ``mode`` is ``remote`` (always the scrape API), ``local`` (always this
+    process, never falling back) or ``auto`` (local first, the scrape API when
+    the local result is unusable). ``local_domains`` are tried locally first
+    in any mode and ``remote_domains`` always use the scrape API. A host whose
+    last ``remember_after`` local scrapes all needed the fallback goes
+    straight to the scrape API for ``remember_seconds``. Requests using
+    browser-only options always go to the scrape API.
+    """
+
+    def __init__(
+        self,
+        mode: str = "remote",
+        local_domains: Iterable[str] = (),
+        remote_domains: Iterable[str] = (),
+        remember_seconds: float = 3600.0,
+        remember_after: int = 3,
+        max_remembered: int = 1024,
+    ):
+        if mode not in ENGINES:
+            raise ValueError(f"Unknown scrape engine {mode!r}; expected one of {', '.join(ENGINES)}")
+        self.mode = mode
+        self.local_domains = tuple(d.strip().lower() for d in local_domains if d.strip())
+        self.remote_domains = tuple(d.strip().lower() for d in remote_domains if d.strip())
+        self.remember_seconds = remember_seconds
+        self.remember_after = remember_after
+        self.max_remembered = max_remembered
+        # host -> consecutive fallbacks, and host -> (expires_at, reason) once remembered
+        self._failures: "OrderedDict[str, int]" = OrderedDict()
+        self._remote_hosts: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.decisions = {"local": 0, "remote": 0}
+        self.fallbacks: Dict[str, int] = {}
+
+    def choose(self, params: Dict[str, Any]) -> str:
+        engine = self._choose(params)
+        self.decisions[engine] += 1
+        return engine
+
+    def _choose(self, params: Dict[str, Any]) -> str:
+        if any(params.get(option) for option in BROWSER_OPTIONS):
+            return "remote"
+        if not set(params.get("formats") or ["markdown"]) <= LOCAL_FORMATS:
+            return "remote"
+        host = (urlsplit(params.get("url", "")).hostname or "").lower()
+        if host_matches(host, self.remote_domains) or self._remembered(host):
+            return "remote"
+        if self.mode != "remote" or host_matches(host, self.local_domains):
+            return "local"
+        return "remote"
+
+    def falls_back(self) -> bool:
+        return self.mode != "local"
+
+    def record_success(self, url: str):
+        self._failures.pop((urlsplit(url).hostname or "").lower(), None)
+
+    def record_fallback(self, url: str, reason: str):
+        """Count a fallback; enough in a row send the host to the scrape API for a while."""
+        self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+        host = (urlsplit(url).hostname or "").lower()
+        if not host or self.remember_seconds <= 0:
+            return
+        failures = self._failures.pop(host, 0) + 1
+        if failures < self.remember_after:
+            self._failures[host] = failures
+            while len(self._failures) > self.max_remembered:
+                self._failures.popitem(last=False)
+            return
+        self._remote_hosts.pop(host, None)
+        self._remote_hosts[host] = (time.monotonic() + self.remember_seconds, reason)
+        while len(self._remote_hosts) > self.max_remembered:
+            self._remote_hosts.popitem(last=False)
+
+    def _remembered(self, host: str) -> bool:
+        entry = self._remote_hosts.get(host)
+        if entry is None:
+            return False
+        if entry[0] <= time.monotonic():
+            del self._remote_hosts[host]
+            return False
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "decisions": dict(self.decisions),
+            "fallbacks": dict(self.fallbacks),
+            "remote_hosts": len(self._remote_hosts),
+        }
+
+
+class LocalScraper:
+    """Fetches pages with the shared HTTP client and extracts them in worker processes.
+
+    ``workers=0`` extracts in the default thread pool instead. Responses over
+    ``max_bytes`` are cut off and the part read so far is parsed. Unless
+    ``allow_private`` is set, a page or redirect whose host resolves to a
+    loopback, private, link-local or otherwise non-public address is refused,
+    so page URLs cannot reach the scrape server's own network.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_bytes: int = 5 * 1024 * 1024,
+        min_chars: int = 200,
+        read_timeout: float = 15.0,
+        user_agent: str = "Mozilla/5.0 (compatible; scrape-service/1.0)",
+        allow_private: bool = False,
+        max_redirects: int = 10,
+    ):
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.min_chars = min_chars
+        self.read_timeout = read_timeout
+        self.user_agent = user_agent
+        self.allow_private = allow_private
+        self.max_redirects = max_redirects
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.pages = 0
+        self.bytes_received = 0
+        self.extract_seconds = 0.0
+        self.pool_restarts = 0
+        self.blocked = 0
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            # forkserver: workers are not forked from a process running threads and an event loop
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._executor
+
+    async def extract(self, html: str, url: str, formats: List[str], only_main_content: bool) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._get_executor(), extract_page, html, url, formats, only_main_content)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            self._executor = None
+            self.pool_restarts += 1
+            raise
+        finally:
+            self.extract_seconds += time.perf_counter() - started
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[httpx.Response, bytes]:
+        """GET a page, following redirects; the body is cut off at ``max_bytes``.
+
+        Each hop's host is checked before it is requested (``BlockedAddress``).
+        """
+        request_headers = {"User-Agent": self.user_agent, "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.5"}
+        request_headers.update(headers or {})
+        trace, done = pool_stats.request_trace()
+        try:
+            for _ in range(self.max_redirects + 1):
+                if not self.allow_private:
+                    await ensure_public(url)
+                async with get_http_client().stream(
+                    "GET",
+                    url,
+                    headers=request_headers,
+                    follow_redirects=False,
+                    timeout=httpx.Timeout(CONNECT_TIMEOUT, read=self.read_timeout, write=WRITE_TIMEOUT, pool=POOL_TIMEOUT),
+                    extensions={"trace": trace}
+                ) as response:
+                    if response.next_request is not None:
+                        url = str(response.next_request.url)
+                        continue
+                    chunks = []
+                    received = 0
+                    async for chunk in response.aiter_bytes():
+                        chunks.append(chunk[:self.max_bytes - received])
+                        received += len(chunks[-1])
+                        if received >= self.max_bytes:
+                            break
+                    self.bytes_received += received
+                    return response, b"".join(chunks)
+            raise httpx.TooManyRedirects(f"More than {self.max_redirects} redirects", request=response.request)
+        finally:
+            done()
+
+    async def scrape(self, params: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Scrape one page; returns a scrape API shaped result and a fallback reason.
+
+        The reason is None when the result is good; otherwise it names why the
+        scrape API should be asked instead (``http_403``, ``client_rendered``,
+        ``content_type``, ``fetch_error``, ...). The result is still returned,
+        for callers that do not fall back; ``blocked_address`` never falls back.
+        """
+        url = params["url"]
+        formats = list(params.get("formats") or ["markdown"])
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            try:
+                response, body = await self.fetch(url, params.get("headers"))
+            except BlockedAddress as e:
+                logger.warning(f"Refusing to fetch {url}: {e}")
+                self.blocked += 1
+                return {"success": False, "error": str(e)}, "blocked_address"
+            except httpx.HTTPError as e:
+                return {"success": False, "error": str(e) or type(e).__name__}, "fetch_error"
+
+            status = response.status_code
+            metadata = {"sourceURL": url, "url": str(response.url), "statusCode": status}
+            if status >= 400:
+                return {"success": False, "error": f"HTTP {status} fetching {url}"}, f"http_{status}"
+
+            content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+            text = body.decode(self._charset(response, body), errors="replace")
+            if content_type in ("text/plain", "text/markdown"):
+                data = {"metadata": metadata, "markdown": text}
+                if "links" in formats:
+                    data["links"] = []
+                outcome = "ok"
+                return {"success": True, "data": data}, None
+            if content_type and content_type not in ("text/html", "application/xhtml+xml"):
+                return {"success": False, "error": f"Unsupported content type {content_type}"}, "content_type"
+
+            try:
+                data = await self.extract(text, str(response.url), formats, params.get("onlyMainContent", True))
+            except Exception as e:
+                logger.warning(f"Local extraction failed for {url}: {e}")
+                return {"success": False, "error": f"Extraction failed: {e}"}, "extract_error"
+            signals = data.pop("signals")
+            data["metadata"].update(metadata)
+            self.pages += 1
+            result = {"success": True, "data": data}
+            if "markdown" in formats and client_rendered(signals, data.get("markdown", ""), self.min_chars):
+                outcome = "fallback"
+                return result, "client_rendered"
+            outcome = "ok"
+            return result, None
+        finally:
+            LOCAL_SCRAPE_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+
+    @staticmethod
+    def _charset(response: httpx.Response, body: bytes) -> str:
+        if response.charset_encoding:
+            return response.charset_encoding
+        match = META_CHARSET.search(body[:4096])
+        if match:
+            try:
+                return match.group(1).decode("ascii")
+            except UnicodeDecodeError:
+                pass
+        return "utf-8"
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pages": self.pages,
+            "bytes_received": self.bytes_received,
+            "extract_seconds": round(self.extract_seconds, 3),
+            "pool_restarts": self.pool_restarts,
+            "blocked": self.blocked,
+        }
+
+
+async def route_scrape(
+    params: Dict[str, Any],
+    policy: ScrapePolicy,
+    local: LocalScraper,
+    remote: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """Scrape with the engine the policy picks, falling back to ``remote`` if allowed."""
+    if policy.choose(params) == "remote":
+        return await remote(params)
+    result, fallback = await local.scrape(params)
+    if fallback is None:
+        policy.record_success(params["url"])
+        return result
+    if not policy.falls_back() or fallback == "blocked_address":
+        return result
+    logger.info(f"Local scrape of {params['url']} unusable ({fallback}); using the scrape API")
+    policy.record_fallback(params["url"], fallback)
+    return await remote(params)
@@ -1,79 +1,155 @@
-import asyncio
 from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
 import os
 import logging
 
+from mcp_pool import MCPSessionPool, RemoteServerParameters
+from tool_registry import ToolRegistry
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrape_mcp_server.py")
+
 class MCPWebScraperClient:
-    def __init__(self):
-        # Set the correct path to your scrape server
-        self.server_path = os.path.abspath("./scrape_mcp_server.py")
-        self.server_command = "python"
-        
-        # Validate that the server file exists
-        if not os.path.exists(self.server_path):
-            raise FileNotFoundError(f"MCP server file not found: {self.server_path}")
-    
+    def __init__(self, pool: Optional[MCPSessionPool] = None):
+        # Path to the scrape server; defaults to the copy next to this module
+        self.server_path = os.path.abspath(os.getenv("MCP_SERVER_PATH", DEFAULT_SERVER_PATH))
+        self.server_command = os.getenv("MCP_SERVER_COMMAND", "python")
+        # A URL connects to a shared scrape service instead of spawning private servers
+        self.server_url = os.getenv("MCP_SERVER_URL") or None
+
+        if self.server_url:
+            server_params = RemoteServerParameters(
+                self.server_url,
+                transport=os.getenv("MCP_SERVER_TRANSPORT", "streamable-http")
+            )
+        else:
+            # Validate that the server file exists
+            if not os.path.exists(self.server_path):
+                raise FileNotFoundError(f"MCP server file not found: {self.server_path}")
+            server_params = StdioServerParameters(
+                command=self.server_command,
+                args=[self.server_path],
+                env=dict(os.environ)
+            )
+
+        # Warm server sessions shared by every caller of this client
+        self.pool = pool or MCPSessionPool(
+            server_params,
+            size=int(os.getenv("MCP_POOL_SIZE", "2")),
+            max_calls=int(os.getenv("MCP_POOL_MAX_CALLS", "500")),
+            max_rss_bytes=int(os.getenv("MCP_POOL_MAX_RSS_MB", "512")) * 1024 * 1024,
+            health_interval=float(os.getenv("MCP_POOL_HEALTH_INTERVAL", "30")),
+            call_timeout=float(os.getenv("MCP_CALL_TIMEOUT", "120"))
+        )
+
+        # Tool schemas only change when the server script or the modules it
+        # imports do; a remote server's are not ours to watch, so it relies on the TTL
+        self.tools = ToolRegistry(
+            loader=lambda: self.pool.run(self._list_tools),
+            source_path=None if self.server_url else self.server_path,
+            ttl=float(os.getenv("MCP_TOOLS_TTL", "300")),
+            spawn=self.pool.spawn,
+            on_source_change=None if self.server_url else self.pool.recycle_all
+        )
+
+    def warm_up(self):
+        """Start the pool and load tool schemas in the background"""
+        self.tools.schedule_refresh()
+
+    async def connect(self, timeout: float = 30.0) -> bool:
+        """Start the session pool and wait for the first server to be ready"""
+        return await self.pool.wait_ready(timeout)
+
+    async def cleanup(self):
+        """Shut down all pooled MCP server sessions"""
+        await self.pool.aclose()
+
+    def close(self):
+        """Synchronous shutdown hook (e.g. for atexit)"""
+        self.pool.close()
+
     async def get_available_tools(self) -> List[Dict]:
         """Get list of available tools from MCP server"""
-        server_params = StdioServerParameters(
-            command=self.server_command,
-            args=[self.server_path]
-        )
-        
         try:
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    result = await session.list_tools()
-                    
-                    tools = []
-                    for tool in result.tools:
-                        tools.append({
-                            "type": "function", 
-                            "function": {
-                                "name": tool.name,
-                                "description": tool.description,
-                                "parameters": tool.inputSchema
-                            }
-                        })
-                    
-                    logger.info(f"Found {len(tools)} tools: {[t['function']['name'] for t in tools]}")
-                    return tools
-                    
+            return await self.tools.get()
+
         except Exception as e:
             logger.error(f"Failed to get tools: {e}")
             return []
-    
-    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
-        """Execute a tool on the MCP server using fresh connection"""
-        server_params = StdioServerParameters(
-            command=self.server_command,
-            args=[self.server_path]
-        )
-        
+
+    @staticmethod
+    async def _list_tools(session: ClientSession) -> List[Dict]:
+        result = await session.list_tools()
+
+        tools = []
+        for tool in result.tools:
+            tools.append({
+                "type": "function",
+                "function": {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "parameters": tool.inputSchema
+                }
+            })
+        return tools
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any],
+                        on_progress: Optional[Callable[[float, Optional[float], Optional[str]], None]] = None) -> str:
+        """Execute a tool on a pooled MCP server session
+
+        ``on_progress(progress, total, message)`` is called on the caller's
+        event loop for each progress notification the tool sends.
+        """
         try:
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    
-                    logger.info(f"Calling tool {tool_name} with args: {arguments}")
-                    result = await session.call_tool(tool_name, arguments)
-                    
-                    if result.isError:
-                        error_msg = result.content[0].text if result.content else 'Unknown error'
-                        logger.error(f"Tool error: {error_msg}")
-                        return f"Error: {error_msg}"
-                    
-                    content = result.content[0].text if result.content else "No result"
-                    logger.info(f"Tool result length: {len(content)} characters")
-                    return content
-                    
+            logger.info(f"Calling tool {tool_name} with args: {arguments}")
+            progress_callback = None
+            if on_progress is not None:
+                loop = asyncio.get_running_loop()
+
+                async def progress_callback(progress: float, total: Optional[float], message: Optional[str]):
+                    # Runs on the pool's loop; hand the update to the caller's loop
+                    try:
+                        loop.call_soon_threadsafe(on_progress, progress, total, message)
+                    except RuntimeError:
+                        pass  # caller's loop already finished
+
+            result = await self.pool.run(
+                lambda session: session.call_tool(tool_name, arguments, progress_callback=progress_callback)
+            )
+
+            if result.isError:
+                error_msg = result.content[0].text if result.content else 'Unknown error'
+                logger.error(f"Tool error: {error_msg}")
+                return f"Error: {error_msg}"
+
+            content = result.content[0].text if result.content else "No result"
+            logger.info(f"Tool result length: {len(content)} characters")
+            return content
+
         except Exception as e:
             logger.error(f"Failed to call tool {tool_name}: {e}")
             return f"Error calling tool: {str(e)}"
-    
 
+    def stats(self) -> Dict[str, Any]:
+        """Session pool statistics for the debug endpoints"""
+        return self.pool.stats()
+
+    def breaker_states(self) -> List[Dict[str, Any]]:
+        """Scrape API circuit breaker of each pooled server, as of its last health check"""
+        return [
+            {"server": server["index"], **(server.get("server_stats") or {}).get("breaker", {})}
+            for server in self.pool.stats()["servers"]
+        ]
+
+    def response_stats(self) -> List[Dict[str, Any]]:
+        """Scrape response sizes and peak RSS of each pooled server, as of its last health check"""
+        return [
+            {"server": server["index"], **(server.get("server_stats") or {}).get("responses", {})}
+            for server in self.pool.stats()["servers"]
+        ]
+
+    def tool_cache_stats(self) -> Dict[str, Any]:
+        """Tool registry hits/misses and schema version"""
+        return self.tools.stats()
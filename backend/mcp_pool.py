@@ -0,0 +1,405 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+from metrics import record_stage
+
+logger = logging.getLogger(__name__)
+
+# Resource exposed by scrape_mcp_server.py with pid / RSS / counters
+STATS_RESOURCE_URI = "stats://server"
+
+HEALTH_CHECK_TIMEOUT = 10  # seconds
+IDLE_POLL_INTERVAL = 1.0  # seconds
+MAX_RESPAWN_BACKOFF = 30.0  # seconds
+
+
+class RemoteServerParameters:
+    """A shared scrape server reached over the network instead of spawned per pool."""
+
+    TRANSPORTS = ("streamable-http", "sse")
+
+    def __init__(self, url: str, transport: str = "streamable-http", timeout: float = 30.0):
+        if transport not in self.TRANSPORTS:
+            raise ValueError(f"Unknown MCP transport {transport!r}; expected one of {', '.join(self.TRANSPORTS)}")
+        self.url = url
+        self.transport = transport
+        self.timeout = timeout
+
+
+ServerParameters = Union[StdioServerParameters, RemoteServerParameters]
+
+
+@asynccontextmanager
+async def open_transport(params: ServerParameters) -> AsyncIterator[Tuple[Any, Any]]:
+    """Read/write streams to a server: a fresh subprocess or a session on a shared one."""
+    if isinstance(params, StdioServerParameters):
+        async with stdio_client(params) as (read, write):
+            yield read, write
+    elif params.transport == "sse":
+        async with sse_client(params.url, timeout=params.timeout) as (read, write):
+            yield read, write
+    else:
+        async with streamablehttp_client(params.url, timeout=params.timeout) as (read, write, _):
+            yield read, write
+
+
+class _Job:
+    """A unit of work waiting for a pooled session."""
+
+    def __init__(self, fn: Callable[[ClientSession], Awaitable[Any]], future: asyncio.Future):
+        self.fn = fn
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.waited = 0.0
+        self.attempts = 0
+
+
+class _PooledServer:
+    """One MCP server subprocess (or remote session) plus its initialized ClientSession.
+
+    The owning task enters and exits the transport/session context managers
+    itself, so the anyio cancel scopes inside the MCP client never cross tasks.
+    """
+
+    def __init__(self, pool: "MCPSessionPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.task: Optional[asyncio.Task] = None
+        self.state = "starting"
+        self.generation = pool.generation
+        self.spawns = 0
+        self.calls = 0
+        self.total_calls = 0
+        self.pid: Optional[int] = None
+        self.rss_bytes: Optional[int] = None
+        self.server_stats: Dict[str, Any] = {}
+        self.last_error: Optional[str] = None
+        self.checked_at = 0.0
+        self._carried_job: Optional[_Job] = None
+
+    async def run(self):
+        """Keep a server alive until the pool closes, respawning on crash or recycle."""
+        backoff = 0.5
+        while not self.pool.closing:
+            try:
+                await self._serve()
+                backoff = 0.5
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.state = "crashed"
+                self.last_error = str(e)
+                logger.warning(f"MCP server #{self.index} failed: {e}; respawning in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RESPAWN_BACKOFF)
+        self.state = "closed"
+
+    async def _serve(self):
+        async with open_transport(self.pool.server_params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                # call_tool checks results against the tool schemas and lists them
+                # first if this session has not; load them now, not mid-call
+                await session.list_tools()
+                self.spawns += 1
+                self.calls = 0
+                self.generation = self.pool.generation
+                await self._health_check(session)
+                self.state = "ready"
+                self.pool.ready.set()
+                logger.info(f"MCP server #{self.index} ready (pid={self.pid}, spawn #{self.spawns})")
+
+                while not self.pool.closing:
+                    job = self._carried_job
+                    self._carried_job = None
+                    if job is None:
+                        try:
+                            job = await asyncio.wait_for(self.pool.jobs.get(), IDLE_POLL_INTERVAL)
+                        except asyncio.TimeoutError:
+                            if self.generation != self.pool.generation:
+                                logger.info(f"Recycling MCP server #{self.index}: server script changed")
+                                return
+                            if time.monotonic() - self.checked_at >= self.pool.health_interval:
+                                await self._health_check(session)
+                                if self._should_recycle():
+                                    return
+                            continue
+
+                    if job is None:
+                        return
+                    if job.future.done():
+                        continue
+                    if self.generation != self.pool.generation:
+                        # Run the job on a fresh process rather than the outdated one
+                        self._carried_job = job
+                        logger.info(f"Recycling MCP server #{self.index}: server script changed")
+                        return
+
+                    await self._execute(session, job)
+
+                    if time.monotonic() - self.checked_at >= self.pool.health_interval:
+                        await self._health_check(session)
+                    if self._should_recycle():
+                        return
+
+    async def _execute(self, session: ClientSession, job: _Job):
+        self.state = "busy"
+        if job.attempts == 0:
+            job.waited = time.monotonic() - job.enqueued_at
+            self.pool.record_wait(job.waited)
+        try:
+            result = await asyncio.wait_for(job.fn(session), self.pool.call_timeout)
+        except asyncio.TimeoutError:
+            if not job.future.done():
+                job.future.set_exception(
+                    TimeoutError(f"MCP call timed out after {self.pool.call_timeout}s")
+                )
+            # A wedged server cannot be trusted with the next request
+            raise
+        except Exception as e:
+            # Tool-level errors come back as results; an exception here usually
+            # means the transport broke, so verify before taking more work.
+            try:
+                await self._health_check(session)
+            except Exception:
+                if job.attempts == 0:
+                    # Server died under this call; retry once on the respawned one
+                    job.attempts += 1
+                    self._carried_job = job
+                elif not job.future.done():
+                    job.future.set_exception(e)
+                raise
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self.calls += 1
+            self.total_calls += 1
+            self.state = "ready"
+
+    async def _health_check(self, session: ClientSession):
+        """Ping the server and refresh its process statistics."""
+        await asyncio.wait_for(session.send_ping(), HEALTH_CHECK_TIMEOUT)
+        self.checked_at = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                session.read_resource(STATS_RESOURCE_URI), HEALTH_CHECK_TIMEOUT
+            )
+            self.server_stats = json.loads(result.contents[0].text)
+            self.pid = self.server_stats.get("pid")
+            self.rss_bytes = self.server_stats.get("rss_bytes")
+        except asyncio.TimeoutError:
+            raise
+        except Exception as e:
+            logger.debug(f"MCP server #{self.index} stats unavailable: {e}")
+
+    def _should_recycle(self) -> bool:
+        if self.pool.remote:
+            # Reconnecting would not restart a shared server; it manages itself
+            return False
+        if self.pool.max_calls and self.calls >= self.pool.max_calls:
+            logger.info(f"Recycling MCP server #{self.index} after {self.calls} calls")
+            return True
+        if self.pool.max_rss_bytes and self.rss_bytes and self.rss_bytes >= self.pool.max_rss_bytes:
+            logger.info(f"Recycling MCP server #{self.index} at {self.rss_bytes} bytes RSS")
+            return True
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "state": self.state,
+            "pid": self.pid,
+            "spawns": self.spawns,
+            "calls_since_spawn": self.calls,
+            "total_calls": self.total_calls,
+            "rss_bytes": self.rss_bytes,
+            "last_error": self.last_error,
+            "server_stats": self.server_stats,
+        }
+
+
+class MCPSessionPool:
+    """A fixed-size pool of warm MCP server sessions shared by every request.
+
+    The sessions live on a dedicated event loop in a daemon thread, so callers
+    running under ``asyncio.run`` (one loop per Flask request) or any other
+    loop can use them. Work is submitted with ``run`` and picked up by the next
+    idle server; crashed servers are respawned and healthy ones are recycled
+    after ``max_calls`` calls or once their RSS reaches ``max_rss_bytes``.
+
+    With ``RemoteServerParameters`` the sessions connect to one shared server
+    instead of spawning their own; dropped sessions reconnect with the same
+    backoff, and recycling is left to that server.
+    """
+
+    def __init__(
+        self,
+        server_params: ServerParameters,
+        size: int = 2,
+        max_calls: int = 500,
+        max_rss_bytes: int = 512 * 1024 * 1024,
+        health_interval: float = 30.0,
+        call_timeout: float = 120.0,
+    ):
+        self.server_params = server_params
+        self.remote = isinstance(server_params, RemoteServerParameters)
+        self.size = max(1, size)
+        self.max_calls = max_calls
+        self.max_rss_bytes = max_rss_bytes
+        self.health_interval = health_interval
+        self.call_timeout = call_timeout
+
+        self.generation = 0
+        self.closing = False
+        self.jobs: Optional[asyncio.Queue] = None
+        self.ready: Optional[asyncio.Event] = None
+        self._servers: List[_PooledServer] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._wait_total = 0.0
+        self._wait_count = 0
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._loop
+
+    def start(self):
+        """Start the pool's event loop and server sessions if not already running."""
+        # Lock-free fast path: work scheduled on the pool loop calls this too
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.closing = False
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._run_loop, name="mcp-session-pool", daemon=True
+            )
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._start_servers(), self._loop).result()
+            logger.info(f"Started MCP session pool with {self.size} servers")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    async def _start_servers(self):
+        self.jobs = asyncio.Queue()
+        self.ready = asyncio.Event()
+        self._servers = [_PooledServer(self, i) for i in range(self.size)]
+        for server in self._servers:
+            server.task = asyncio.ensure_future(server.run())
+
+    async def run(self, fn: Callable[[ClientSession], Awaitable[Any]]) -> Any:
+        """Run ``fn(session)`` on the next idle pooled session and return its result."""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self._dispatch(fn), self._loop)
+        result, waited = await asyncio.wrap_future(future)
+        # Recorded here, in the caller's context, so it counts toward its request
+        record_stage("mcp_acquire", waited)
+        return result
+
+    async def _dispatch(self, fn: Callable[[ClientSession], Awaitable[Any]]) -> Any:
+        if self.closing:
+            raise RuntimeError("MCP session pool is closing")
+        job = _Job(fn, self._loop.create_future())
+        self.jobs.put_nowait(job)
+        try:
+            return await job.future, job.waited
+        except asyncio.CancelledError:
+            # Caller went away; an idle server will skip the job
+            job.future.cancel()
+            raise
+
+    def spawn(self, coro: Awaitable[Any]) -> "asyncio.Future":
+        """Schedule a coroutine on the pool loop without waiting for it."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def wait_ready(self, timeout: float = 30.0) -> bool:
+        """Wait until at least one server session is initialized."""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(self.ready.wait(), timeout), self._loop
+        )
+        try:
+            await asyncio.wrap_future(future)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def recycle_all(self):
+        """Ask every server to restart before serving its next call."""
+        self.generation += 1
+
+    def record_wait(self, seconds: float):
+        self._wait_total += seconds
+        self._wait_count += 1
+
+    def close(self, timeout: float = 10.0):
+        """Stop all servers and the pool's event loop."""
+        with self._lock:
+            if self._thread is None:
+                return
+            future = asyncio.run_coroutine_threadsafe(self._shutdown(timeout), self._loop)
+            try:
+                future.result(timeout + 1)
+            except Exception as e:
+                logger.warning(f"MCP session pool did not shut down cleanly: {e}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self._loop.close()
+            self._thread = None
+            self._loop = None
+            logger.info("MCP session pool closed")
+
+    async def aclose(self, timeout: float = 10.0):
+        """Async variant of ``close`` for callers running on an event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.close, timeout)
+
+    async def _shutdown(self, timeout: float):
+        self.closing = True
+        for _ in self._servers:
+            self.jobs.put_nowait(None)
+        tasks = [s.task for s in self._servers if s.task]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        for server in self._servers:
+            job = server._carried_job
+            if job is not None and not job.future.done():
+                job.future.set_exception(RuntimeError("MCP session pool closed"))
+        while not self.jobs.empty():
+            job = self.jobs.get_nowait()
+            if job is not None and not job.future.done():
+                job.future.set_exception(RuntimeError("MCP session pool closed"))
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool configuration and per-server state."""
+        return {
+            "running": self._thread is not None,
+            "transport": self.server_params.transport if self.remote else "stdio",
+            "size": self.size,
+            "max_calls": self.max_calls,
+            "max_rss_bytes": self.max_rss_bytes,
+            "queued": self.jobs.qsize() if self.jobs else 0,
+            "avg_wait_ms": round(1000 * self._wait_total / self._wait_count, 2) if self._wait_count else 0.0,
+            "servers": [s.stats() for s in self._servers],
+        }
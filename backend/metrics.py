@@ -0,0 +1,276 @@
+"""Counters and histograms in the Prometheus text format, plus per-request stage timing."""
+import abc
+import contextvars
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    @abc.abstractmethod
+    def samples(self, extra_labels: Optional[Dict[str, str]] = None) -> List[str]:
+        """The metric's sample lines, with ``extra_labels`` added to each."""
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self, extra_labels: Optional[Dict[str, str]] = None) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key, extra_labels)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Value read from a callback at scrape time."""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def samples(self, extra_labels: Optional[Dict[str, str]] = None) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            logger.warning(f"Failed to read gauge {self.name}: {e}")
+            return []
+        return [f"{self.name}{_format_labels((), (), extra_labels)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return int(series[-2]) if series else 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-safe copy, used to ship a histogram from the MCP server to the backend."""
+        with self._lock:
+            series = [
+                {"labels": dict(zip(self.labelnames, key)), "values": list(values)}
+                for key, values in self._series.items()
+            ]
+        return {
+            "name": self.name,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "buckets": list(self.buckets),
+            "series": series,
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> "Histogram":
+        histogram = cls(snapshot["name"], snapshot["help"], snapshot["labelnames"], snapshot["buckets"])
+        for entry in snapshot["series"]:
+            histogram._series[histogram._key(entry["labels"])] = list(entry["values"])
+        return histogram
+
+    def samples(self, extra_labels: Optional[Dict[str, str]] = None) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, values in items:
+            for bound, count in zip(self.buckets, values):
+                labels = _format_labels(names, key + (_format_value(bound),), extra_labels)
+                lines.append(f"{self.name}_bucket{labels} {_format_value(count)}")
+            labels = _format_labels(names, key + ("+Inf",), extra_labels)
+            lines.append(f"{self.name}_bucket{labels} {_format_value(values[-2])}")
+            plain = _format_labels(self.labelnames, key, extra_labels)
+            lines.append(f"{self.name}_sum{plain} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{plain} {_format_value(values[-2])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, read))
+
+    def render(self, external: Sequence[Tuple[Dict[str, str], _Metric]] = ()) -> str:
+        """Text exposition of every metric; ``external`` adds labelled metrics from other processes."""
+        grouped: Dict[str, List[Tuple[Optional[Dict[str, str]], _Metric]]] = {
+            name: [(None, metric)] for name, metric in self._metrics.items()
+        }
+        for labels, metric in external:
+            grouped.setdefault(metric.name, []).append((labels, metric))
+
+        lines: List[str] = []
+        for name in sorted(grouped):
+            entries = grouped[name]
+            lines.extend(entries[0][1].header())
+            for labels, metric in entries:
+                lines.extend(metric.samples(labels))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "chat_stage_seconds", "Time spent in each stage of a chat request", ["stage"]
+)
+CHAT_SECONDS = REGISTRY.histogram(
+    "chat_request_seconds", "End-to-end chat request time", ["outcome"]
+)
+CHAT_REQUESTS = REGISTRY.counter(
+    "chat_requests_total", "Chat requests by outcome", ["outcome"]
+)
+
+# Set in tasks that work for one chat request, so shared components
+# (such as the MCP session pool) can attribute their time to it
+_current_timer: "contextvars.ContextVar[Optional[RequestTimer]]" = contextvars.ContextVar(
+    "request_timer", default=None
+)
+
+
+def record_stage(stage: str, seconds: float):
+    """Observe a stage duration and add it to the current request's breakdown, if any."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.stages.append((stage, seconds))
+
+
+class RequestTimer:
+    """Collects the stage breakdown of one chat request."""
+
+    def __init__(self, slow_threshold: float = 0.0):
+        self.slow_threshold = slow_threshold
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self.tokens = {"prompt": 0, "completion": 0}
+
+    def bind(self):
+        """Attribute stages recorded in the current task (and tasks it creates) to this request."""
+        _current_timer.set(self)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            STAGE_SECONDS.observe(seconds, stage=name)
+            self.stages.append((name, seconds))
+
+    def add_usage(self, response: Any):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.tokens["prompt"] += getattr(usage, "prompt_tokens", 0) or 0
+            self.tokens["completion"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def breakdown(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round(1000 * (time.perf_counter() - self.started), 1),
+            "stages": [{"stage": name, "ms": round(1000 * seconds, 1)} for name, seconds in self.stages],
+            "tokens": dict(self.tokens),
+        }
+
+    def finish(self, outcome: str) -> float:
+        elapsed = time.perf_counter() - self.started
+        CHAT_SECONDS.observe(elapsed, outcome=outcome)
+        CHAT_REQUESTS.inc(outcome=outcome)
+        if self.slow_threshold and elapsed >= self.slow_threshold:
+            logger.warning(f"Slow chat request ({outcome}, {elapsed:.2f}s): {json.dumps(self.breakdown())}")
+        return elapsed
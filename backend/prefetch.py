@@ -0,0 +1,87 @@
+"""Speculative scraping of the URLs in a chat message.
+
+The first model call only decides which tool to run, yet the URLs it will
+most likely scrape are already in the message. ``ScrapePrefetch`` starts
+default ``scrape_url`` calls for them as soon as a chat arrives; a matching
+tool call later takes over the running (or finished) call instead of
+starting its own, and unclaimed calls are cancelled when the chat no longer
+needs them.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+from scrape_cache import canonicalize_url
+
+PREFETCHES = REGISTRY.counter(
+    "scrape_prefetch_total", "Speculative scrapes by whether a tool call used them", ["outcome"]
+)
+SAVED_SECONDS = REGISTRY.counter(
+    "scrape_prefetch_saved_seconds_total", "Scrape time already done when a tool call claimed a prefetch"
+)
+
+# scrape_url arguments a speculative call runs with; a tool call setting
+# anything else wants a different result
+DEFAULT_ARGUMENTS = {"get_full_content": True, "only_main_content": True, "use_cache": True, "force_refresh": False}
+
+
+def prefetchable(tool_name: str, arguments: Dict[str, Any]) -> Optional[str]:
+    """The canonical URL of a tool call a prefetch can serve, or None."""
+    if tool_name != "scrape_url" or not isinstance(arguments.get("url"), str):
+        return None
+    for name, value in arguments.items():
+        if name != "url" and (name not in DEFAULT_ARGUMENTS or DEFAULT_ARGUMENTS[name] != value):
+            return None
+    return canonicalize_url(arguments["url"])
+
+
+class ScrapePrefetch:
+    """Speculative ``scrape_url`` calls for the URLs of one chat request.
+
+    ``call(tool_name, arguments)`` runs a tool and returns its text result. At
+    most ``limit`` URLs are fetched; a message with more than that is left to
+    the model, which will likely batch them in one ``scrape_many`` call.
+    """
+
+    def __init__(self, call: Callable[[str, Dict[str, Any]], Awaitable[str]], urls: List[str], limit: int = 2):
+        self.call = call
+        # Canonical URL -> the URL as the user wrote it
+        unique = {}
+        for url in urls:
+            unique.setdefault(canonicalize_url(url), url)
+        self.urls = unique if len(unique) <= limit else {}
+        self._tasks: Dict[str, Tuple[asyncio.Task, float]] = {}
+        self._finished: Dict[str, float] = {}
+
+    def start(self):
+        for url, original in self.urls.items():
+            task = asyncio.ensure_future(self.call("scrape_url", {"url": original}))
+            task.add_done_callback(lambda _, url=url: self._finished.setdefault(url, time.perf_counter()))
+            self._tasks[url] = (task, time.perf_counter())
+
+    def claim(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[asyncio.Task]:
+        """The speculative call serving this tool call, if any; each is handed out once."""
+        url = prefetchable(tool_name, arguments)
+        if url is None or url not in self._tasks:
+            return None
+        task, started = self._tasks.pop(url)
+        if task.cancelled():
+            return None
+        PREFETCHES.inc(outcome="hit")
+        SAVED_SECONDS.inc(self._finished.get(url, time.perf_counter()) - started)
+        return task
+
+    def claim_call(self, tool_name: str, arguments: Dict[str, Any], **kwargs) -> Awaitable[str]:
+        """A claimed prefetch if one matches, otherwise a fresh call."""
+        task = self.claim(tool_name, arguments)
+        return task if task is not None else self.call(tool_name, arguments, **kwargs)
+
+    async def aclose(self):
+        """Cancel every prefetch no tool call claimed."""
+        tasks = [task for task, _ in self._tasks.values()]
+        for task in tasks:
+            PREFETCHES.inc(outcome="unused")
+            task.cancel()
+        self._tasks.clear()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,129 @@
+"""Adaptive timeouts, retry backoff and a circuit breaker for upstream HTTP calls."""
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """Derives per-host timeouts from recently observed latencies.
+
+    Once a host has ``min_samples`` successful requests, its timeout is the
+    recent p99 latency times ``multiplier``, clamped to
+    ``[min_timeout, max_timeout]``. Until then ``max_timeout`` is used.
+    """
+
+    def __init__(self, window: int = 100, min_samples: int = 10, multiplier: float = 3.0,
+                 min_timeout: float = 10.0, max_timeout: float = 30.0, max_hosts: int = 1000):
+        self.window = window
+        self.min_samples = min_samples
+        self.multiplier = multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.max_hosts = max_hosts
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, host: str, seconds: float):
+        samples = self._samples.get(host)
+        if samples is None:
+            if len(self._samples) >= self.max_hosts:
+                # Forget the host added longest ago
+                self._samples.pop(next(iter(self._samples)))
+            samples = self._samples[host] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, host: str, pct: float) -> Optional[float]:
+        samples = self._samples.get(host)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def timeout_for(self, host: str) -> float:
+        samples = self._samples.get(host)
+        if samples is None or len(samples) < self.min_samples:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.percentile(host, 99) * self.multiplier))
+
+    def stats(self) -> Dict[str, Any]:
+        adaptive = sum(1 for s in self._samples.values() if len(s) >= self.min_samples)
+        return {"hosts_tracked": len(self._samples), "hosts_adaptive": adaptive}
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker around one upstream.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    calls fail fast. Once ``reset_timeout`` seconds have passed it lets a
+    single probe through (half-open); the probe's outcome closes or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; rejected calls are counted."""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will let a probe through."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def release(self):
+        """Give back a half-open probe slot for a call that ended without a verdict."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, error: str):
+        self.last_error = error
+        self.consecutive_failures += 1
+        if self.state == self.OPEN:
+            # A call started before the breaker opened; keep the original reset time
+            return
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after_seconds": round(self.retry_after(), 1),
+            "last_error": self.last_error,
+        }
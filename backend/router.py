@@ -0,0 +1,106 @@
+"""Routing of plain scrape requests straight to a tool.
+
+Most chats are "summarize <url>": the first model call only turns the URL
+into a ``scrape_url`` call. ``ScrapeRouter`` recognizes those messages with a
+few rules and builds the call itself, so the chat goes straight from the
+scrape to the summarizing completion. Anything it is unsure about is left to
+the model.
+"""
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from compaction import estimate_tokens
+from fingerprints import URL_PATTERN, extract_urls
+from metrics import REGISTRY
+
+ROUTES = REGISTRY.counter(
+    "chat_routes_total", "Chat requests by tool routing decision", ["route", "reason"]
+)
+SAVED_SECONDS = REGISTRY.counter(
+    "chat_router_saved_seconds_total", "Estimated tool-selection LLM time skipped by routed requests"
+)
+SAVED_TOKENS = REGISTRY.counter(
+    "chat_router_saved_tokens_total", "Estimated prompt tokens of the tool-selection LLM calls skipped"
+)
+
+# Requests a plain scrape does not cover, or where the model should choose
+NEEDS_MODEL = re.compile(
+    r"\b(crawl\w*|site\s?map|whole site|entire site|all pages|every page|subpages?|"
+    r"html|screenshots?|mobile|headers?|links?|metadata|wait|"
+    r"earlier|previous|before|again|don'?t|do not|without|instead)\b",
+    re.IGNORECASE
+)
+SIMPLE_INTENT = re.compile(
+    r"\b(summari[sz]e|summary|tl;?dr|gist|overview|analy[sz]e|analysis|extract|scrape|read|"
+    r"explain|describe|review|key points|main points|takeaways|insights|highlights|"
+    r"what (?:is|are|does)|tell me about)\b",
+    re.IGNORECASE
+)
+
+
+def decision(tool: Optional[str], reason: str, arguments: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {"tool": tool, "reason": reason, "arguments": arguments or {}}
+
+
+class ScrapeRouter:
+    """Decides whether a message can skip the model's tool selection.
+
+    A message is routed when it names between one and ``max_urls`` URLs, asks
+    for something a default scrape answers (summarize, analyze, explain, ...)
+    or nothing besides the URLs, and does not refer to earlier turns or to
+    options only the model would set. One URL becomes ``scrape_url``, several
+    become one ``scrape_many``.
+    """
+
+    def __init__(self, enabled: bool = True, max_urls: int = 20, smoothing: float = 0.2):
+        self.enabled = enabled
+        self.max_urls = max_urls
+        self.smoothing = smoothing
+        self.selection_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def decide(self, message: str, tools: List[Dict], history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """A ``{"tool", "reason", "arguments"}`` decision; ``tool`` is None to ask the model."""
+        if not self.enabled:
+            return decision(None, "disabled")
+        urls = list(dict.fromkeys(extract_urls(message)))
+        if not urls:
+            return decision(None, "no_url")
+        if len(urls) > self.max_urls:
+            return decision(None, "too_many_urls")
+
+        rest = URL_PATTERN.sub(" ", message)
+        if NEEDS_MODEL.search(rest):
+            return decision(None, "needs_model")
+        if rest.strip(" \t\r\n.,;:!?") and not SIMPLE_INTENT.search(rest):
+            return decision(None, "no_intent")
+
+        # The model may answer from tool results already in the conversation
+        earlier = "\n".join(str(m.get("content") or "") for m in history)
+        if any(url in earlier for url in urls):
+            return decision(None, "in_history")
+
+        tool = "scrape_url" if len(urls) == 1 else "scrape_many"
+        if tool not in {t["function"]["name"] for t in tools}:
+            return decision(None, "tool_unavailable")
+        arguments = {"url": urls[0]} if tool == "scrape_url" else {"urls": urls}
+        return decision(tool, "single_url" if len(urls) == 1 else "multiple_urls", arguments)
+
+    def record(self, route: Dict[str, Any], messages: List[Dict[str, Any]], tools: List[Dict]):
+        """Count a decision; a routed one also counts the model call it skipped."""
+        ROUTES.inc(route=route["tool"] or "llm", reason=route["reason"])
+        if route["tool"] is None:
+            return
+        SAVED_TOKENS.inc(estimate_tokens(json.dumps(messages)) + estimate_tokens(json.dumps(tools)))
+        if self.selection_seconds is not None:
+            SAVED_SECONDS.inc(self.selection_seconds)
+
+    def observe_selection(self, seconds: float):
+        """Time of a model call that chose a tool; its moving average is what routing saves."""
+        with self._lock:
+            if self.selection_seconds is None:
+                self.selection_seconds = seconds
+            else:
+                self.selection_seconds += self.smoothing * (seconds - self.selection_seconds)
@@ -0,0 +1,250 @@
+"""Two-tier cache (in-memory LRU + compressed on-disk blobs) for scrape API results."""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid"}
+# Scrape request fields that change the response and therefore the key
+KEY_PARAMS = ("formats", "onlyMainContent", "mobile", "includeRawHtml", "waitFor", "headers")
+
+# Disk blob layout: 8-byte big-endian expiry timestamp followed by zlib(JSON)
+_HEADER = struct.Struct(">d")
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so trivially different spellings share a cache entry.
+
+    Lower-cases scheme and host, drops default ports, fragments and common
+    tracking parameters, and sorts the query string.
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def cache_key(params: Dict[str, Any]) -> str:
+    """Key for a scrape request: canonical URL plus the options that affect the result."""
+    material: Dict[str, Any] = {"url": canonicalize_url(params["url"])}
+    for name in KEY_PARAMS:
+        if name not in params:
+            continue
+        value = params[name]
+        if name == "formats":
+            value = sorted(value)
+        elif name == "headers" and value:
+            value = {k.lower(): v for k, v in value.items()}
+        material[name] = value
+    encoded = json.dumps(material, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class MemoryLRU:
+    """Least-recently-used map bounded by the encoded size of its values."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return ``(value, expires_at)`` or None; expired entries are dropped."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at <= time.time():
+            self.delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return value, expires_at
+
+    def set(self, key: str, value: Any, size: int, expires_at: float):
+        self.delete(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size, expires_at)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+
+class DiskCache:
+    """Persistent tier of compressed blobs, shared by every server process.
+
+    Writes go through a temp file and ``os.replace`` so concurrent processes
+    never observe a partial blob. When the directory grows past ``max_bytes``
+    the least recently written blobs are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._bytes: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".bin")
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+        except OSError:
+            return None
+        try:
+            (expires_at,) = _HEADER.unpack_from(blob)
+            if expires_at <= time.time():
+                self._remove(path)
+                return None
+            return json.loads(zlib.decompress(blob[_HEADER.size:])), expires_at
+        except (struct.error, zlib.error, ValueError) as e:
+            logger.warning(f"Discarding corrupt cache blob {path}: {e}")
+            self._remove(path)
+            return None
+
+    def set(self, key: str, encoded: bytes, expires_at: float):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        blob = _HEADER.pack(expires_at) + zlib.compress(encoded, 6)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+
+        if self._bytes is None:
+            self._bytes = self._scan()[1]
+        else:
+            self._bytes += len(blob)
+        if self._bytes > self.max_bytes:
+            self._prune()
+
+    def _scan(self):
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".bin"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        return files, total
+
+    def _prune(self):
+        # Other processes write here too, so re-measure before deleting
+        files, total = self._scan()
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            if self._remove(path):
+                total -= size
+                self.evictions += 1
+        self._bytes = total
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+class ScrapeCache:
+    """Memory LRU in front of an optional disk tier, with per-entry TTLs."""
+
+    def __init__(
+        self,
+        memory_bytes: int = 64 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        disk_bytes: int = 512 * 1024 * 1024,
+        default_ttl: float = 600.0,
+    ):
+        self.default_ttl = default_ttl
+        self.memory = MemoryLRU(memory_bytes)
+        self.disk = DiskCache(disk_dir, disk_bytes) if disk_dir else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        hit = self.memory.get(key)
+        if hit is not None:
+            self.memory_hits += 1
+            return hit[0]
+
+        if self.disk is not None:
+            loop = asyncio.get_running_loop()
+            hit = await loop.run_in_executor(None, self.disk.get, key)
+            if hit is not None:
+                value, expires_at = hit
+                self.disk_hits += 1
+                self.memory.set(key, value, len(json.dumps(value)), expires_at)
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None):
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        encoded = json.dumps(value).encode("utf-8")
+        self.memory.set(key, value, len(encoded), expires_at)
+        self.writes += 1
+        if self.disk is not None:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self.disk.set, key, encoded, expires_at)
+            except OSError as e:
+                logger.warning(f"Failed to write scrape cache blob: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "writes": self.writes,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "memory_evictions": self.memory.evictions,
+            "disk_evictions": self.disk.evictions if self.disk else 0,
+            "disk_enabled": self.disk is not None,
+        }
@@ -0,0 +1,121 @@
+"""Process-wide pooled HTTP client for the scrape MCP server."""
+import logging
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Timeouts (seconds); replaces the old flat 30 s timeout
+CONNECT_TIMEOUT = float(os.getenv("SCRAPE_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("SCRAPE_READ_TIMEOUT", "30"))
+WRITE_TIMEOUT = float(os.getenv("SCRAPE_WRITE_TIMEOUT", "10"))
+POOL_TIMEOUT = float(os.getenv("SCRAPE_POOL_TIMEOUT", "10"))
+
+# Connection pool limits
+MAX_CONNECTIONS = int(os.getenv("SCRAPE_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SCRAPE_MAX_KEEPALIVE_CONNECTIONS", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("SCRAPE_KEEPALIVE_EXPIRY", "30"))
+HTTP2 = os.getenv("SCRAPE_HTTP2", "false").lower() == "true"
+
+
+class PoolStats:
+    """Connection pool counters built from httpcore trace events.
+
+    A request is "waiting" from the moment it is issued until it starts
+    sending headers, i.e. while it queues for a pool slot or connects. It is
+    "reused" if it sends headers without having opened a connection itself.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    def request_trace(self) -> Tuple[Callable, Callable[[], None]]:
+        """Return a trace callback for one request and a function to call when it ends."""
+        state = {"opened": False, "sent": False}
+        self.requests += 1
+        self.in_flight += 1
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == "connection.connect_tcp.complete":
+                state["opened"] = True
+                self.connections_opened += 1
+            elif event_name.endswith(".send_request_headers.started") and not state["sent"]:
+                state["sent"] = True
+                self.waiting -= 1
+                if not state["opened"]:
+                    self.connections_reused += 1
+
+        def done():
+            self.in_flight -= 1
+            if not state["sent"]:
+                self.waiting -= 1
+
+        return trace, done
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+            "max_connections": MAX_CONNECTIONS,
+            "max_keepalive_connections": MAX_KEEPALIVE_CONNECTIONS,
+            "http2": _http2_enabled,
+        }
+
+
+pool_stats = PoolStats()
+_client: Optional[httpx.AsyncClient] = None
+_http2_enabled = False
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared AsyncClient, creating it on first use."""
+    global _client, _http2_enabled
+    if _client is None or _client.is_closed:
+        _http2_enabled = HTTP2
+        if HTTP2 and not _http2_available():
+            logger.warning("SCRAPE_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+            _http2_enabled = False
+        _client = httpx.AsyncClient(
+            http2=_http2_enabled,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                connect=CONNECT_TIMEOUT,
+                read=READ_TIMEOUT,
+                write=WRITE_TIMEOUT,
+                pool=POOL_TIMEOUT
+            )
+        )
+    return _client
+
+
+async def close_http_client():
+    """Close the shared client and its pooled connections."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
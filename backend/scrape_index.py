@@ -0,0 +1,270 @@
+"""Full-text index of scraped pages for answering follow-up questions.
+
+Every page the scrape server fetches is split into heading-aware chunks and
+added to an SQLite FTS5 table; ``search`` returns the chunks that best match
+a question, ranked by BM25, so a later question about the same pages needs
+neither a new scrape nor the whole page in the prompt. The index lives on
+disk and is shared by all server processes; a page is re-indexed only when
+its content changes.
+"""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from metrics import Histogram
+from scrape_cache import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+# Shipped to the backend's /metrics with the scrape server's other histograms
+SEARCH_INDEX_SECONDS = Histogram(
+    "search_index_seconds", "Time to index a scraped page or search the index", ["operation"]
+)
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in", "is",
+    "it", "me", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "which", "who",
+    "why", "with", "you", "about", "page", "tell",
+}
+
+
+def chunk_markdown(markdown: str, max_chars: int = 1500) -> List[str]:
+    """Split markdown into chunks of about ``max_chars`` at paragraph boundaries.
+
+    A chunk that starts under a heading it does not contain is prefixed with
+    that heading, so each chunk says what it is about. Paragraphs longer than
+    ``max_chars`` are split between sentences.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    heading = ""
+
+    def emit():
+        nonlocal size
+        if current and any(not block.startswith("#") for block in current):
+            chunks.append("\n\n".join(current))
+        current.clear()
+        size = 0
+
+    for block in (b.strip() for b in markdown.split("\n\n")):
+        if not block:
+            continue
+        pieces = [block]
+        if len(block) > max_chars:
+            pieces = []
+            piece = ""
+            for sentence in _SENTENCE_END.split(block):
+                while len(sentence) > max_chars:
+                    pieces.append(sentence[:max_chars])
+                    sentence = sentence[max_chars:]
+                if piece and len(piece) + len(sentence) + 1 > max_chars:
+                    pieces.append(piece)
+                    piece = ""
+                piece = f"{piece} {sentence}".strip()
+            if piece:
+                pieces.append(piece)
+        for piece in pieces:
+            if piece.startswith("#"):
+                emit()
+                heading = piece.split("\n", 1)[0]
+            elif size + len(piece) > max_chars and current:
+                emit()
+                if heading:
+                    current.append(heading)
+                    size = len(heading)
+            current.append(piece)
+            size += len(piece) + 2
+    emit()
+    return chunks
+
+
+def match_expression(query: str) -> Optional[str]:
+    """FTS5 query matching any of the question's meaningful words, or None if it has none."""
+    words = [w for w in dict.fromkeys(_WORD.findall(query.lower())) if w not in STOPWORDS and len(w) > 1]
+    if not words:
+        return None
+    return " OR ".join(f'"{word}"' for word in words)
+
+
+class ScrapeIndex:
+    """SQLite FTS5 index of scraped page chunks, ranked with BM25.
+
+    ``pages`` holds one row per canonical URL and ``chunks`` the chunk text;
+    ``chunks_fts`` indexes the chunks' title and content, kept in sync by
+    triggers. When more than ``max_pages`` pages are indexed the least
+    recently indexed ones are dropped. ``cache_mb`` bounds SQLite's page
+    cache per connection. Raises ``sqlite3.OperationalError`` if SQLite was
+    built without FTS5.
+    """
+
+    def __init__(self, path: str, chunk_chars: int = 1500, max_pages: int = 5000, cache_mb: float = 8.0):
+        self.path = path
+        self.chunk_chars = chunk_chars
+        self.max_pages = max_pages
+        self.cache_mb = cache_mb
+        self.pages_indexed = 0
+        self.pages_unchanged = 0
+        self.pages_pruned = 0
+        self.searches = 0
+        self.index_seconds = 0.0
+        self.search_seconds = 0.0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Several scrape server processes write here; wait for each other's transactions
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA cache_size=-{int(cache_mb * 1024)}")
+        self._db.executescript(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                chunks INTEGER NOT NULL,
+                indexed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_indexed_at ON pages (indexed_at);
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_url ON chunks (url);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                title, content, content='chunks', content_rowid='id', tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            END;"""
+        )
+        self._db.commit()
+
+    def add_page(self, url: str, title: str, markdown: str) -> int:
+        """Index a scraped page, replacing an older version; returns the number of chunks written."""
+        started = time.perf_counter()
+        url = canonicalize_url(url)
+        digest = hashlib.sha256(f"{title}\n{markdown}".encode("utf-8")).hexdigest()
+        with self._lock:
+            row = self._db.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is not None and row[0] == digest:
+                # Unchanged: only mark it recently used
+                self._db.execute("UPDATE pages SET indexed_at = ? WHERE url = ?", (time.time(), url))
+                self._db.commit()
+                self.pages_unchanged += 1
+                return 0
+            chunks = chunk_markdown(markdown, self.chunk_chars)
+            with self._db:
+                self._db.execute("DELETE FROM chunks WHERE url = ?", (url,))
+                self._db.executemany(
+                    "INSERT INTO chunks (url, position, title, content) VALUES (?, ?, ?, ?)",
+                    [(url, position, title, chunk) for position, chunk in enumerate(chunks)]
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                    (url, title, digest, len(chunks), time.time())
+                )
+                self._prune()
+            self.pages_indexed += 1
+        elapsed = time.perf_counter() - started
+        self.index_seconds += elapsed
+        SEARCH_INDEX_SECONDS.observe(elapsed, operation="index")
+        return len(chunks)
+
+    def _prune(self):
+        (pages,) = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()
+        if pages <= self.max_pages:
+            return
+        oldest = [
+            url for (url,) in self._db.execute(
+                "SELECT url FROM pages ORDER BY indexed_at LIMIT ?", (pages - self.max_pages,)
+            )
+        ]
+        for url in oldest:
+            self._db.execute("DELETE FROM chunks WHERE url = ?", (url,))
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+        self.pages_pruned += len(oldest)
+
+    def search(self, query: str, top_k: int = 5, url: Optional[str] = None) -> List[Dict[str, Any]]:
+        """The ``top_k`` chunks that best match ``query``, optionally from one page only."""
+        expression = match_expression(query)
+        if expression is None:
+            return []
+        started = time.perf_counter()
+        if url is None:
+            # Rank inside FTS5 first so only the top chunks are joined
+            matches = (
+                "SELECT rowid AS id, bm25(chunks_fts, 2.0, 1.0) AS score FROM chunks_fts "
+                "WHERE chunks_fts MATCH ? ORDER BY score LIMIT ?"
+            )
+            args: List[Any] = [expression, top_k]
+        else:
+            matches = (
+                "SELECT chunks_fts.rowid AS id, bm25(chunks_fts, 2.0, 1.0) AS score "
+                "FROM chunks_fts JOIN chunks ON chunks.id = chunks_fts.rowid "
+                "WHERE chunks_fts MATCH ? AND chunks.url = ? ORDER BY score LIMIT ?"
+            )
+            args = [expression, canonicalize_url(url), top_k]
+        sql = (
+            "SELECT c.url, c.title, c.position, p.chunks, p.indexed_at, c.content, m.score "
+            f"FROM ({matches}) m JOIN chunks c ON c.id = m.id JOIN pages p ON p.url = c.url ORDER BY m.score"
+        )
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+            self.searches += 1
+        elapsed = time.perf_counter() - started
+        self.search_seconds += elapsed
+        SEARCH_INDEX_SECONDS.observe(elapsed, operation="search")
+        return [
+            {
+                "url": row[0],
+                "title": row[1],
+                "position": row[2],
+                "chunks": row[3],
+                "indexed_at": row[4],
+                "content": row[5],
+                # bm25() is lower for better matches; report it as a positive relevance
+                "score": round(-row[6], 3),
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (pages,) = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()
+            (chunks,) = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()
+        db_bytes = 0
+        for suffix in ("", "-wal"):
+            try:
+                db_bytes += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return {
+            "pages": pages,
+            "chunks": chunks,
+            "db_bytes": db_bytes,
+            "cache_limit_bytes": int(self.cache_mb * 1024 * 1024),
+            "pages_indexed": self.pages_indexed,
+            "pages_unchanged": self.pages_unchanged,
+            "pages_pruned": self.pages_pruned,
+            "index_seconds": round(self.index_seconds, 3),
+            "searches": self.searches,
+            "search_seconds": round(self.search_seconds, 3),
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
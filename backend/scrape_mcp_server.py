@@ -1,33 +1,361 @@
-from typing import Any, Dict, Optional, List
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
+import json
+import logging
+import os
+import sqlite3
+import time
+from urllib.parse import urljoin, urlsplit
+
 import httpx
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+
+from crawl_frontier import CrawlFrontier
+from host_limiter import HostLimiter
+from json_stream import JsonProjector
+from local_scrape import LOCAL_SCRAPE_SECONDS, LocalScraper, ScrapePolicy, route_scrape
+from metrics import Histogram
+from resilience import CircuitBreaker, LatencyTracker, backoff_delay
+from scrape_cache import ScrapeCache, cache_key, canonicalize_url
+from scrape_index import SEARCH_INDEX_SECONDS, ScrapeIndex
+from scrape_http import (
+    CONNECT_TIMEOUT,
+    POOL_TIMEOUT,
+    READ_TIMEOUT,
+    WRITE_TIMEOUT,
+    close_http_client,
+    get_http_client,
+    pool_stats,
+)
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# stdio: a private child of one backend process. streamable-http / sse: one
+# long-lived service shared by every backend worker.
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio")
+MCP_SERVER_HOST = os.getenv("MCP_SERVER_HOST", "127.0.0.1")
+MCP_SERVER_PORT = int(os.getenv("MCP_SERVER_PORT", "8100"))
+MCP_DRAIN_TIMEOUT = float(os.getenv("MCP_DRAIN_TIMEOUT", "30"))  # seconds
+MCP_KEEP_ALIVE = float(os.getenv("MCP_KEEP_ALIVE", "75"))  # seconds
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Release pooled HTTP connections when a stdio server shuts down."""
+    try:
+        yield
+    finally:
+        # Network transports enter this per session; their client lives as long as the process
+        if MCP_TRANSPORT == "stdio":
+            await close_http_client()
+            local_scraper.close()
 
-# Initialize FastMCP server
-mcp = FastMCP("scrape-service")
+# Initialize FastMCP server; stateless so any worker's request can land on any session
+mcp = FastMCP(
+    "scrape-service",
+    lifespan=lifespan,
+    host=MCP_SERVER_HOST,
+    port=MCP_SERVER_PORT,
+    stateless_http=True
+)
 
 # Constants
-API_ENDPOINT = "http://localhost:8000/api/v1/scrape"
-TIMEOUT = 30  # seconds
+API_ENDPOINT = os.getenv("SCRAPE_API_ENDPOINT", "http://localhost:8000/api/v1/scrape")
+STARTED_AT = time.time()
+
+# Result cache; the disk tier is shared by all server processes
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "scrape_cache")
+CACHE_ENABLED = os.getenv("SCRAPE_CACHE_ENABLED", "true").lower() == "true"
+scrape_cache = ScrapeCache(
+    memory_bytes=int(os.getenv("SCRAPE_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+    disk_dir=os.getenv("SCRAPE_CACHE_DIR", DEFAULT_CACHE_DIR) or None,
+    disk_bytes=int(os.getenv("SCRAPE_CACHE_DISK_MB", "512")) * 1024 * 1024,
+    default_ttl=float(os.getenv("SCRAPE_CACHE_TTL", "600"))
+)
+# Identical scrapes already in flight share one upstream request
+inflight = SingleFlight()
+
+# Full-text index of every scraped page, searched by search_scraped
+DEFAULT_SEARCH_INDEX_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "scrape_index.sqlite3")
+SEARCH_INDEX_MAX_RESULTS = int(os.getenv("SEARCH_INDEX_MAX_RESULTS", "10"))
+search_index: Optional[ScrapeIndex] = None
+if os.getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true":
+    try:
+        search_index = ScrapeIndex(
+            os.getenv("SEARCH_INDEX_DB", DEFAULT_SEARCH_INDEX_DB),
+            chunk_chars=int(os.getenv("SEARCH_INDEX_CHUNK_CHARS", "1500")),
+            max_pages=int(os.getenv("SEARCH_INDEX_MAX_PAGES", "5000")),
+            cache_mb=float(os.getenv("SEARCH_INDEX_CACHE_MB", "8"))
+        )
+    except sqlite3.OperationalError as e:
+        # Most likely an SQLite build without FTS5
+        logger.warning(f"Scraped page search disabled: {e}")
+
+# Shipped to the backend's /metrics through the stats resource
+SCRAPE_SECONDS = Histogram(
+    "scrape_request_seconds", "Scrape API request time in the MCP server", ["outcome"]
+)
+
+# Scrape API resilience: retries, per-host adaptive read timeouts, circuit breaker
+SCRAPE_MAX_RETRIES = int(os.getenv("SCRAPE_MAX_RETRIES", "2"))
+SCRAPE_RETRY_BASE_DELAY = float(os.getenv("SCRAPE_RETRY_BASE_DELAY", "0.25"))  # seconds
+SCRAPE_RETRY_MAX_DELAY = float(os.getenv("SCRAPE_RETRY_MAX_DELAY", "2"))  # seconds
+ADAPTIVE_TIMEOUTS = os.getenv("SCRAPE_ADAPTIVE_TIMEOUT", "true").lower() == "true"
+RETRYABLE_STATUS = {500, 502, 503, 504}
+# Failures where the request cannot have been processed, so retrying is safe
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+latency_tracker = LatencyTracker(
+    multiplier=float(os.getenv("SCRAPE_TIMEOUT_MULTIPLIER", "3")),
+    min_timeout=float(os.getenv("SCRAPE_TIMEOUT_MIN", "10")),
+    max_timeout=READ_TIMEOUT
+)
+breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("SCRAPE_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("SCRAPE_BREAKER_RESET", "30"))
+)
+retry_count = 0
+
+# Engine choice: the scrape API, or fetching static pages directly (local_scrape.py)
+scrape_policy = ScrapePolicy(
+    mode=os.getenv("SCRAPE_ENGINE", "remote"),
+    local_domains=os.getenv("SCRAPE_LOCAL_DOMAINS", "").split(","),
+    remote_domains=os.getenv("SCRAPE_REMOTE_DOMAINS", "").split(","),
+    remember_seconds=float(os.getenv("SCRAPE_LOCAL_REMEMBER", "3600")),
+    remember_after=int(os.getenv("SCRAPE_LOCAL_REMEMBER_AFTER", "3"))
+)
+local_scraper = LocalScraper(
+    workers=int(os.getenv("SCRAPE_LOCAL_WORKERS", "2")),
+    max_bytes=int(float(os.getenv("SCRAPE_LOCAL_MAX_MB", "5")) * 1024 * 1024),
+    min_chars=int(os.getenv("SCRAPE_LOCAL_MIN_CHARS", "200")),
+    read_timeout=float(os.getenv("SCRAPE_LOCAL_TIMEOUT", "15")),
+    user_agent=os.getenv("SCRAPE_LOCAL_USER_AGENT", "Mozilla/5.0 (compatible; scrape-service/1.0)"),
+    # Off by default: page URLs could otherwise reach internal services and cloud metadata
+    allow_private=os.getenv("SCRAPE_LOCAL_ALLOW_PRIVATE", "false").lower() == "true"
+)
+
+# Response bodies are parsed as they stream in, keeping only the fields the tools read
+SCRAPE_RESPONSE_FIELDS = {
+    "success": True,
+    "error": True,
+    "data": {"markdown": True, "metadata": True, "links": True}
+}
+SCRAPE_MAX_RESPONSE_BYTES = int(float(os.getenv("SCRAPE_MAX_RESPONSE_MB", "16")) * 1024 * 1024)
+SCRAPE_MAX_FIELD_CHARS = int(os.getenv("SCRAPE_MAX_FIELD_CHARS", "1000000"))
+response_stats = {
+    "responses": 0,
+    "truncated": 0,
+    "bytes_received": 0,
+    "max_response_bytes": 0,
+    "last_rss_bytes": 0,
+    "peak_rss_bytes": 0
+}
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process in bytes (0 if unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if os.uname().sysname == "Darwin" else rss * 1024
+    except (ImportError, AttributeError):
+        return 0
+
+def collect_stats() -> Dict[str, Any]:
+    """Process statistics reported to the backend's session pool."""
+    return {
+        "pid": os.getpid(),
+        "transport": MCP_TRANSPORT,
+        "rss_bytes": current_rss_bytes(),
+        "uptime_seconds": round(time.time() - STARTED_AT, 1),
+        "http_pool": pool_stats.snapshot(),
+        "scrape_cache": scrape_cache.stats(),
+        "inflight": inflight.stats(),
+        "breaker": breaker.stats(),
+        "retries": retry_count,
+        "adaptive_timeouts": latency_tracker.stats(),
+        "responses": dict(response_stats),
+        "scrape_engine": dict(scrape_policy.stats(), local=local_scraper.stats()),
+        "search_index": search_index.stats() if search_index is not None else None,
+        "metrics": [SCRAPE_SECONDS.snapshot(), LOCAL_SCRAPE_SECONDS.snapshot(), SEARCH_INDEX_SECONDS.snapshot()]
+    }
+
+# Bulk scraping (scrape_many)
+SCRAPE_MANY_MAX_URLS = int(os.getenv("SCRAPE_MANY_MAX_URLS", "20"))
+SCRAPE_MANY_CONCURRENCY = int(os.getenv("SCRAPE_MANY_CONCURRENCY", "8"))
+SCRAPE_MANY_TIMEOUT = float(os.getenv("SCRAPE_MANY_TIMEOUT", "45"))  # seconds
+SCRAPE_MANY_MAX_CHARS = int(os.getenv("SCRAPE_MANY_MAX_CHARS", "60000"))
+host_limiter = HostLimiter(
+    per_host_concurrency=int(os.getenv("SCRAPE_HOST_CONCURRENCY", "2")),
+    min_interval=float(os.getenv("SCRAPE_HOST_INTERVAL", "0.25"))
+)
+
+# Site crawling (crawl_site)
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "50"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "3"))
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "75"))  # seconds; below the backend's tool timeout
+CRAWL_MAX_CHARS = int(os.getenv("CRAWL_MAX_CHARS", "40000"))
+
+def truncate(text: str, max_chars: int) -> str:
+    """Cut text to max_chars, noting how much was dropped."""
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars].rstrip()}\n\n[... truncated {len(text) - max_chars} characters]"
 
 async def make_scrape_request(params: Dict[str, Any]) -> Dict[str, Any]:
-    """Make a request to the scrape API with proper error handling."""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                API_ENDPOINT, 
-                json=params,
-                timeout=TIMEOUT
-            )
+    """Make a request to the scrape API with proper error handling.
+
+    Transient failures (connect errors, 5xx) are retried with jittered
+    backoff, and calls fail fast while the circuit breaker is open.
+    """
+    global retry_count
+    host = (urlsplit(params.get("url", "")).hostname or "").lower()
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            return {
+                "success": False,
+                "error": f"Scrape API unavailable (circuit breaker open, retry in {breaker.retry_after():.0f}s)"
+            }
+        result, retryable = await attempt_scrape_request(params, host)
+        if not retryable or attempt >= SCRAPE_MAX_RETRIES:
+            return result
+        await asyncio.sleep(backoff_delay(attempt, SCRAPE_RETRY_BASE_DELAY, SCRAPE_RETRY_MAX_DELAY))
+        attempt += 1
+        retry_count += 1
+
+async def attempt_scrape_request(params: Dict[str, Any], host: str) -> Tuple[Dict[str, Any], bool]:
+    """One scrape API call; returns the result and whether a retry may help."""
+    trace, done = pool_stats.request_trace()
+    started = time.perf_counter()
+    outcome = "error"
+    read_timeout = latency_tracker.timeout_for(host) if ADAPTIVE_TIMEOUTS else READ_TIMEOUT
+    try:
+        async with get_http_client().stream(
+            "POST",
+            API_ENDPOINT,
+            json=params,
+            timeout=httpx.Timeout(CONNECT_TIMEOUT, read=read_timeout, write=WRITE_TIMEOUT, pool=POOL_TIMEOUT),
+            extensions={"trace": trace}
+        ) as response:
+            outcome = f"{response.status_code // 100}xx"
+            if response.status_code >= 500:
+                breaker.record_failure(f"HTTP {response.status_code}")
+                response.raise_for_status()
+            # Any other response means the upstream is up
+            breaker.record_success()
             response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+            result = await read_scrape_response(response)
+        latency_tracker.observe(host, time.perf_counter() - started)
+        return result, False
+    except httpx.HTTPStatusError as e:
+        return {"success": False, "error": str(e)}, e.response.status_code in RETRYABLE_STATUS
+    except httpx.PoolTimeout as e:
+        # Local connection pool exhaustion says nothing about the upstream
+        breaker.release()
+        return {"success": False, "error": f"Scrape connection pool timeout: {e}"}, False
+    except httpx.TransportError as e:
+        if isinstance(e, httpx.TimeoutException):
+            outcome = "timeout"
+        breaker.record_failure(f"{type(e).__name__}: {e}")
+        return {"success": False, "error": str(e) or type(e).__name__}, isinstance(e, RETRYABLE_ERRORS)
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        breaker.release()
+        return {"success": False, "error": str(e)}, False
+    finally:
+        done()
+        SCRAPE_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+
+async def read_scrape_response(response: httpx.Response) -> Dict[str, Any]:
+    """Parse a streamed scrape API response, stopping at SCRAPE_MAX_RESPONSE_BYTES.
+
+    Fields the tools never read (html, rawHtml, screenshots) are skipped as
+    they arrive; a body over the cap is cut off and the text read so far is
+    returned with a truncation marker.
+    """
+    projector = JsonProjector(SCRAPE_RESPONSE_FIELDS, max_string_chars=SCRAPE_MAX_FIELD_CHARS)
+    received = 0
+    truncated = False
+    async for chunk in response.aiter_bytes():
+        if received + len(chunk) > SCRAPE_MAX_RESPONSE_BYTES:
+            chunk = chunk[:SCRAPE_MAX_RESPONSE_BYTES - received]
+            truncated = True
+        received += len(chunk)
+        projector.feed(chunk)
+        if truncated or projector.done:
+            break
+    result = projector.finish(f"response truncated at {SCRAPE_MAX_RESPONSE_BYTES // 1024} KiB")
+    if not isinstance(result, dict):
+        raise ValueError("Scrape API returned an incomplete or non-object JSON response")
+    if truncated:
+        # Cut before "success" was read: whatever data arrived is still usable
+        result.setdefault("success", "data" in result)
+
+    rss = current_rss_bytes()
+    response_stats["responses"] += 1
+    response_stats["truncated"] += int(truncated)
+    response_stats["bytes_received"] += received
+    response_stats["max_response_bytes"] = max(response_stats["max_response_bytes"], received)
+    response_stats["last_rss_bytes"] = rss
+    response_stats["peak_rss_bytes"] = max(response_stats["peak_rss_bytes"], rss)
+    return result
+
+async def fetch_scrape(
+    params: Dict[str, Any],
+    use_cache: bool = True,
+    force_refresh: bool = False,
+    ttl: Optional[float] = None
+) -> Dict[str, Any]:
+    """Scrape through the result cache, scraping only on a miss.
+
+    Misses go to the engine SCRAPE_ENGINE picks, and concurrent misses for the
+    same request are coalesced into one scrape.
+    """
+    caching = CACHE_ENABLED and use_cache
+    key = cache_key(params)
+    if caching and not force_refresh:
+        cached = await scrape_cache.get(key)
+        if cached is not None:
+            return cached
+
+    async def scrape() -> Dict[str, Any]:
+        result = await route_scrape(params, scrape_policy, local_scraper, make_scrape_request)
+        if caching and result.get("success", False):
+            await scrape_cache.set(key, result, ttl)
+        if result.get("success", False):
+            await index_page(params["url"], result.get("data", {}))
+        return result
+
+    return await inflight.do(key, scrape)
+
+async def index_page(url: str, data: Dict[str, Any]):
+    """Add a freshly scraped page to the search index; failures only cost search results."""
+    markdown = data.get("markdown")
+    if search_index is None or not markdown:
+        return
+    title = data.get("metadata", {}).get("title") or url
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, search_index.add_page, url, title, markdown)
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to index {url}: {e}")
 
 @mcp.tool()
 async def scrape_url(
     url: str, 
     get_full_content: bool = True,
-    only_main_content: bool = True
+    only_main_content: bool = True,
+    use_cache: bool = True,
+    force_refresh: bool = False
 ) -> str:
     """Scrape content from a URL and return the content.
     
@@ -35,18 +363,21 @@ async def scrape_url(
         url: The URL to scrape
         get_full_content: Whether to get full content or just metadata
         only_main_content: Whether to extract only the main content
+        use_cache: Whether to serve a recently cached copy of the page
+        force_refresh: Whether to re-scrape and overwrite any cached copy
     """
     # Configure parameters
+    # Only request the formats this tool returns
     params = {
         "url": url,
-        "formats": ["markdown", "html"],
+        "formats": ["markdown"] if get_full_content else ["links"],
         "onlyMainContent": only_main_content,
         "includeRawHtml": False,
         "includeScreenshot": False
     }
     
     # Make the API call
-    result = await make_scrape_request(params)
+    result = await fetch_scrape(params, use_cache, force_refresh)
     
     if not result.get("success", False):
         error_msg = result.get("error", "Unknown error")
@@ -92,7 +423,10 @@ async def scrape_advanced(
     mobile: bool = False,
     include_raw_html: bool = False,
     wait_time: Optional[int] = None,
-    custom_headers: Optional[Dict[str, str]] = None
+    custom_headers: Optional[Dict[str, str]] = None,
+    use_cache: bool = True,
+    force_refresh: bool = False,
+    cache_ttl: Optional[int] = None
 ) -> str:
     """Advanced web scraping with additional options.
     
@@ -102,11 +436,14 @@ async def scrape_advanced(
         include_raw_html: Whether to include raw HTML in response
         wait_time: Time to wait after page load in milliseconds
         custom_headers: Custom HTTP headers to send with request
+        use_cache: Whether to serve a recently cached copy of the page
+        force_refresh: Whether to re-scrape and overwrite any cached copy
+        cache_ttl: How long to cache this result, in seconds
     """
     # Configure parameters
     params = {
         "url": url,
-        "formats": ["markdown", "html"],
+        "formats": ["markdown"],
         "onlyMainContent": True,
         "includeRawHtml": include_raw_html,
         "mobile": mobile
@@ -119,7 +456,7 @@ async def scrape_advanced(
         params["headers"] = custom_headers
     
     # Make the API call
-    result = await make_scrape_request(params)
+    result = await fetch_scrape(params, use_cache, force_refresh, cache_ttl)
     
     if not result.get("success", False):
         error_msg = result.get("error", "Unknown error")
@@ -141,6 +478,253 @@ async def scrape_advanced(
 {markdown_content}
     """.strip()
 
+@mcp.tool()
+async def scrape_many(
+    urls: List[str],
+    only_main_content: bool = True,
+    max_chars_per_page: Optional[int] = None,
+    use_cache: bool = True,
+    force_refresh: bool = False
+) -> str:
+    """Scrape several URLs in parallel and return one combined result.
+    
+    Use this instead of repeated scrape_url calls when a request involves
+    multiple pages. Duplicate URLs are scraped once; pages that fail or time
+    out are reported without holding back the others.
+    
+    Args:
+        urls: The URLs to scrape
+        only_main_content: Whether to extract only the main content
+        max_chars_per_page: Upper bound on content characters kept per page
+        use_cache: Whether to serve recently cached copies of pages
+        force_refresh: Whether to re-scrape and overwrite any cached copies
+    """
+    # Deduplicate on the canonical form, keeping the caller's order
+    unique: Dict[str, str] = {}
+    for url in urls:
+        unique.setdefault(canonicalize_url(url), url)
+    targets = list(unique.values())
+    skipped = targets[SCRAPE_MANY_MAX_URLS:]
+    targets = targets[:SCRAPE_MANY_MAX_URLS]
+    if not targets:
+        return "Error: no URLs provided"
+    
+    semaphore = asyncio.Semaphore(SCRAPE_MANY_CONCURRENCY)
+    
+    async def scrape_one(url: str) -> Dict[str, Any]:
+        params = {
+            "url": url,
+            "formats": ["markdown"],
+            "onlyMainContent": only_main_content,
+            "includeRawHtml": False,
+            "includeScreenshot": False
+        }
+        # Host slot first: a page queued behind a busy host must not hold a global slot
+        async with host_limiter.slot(url):
+            async with semaphore:
+                return await fetch_scrape(params, use_cache, force_refresh)
+    
+    tasks = [asyncio.ensure_future(scrape_one(url)) for url in targets]
+    await asyncio.wait(tasks, timeout=SCRAPE_MANY_TIMEOUT)
+    
+    pages = []
+    failures = []
+    for url, task in zip(targets, tasks):
+        if not task.done():
+            task.cancel()
+            failures.append(f"- {url}: timed out after {SCRAPE_MANY_TIMEOUT:.0f} seconds")
+            continue
+        result = task.result() if not task.exception() else {"success": False, "error": str(task.exception())}
+        if not result.get("success", False):
+            failures.append(f"- {url}: {result.get('error', 'Unknown error')}")
+            continue
+        pages.append((url, result.get("data", {})))
+    
+    # Share the output budget between the pages that succeeded
+    budget = SCRAPE_MANY_MAX_CHARS // max(1, len(pages))
+    if max_chars_per_page is not None:
+        budget = min(budget, max_chars_per_page)
+    
+    sections = [f"# Scraped {len(pages)} of {len(targets)} pages"]
+    for index, (url, data) in enumerate(pages, 1):
+        metadata = data.get("metadata", {})
+        title = metadata.get("title", "No title")
+        description = metadata.get("description", "")
+        markdown_content = truncate(data.get("markdown", "No content available"), budget)
+        sections.append(f"## [{index}] {title}\nURL: {url}\n\n{description}\n\n{markdown_content}".strip())
+    if failures:
+        sections.append("## Failed\n" + "\n".join(failures))
+    if skipped:
+        sections.append(f"## Skipped\n{len(skipped)} URLs over the limit of {SCRAPE_MANY_MAX_URLS}")
+    
+    return "\n\n".join(sections)
+
+@mcp.tool()
+async def crawl_site(
+    url: str,
+    max_depth: int = 2,
+    max_pages: int = 20,
+    only_main_content: bool = True,
+    use_cache: bool = True,
+    ctx: Optional[Context] = None
+) -> str:
+    """Crawl a website from a starting URL and return a digest of its pages.
+    
+    Follows links on the same site, breadth first, preferring pages under the
+    starting URL's path. Use this to summarize documentation or other
+    multi-page sites instead of calling scrape_url page by page.
+    
+    Args:
+        url: The page to start crawling from
+        max_depth: How many links away from the starting page to follow
+        max_pages: Maximum number of pages to scrape
+        only_main_content: Whether to extract only the main content
+        use_cache: Whether to serve recently cached copies of pages
+    """
+    max_depth = max(0, min(max_depth, CRAWL_MAX_DEPTH))
+    max_pages = max(1, min(max_pages, CRAWL_MAX_PAGES))
+    frontier = CrawlFrontier(url)
+    frontier.add(url, 0)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CRAWL_TIMEOUT
+    
+    async def scrape_page(page_url: str) -> Dict[str, Any]:
+        params = {
+            "url": page_url,
+            "formats": ["markdown", "links"],
+            "onlyMainContent": only_main_content,
+            "includeRawHtml": False,
+            "includeScreenshot": False
+        }
+        async with host_limiter.slot(page_url):
+            return await fetch_scrape(params, use_cache)
+    
+    pages = []
+    failures = []
+    running: Dict[asyncio.Future, Tuple[str, int]] = {}
+    timed_out = False
+    while frontier or running:
+        while frontier and len(running) < CRAWL_CONCURRENCY and len(pages) + len(running) < max_pages:
+            page_url, depth = frontier.pop()
+            running[asyncio.ensure_future(scrape_page(page_url))] = (page_url, depth)
+        if not running:
+            break
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            timed_out = True
+            break
+        done, _ = await asyncio.wait(running, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            page_url, depth = running.pop(task)
+            result = task.result() if not task.exception() else {"success": False, "error": str(task.exception())}
+            if not result.get("success", False):
+                failures.append(f"- {page_url}: {result.get('error', 'Unknown error')}")
+                continue
+            data = result.get("data", {})
+            pages.append((page_url, depth, data))
+            if depth < max_depth:
+                for link in data.get("links", []):
+                    if isinstance(link, str):
+                        frontier.add(urljoin(page_url, link), depth + 1)
+            if ctx is not None:
+                # Partial progress for clients that asked for it
+                await ctx.report_progress(len(pages), max_pages, f"Scraped {page_url}")
+    
+    for task, (page_url, _) in running.items():
+        task.cancel()
+        failures.append(f"- {page_url}: not finished within {CRAWL_TIMEOUT:.0f} seconds")
+    
+    # Share the output budget between the pages, in crawl order
+    pages.sort(key=lambda page: page[1])
+    budget = CRAWL_MAX_CHARS // max(1, len(pages))
+    sections = [
+        f"# Crawled {len(pages)} pages from {url}",
+        f"Depth limit {max_depth}, page limit {max_pages}; {frontier.seen} distinct links found, "
+        f"{len(frontier)} left unvisited" + (" (stopped at the time limit)" if timed_out else "")
+    ]
+    for index, (page_url, depth, data) in enumerate(pages, 1):
+        metadata = data.get("metadata", {})
+        title = metadata.get("title", "No title")
+        markdown_content = truncate(data.get("markdown", "No content available"), budget)
+        sections.append(f"## [{index}] {title}\nURL: {page_url} (depth {depth})\n\n{markdown_content}".strip())
+    if failures:
+        sections.append("## Failed\n" + "\n".join(failures))
+    
+    return "\n\n".join(sections)
+
+@mcp.tool()
+async def search_scraped(query: str, url: Optional[str] = None, top_k: int = 5) -> str:
+    """Search the pages scraped so far and return the passages that best answer a question.
+    
+    Use this for follow-up questions about pages that were already scraped
+    (in this or an earlier conversation) instead of scraping them again; it
+    returns only the relevant parts of each page. Scrape the page if nothing
+    relevant is found or it may have changed.
+    
+    Args:
+        query: The question or keywords to look for
+        url: Only search this page
+        top_k: Number of passages to return
+    """
+    if search_index is None:
+        return "Error: the scraped page index is disabled"
+    top_k = max(1, min(top_k, SEARCH_INDEX_MAX_RESULTS))
+    loop = asyncio.get_running_loop()
+    try:
+        passages = await loop.run_in_executor(None, search_index.search, query, top_k, url)
+    except sqlite3.Error as e:
+        return f"Error searching scraped pages: {e}"
+    if not passages:
+        where = f" from {url}" if url else ""
+        return f"No scraped content{where} matches \"{query}\". Scrape the page to read it."
+
+    sections = [f"# {len(passages)} passages from scraped pages for \"{query}\""]
+    for index, passage in enumerate(passages, 1):
+        scraped = time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(passage["indexed_at"]))
+        sections.append(
+            f"## [{index}] {passage['title']}\n"
+            f"URL: {passage['url']} (part {passage['position'] + 1} of {passage['chunks']}, "
+            f"scraped {scraped}, relevance {passage['score']})\n\n{passage['content']}"
+        )
+    return "\n\n".join(sections)
+
+@mcp.resource("stats://server")
+def server_stats() -> str:
+    """Process statistics used for pool health checks and recycling."""
+    return json.dumps(collect_stats())
+
+async def serve_network(transport: str):
+    """Serve backend workers over HTTP until SIGINT/SIGTERM, then drain.
+
+    On shutdown new requests get a 503 while tool calls already running get up
+    to MCP_DRAIN_TIMEOUT to finish, so a restart does not cut off scrapes.
+    """
+    import uvicorn
+
+    from drain import DrainingServer, InFlightRequests
+
+    app = mcp.sse_app() if transport == "sse" else mcp.streamable_http_app()
+    requests = InFlightRequests(app)
+    config = uvicorn.Config(
+        requests,
+        host=MCP_SERVER_HOST,
+        port=MCP_SERVER_PORT,
+        log_level=mcp.settings.log_level.lower(),
+        # Backend sessions reuse their connections between calls
+        timeout_keep_alive=MCP_KEEP_ALIVE,
+        # In-flight calls have already had MCP_DRAIN_TIMEOUT by the time uvicorn stops
+        timeout_graceful_shutdown=5
+    )
+    try:
+        await DrainingServer(config, requests, MCP_DRAIN_TIMEOUT).serve()
+    finally:
+        await close_http_client()
+        local_scraper.close()
+
 if __name__ == "__main__":
-    # Initialize and run the server
-    mcp.run(transport='stdio')
\ No newline at end of file
+    if MCP_TRANSPORT == "stdio":
+        mcp.run(transport='stdio')
+    elif MCP_TRANSPORT in ("streamable-http", "sse"):
+        asyncio.run(serve_network(MCP_TRANSPORT))
+    else:
+        raise SystemExit(f"Unknown MCP_TRANSPORT {MCP_TRANSPORT!r}; expected stdio, streamable-http or sse")
\ No newline at end of file
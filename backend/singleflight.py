@@ -0,0 +1,66 @@
+"""In-flight deduplication of identical concurrent async calls."""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share it.
+
+    The first caller for a key starts the call in its own task and later
+    callers with the same key await that task, so they all receive the same
+    result or exception. A caller that is cancelled stops waiting without
+    disturbing the others; when the last waiter goes away the call itself is
+    cancelled. Nothing is remembered once the call finishes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda task: self._finish(key, call))
+            self._calls[key] = call
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every caller gave up; stop the shared call and forget it now
+                # so a new caller does not join a task that is being cancelled
+                call.task.cancel()
+                self._forget(key, call)
+                self.cancelled += 1
+
+    def _finish(self, key: str, call: _Call):
+        self._forget(key, call)
+        if not call.task.cancelled():
+            # Mark the exception retrieved even if every waiter has gone
+            call.task.exception()
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "in_flight": len(self._calls),
+        }
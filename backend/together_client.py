@@ -1,21 +1,237 @@
-from together import Together
-from typing import List, Dict, Any
+from together import AsyncTogether, Together
+from together.types import ChatCompletionResponse
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterator, Optional
+import asyncio
+import hashlib
+import json
 import os
 import logging
+import threading
+import time
+
+from metrics import REGISTRY
+from scrape_cache import DiskCache, MemoryLRU
 
 logger = logging.getLogger(__name__)
 
+TOKENS = REGISTRY.counter("together_tokens_total", "Tokens reported by Together AI", ["type"])
+REQUESTS = REGISTRY.counter("together_requests_total", "Together AI chat requests", ["outcome"])
+CACHE_LOOKUPS = REGISTRY.counter(
+    "together_cache_total", "Completion cache lookups by result", ["result"]
+)
+
+DEFAULT_COMPLETION_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "completion_cache")
+
+def record_usage(usage):
+    """Count the prompt/completion tokens of a response or final stream chunk"""
+    if usage is None:
+        return
+    TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, type="prompt")
+    TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, type="completion")
+
+def optional_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else None
+
+
+def canonical_messages(messages: List[Dict]) -> List[Dict]:
+    """Messages with tool call ids renumbered in order of appearance.
+
+    The ids are random per model response, so without this the same page and
+    question would never produce the same final prompt twice.
+    """
+    ids: Dict[str, str] = {}
+
+    def renumber(call_id):
+        return ids.setdefault(call_id, f"call_{len(ids)}")
+
+    canonical = []
+    for message in messages:
+        message = dict(message)
+        if message.get("tool_calls"):
+            message["tool_calls"] = [
+                {**call, "id": renumber(call.get("id"))} for call in message["tool_calls"]
+            ]
+        if message.get("tool_call_id") is not None:
+            message["tool_call_id"] = renumber(message["tool_call_id"])
+        canonical.append(message)
+    return canonical
+
+
+def completion_key(model: str, messages: List[Dict], tools: Optional[List[Dict]], sampling: Dict[str, Any]) -> str:
+    """Key for a chat completion: model, canonical messages, tool schemas and sampling settings."""
+    material = {
+        "model": model,
+        "messages": canonical_messages(messages),
+        "tools": tools or [],
+        "sampling": sampling,
+    }
+    encoded = json.dumps(material, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def deterministic(sampling: Dict[str, Any]) -> bool:
+    """Whether repeating a request should give the same completion."""
+    return sampling.get("temperature") == 0 or sampling.get("seed") is not None
+
+
+class CompletionCache:
+    """Memory LRU of completions in front of an optional disk tier, with a TTL.
+
+    Values are ``ChatCompletionResponse.model_dump()`` dicts; ``get`` returns a
+    response rebuilt from one, marked ``cached=True`` and without ``usage`` so
+    the tokens are not counted again. Thread-safe, since the sync client runs
+    on executor threads.
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int = 32 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        disk_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 3600.0,
+    ):
+        self.ttl = ttl
+        self.memory = MemoryLRU(memory_bytes)
+        self.disk = DiskCache(disk_dir, disk_bytes) if disk_dir else None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get(self, key: str) -> Optional[ChatCompletionResponse]:
+        with self._lock:
+            hit = self.memory.get(key)
+            if hit is not None:
+                self.memory_hits += 1
+        if hit is None and self.disk is not None:
+            hit = self.disk.get(key)
+            with self._lock:
+                if hit is not None:
+                    self.disk_hits += 1
+                    self.memory.set(key, hit[0], len(json.dumps(hit[0])), hit[1])
+        if hit is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return ChatCompletionResponse.model_validate({**hit[0], "usage": None, "cached": True})
+
+    def set(self, key: str, response: ChatCompletionResponse):
+        value = response.model_dump(mode="json", exclude={"usage"})
+        encoded = json.dumps(value).encode("utf-8")
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self.memory.set(key, value, len(encoded), expires_at)
+            self.writes += 1
+        if self.disk is not None:
+            try:
+                self.disk.set(key, encoded, expires_at)
+            except OSError as e:
+                logger.warning(f"Failed to write completion cache blob: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "writes": self.writes,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "memory_evictions": self.memory.evictions,
+            "disk_evictions": self.disk.evictions if self.disk else 0,
+            "disk_enabled": self.disk is not None,
+            "ttl_seconds": self.ttl,
+        }
+
+
+def streamed_response(model: str, content: str) -> ChatCompletionResponse:
+    """A non-streaming response holding a streamed reply, for the cache."""
+    return ChatCompletionResponse.model_validate({
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+    })
+
+
 class TogetherAIClient:
     def __init__(self):
         api_key = os.getenv('TOGETHER_API_KEY')
         if not api_key:
             raise ValueError("TOGETHER_API_KEY environment variable is required")
             
+        self.api_key = api_key
         self.client = Together(api_key=api_key)
         self.model = "meta-llama/Llama-4-Maverick-17B-128E-Instruct-FP8"
-    
-    def chat_with_tools(self, messages: List[Dict], tools: List[Dict] = None):
-        """Send chat request with optional tools to Together AI"""
+        # Native async client; only set when serving from one long-lived loop
+        self.async_client: Optional[AsyncTogether] = None
+        self.async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Sampling settings sent with every request; unset ones use the API defaults
+        seed = os.getenv('TOGETHER_SEED')
+        self.sampling: Dict[str, Any] = {
+            name: value for name, value in (
+                ("temperature", optional_float('TOGETHER_TEMPERATURE')),
+                ("top_p", optional_float('TOGETHER_TOP_P')),
+                ("seed", int(seed) if seed else None),
+            ) if value is not None
+        }
+
+        # Opt-in; sampled completions are only cached if asked for explicitly
+        self.cache: Optional[CompletionCache] = None
+        self.cache_sampled = os.getenv('COMPLETION_CACHE_SAMPLED', 'false').lower() == 'true'
+        if os.getenv('COMPLETION_CACHE_ENABLED', 'false').lower() == 'true':
+            self.cache = CompletionCache(
+                memory_bytes=int(float(os.getenv('COMPLETION_CACHE_MEMORY_MB', '32')) * 1024 * 1024),
+                disk_dir=os.getenv('COMPLETION_CACHE_DIR', DEFAULT_COMPLETION_CACHE_DIR) or None,
+                disk_bytes=int(float(os.getenv('COMPLETION_CACHE_DISK_MB', '256')) * 1024 * 1024),
+                ttl=float(os.getenv('COMPLETION_CACHE_TTL', '3600')),
+            )
+
+    def enable_async(self):
+        """Use AsyncTogether for the async methods.
+
+        Call this from the event loop that will make the requests (the ASGI
+        server's loop). Without it, or when called from any other loop (such as
+        the job workers'), the async methods run the sync client in a thread,
+        which is safe under a fresh ``asyncio.run`` per request.
+        """
+        self.async_client = AsyncTogether(api_key=self.api_key)
+        self.async_loop = asyncio.get_running_loop()
+
+    def _use_async_client(self) -> bool:
+        return self.async_client is not None and asyncio.get_running_loop() is self.async_loop
+
+    def _cache_key(self, messages: List[Dict], tools: Optional[List[Dict]], cache: bool) -> Optional[str]:
+        """The completion cache key of a request, or None if it must not be cached."""
+        if self.cache is None or not cache:
+            return None
+        if not (self.cache_sampled or deterministic(self.sampling)):
+            CACHE_LOOKUPS.inc(result="skipped")
+            return None
+        return completion_key(self.model, messages, tools, self.sampling)
+
+    def _cached(self, key: Optional[str]) -> Optional[ChatCompletionResponse]:
+        if key is None:
+            return None
+        response = self.cache.get(key)
+        CACHE_LOOKUPS.inc(result="hit" if response is not None else "miss")
+        if response is not None:
+            logger.info("Serving Together AI response from the completion cache")
+        return response
+
+    def chat_with_tools(self, messages: List[Dict], tools: List[Dict] = None, cache: bool = True):
+        """Send chat request with optional tools to Together AI
+
+        With the completion cache enabled, an identical earlier request is
+        answered from the cache; ``cache=False`` always asks the API.
+        """
+        key = self._cache_key(messages, tools, cache)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
         try:
             logger.info(f"Sending request to {self.model} with {len(tools) if tools else 0} tools")
             
@@ -23,12 +239,170 @@ class TogetherAIClient:
                 model=self.model,
                 messages=messages,
                 tools=tools if tools else [],
-                stream=False
+                stream=False,
+                **self.sampling
             )
             
             logger.info("Received response from Together AI")
+            REQUESTS.inc(outcome="ok")
+            record_usage(response.usage)
+            if key is not None and response.choices:
+                self.cache.set(key, response)
             return response
             
         except Exception as e:
             logger.error(f"Together AI API error: {e}")
-            raise
\ No newline at end of file
+            REQUESTS.inc(outcome="error")
+            raise
+
+    async def achat_with_tools(self, messages: List[Dict], tools: List[Dict] = None, cache: bool = True):
+        """Async chat_with_tools that never blocks the event loop"""
+        loop = asyncio.get_running_loop()
+        if not self._use_async_client():
+            return await loop.run_in_executor(None, self.chat_with_tools, messages, tools, cache)
+
+        key = self._cache_key(messages, tools, cache)
+        if key is not None:
+            # The disk tier reads a file, so look up off the loop
+            cached = await loop.run_in_executor(None, self._cached, key)
+            if cached is not None:
+                return cached
+
+        try:
+            logger.info(f"Sending async request to {self.model} with {len(tools) if tools else 0} tools")
+
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                tools=tools if tools else [],
+                stream=False,
+                **self.sampling
+            )
+
+            logger.info("Received response from Together AI")
+            REQUESTS.inc(outcome="ok")
+            record_usage(response.usage)
+            if key is not None and response.choices:
+                await loop.run_in_executor(None, self.cache.set, key, response)
+            return response
+
+        except Exception as e:
+            logger.error(f"Together AI API error: {e}")
+            REQUESTS.inc(outcome="error")
+            raise
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        return self.cache.stats() if self.cache is not None else None
+
+    def stream_chat(self, messages: List[Dict], tools: List[Dict] = None,
+                    on_usage: Optional[Callable[[Any], None]] = None) -> Iterator[str]:
+        """Stream the assistant's reply text from Together AI as it is generated
+
+        A cached reply is yielded as a single token; a streamed one is cached
+        once it has been received in full. ``on_usage`` is called with the
+        chunk that carries the token usage, if Together sends one.
+        """
+        key = self._cache_key(messages, tools, True)
+        cached = self._cached(key)
+        if cached is not None:
+            if cached.choices and cached.choices[0].message.content:
+                yield cached.choices[0].message.content
+            return
+
+        try:
+            logger.info(f"Streaming request to {self.model} with {len(tools) if tools else 0} tools")
+
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                tools=tools if tools else [],
+                stream=True,
+                **self.sampling
+            )
+
+            content = []
+            try:
+                for chunk in stream:
+                    # Usage, when sent, arrives with the final chunk
+                    record_usage(getattr(chunk, "usage", None))
+                    if on_usage is not None and getattr(chunk, "usage", None) is not None:
+                        on_usage(chunk)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta is not None and delta.content:
+                        content.append(delta.content)
+                        yield delta.content
+            finally:
+                # Also when the caller stops early (GeneratorExit); frees the HTTP stream now
+                if hasattr(stream, "close"):
+                    stream.close()
+
+            logger.info("Finished streaming response from Together AI")
+            REQUESTS.inc(outcome="ok")
+            if key is not None:
+                self.cache.set(key, streamed_response(self.model, "".join(content)))
+
+        except Exception as e:
+            logger.error(f"Together AI API error: {e}")
+            REQUESTS.inc(outcome="error")
+            raise
+
+    async def astream_chat(self, messages: List[Dict], tools: List[Dict] = None,
+                           on_usage: Optional[Callable[[Any], None]] = None) -> AsyncIterator[str]:
+        """Async stream_chat; reads chunks off the event loop"""
+        loop = asyncio.get_running_loop()
+        if not self._use_async_client():
+            chunks = self.stream_chat(messages, tools, on_usage)
+            done = object()
+            try:
+                while True:
+                    token = await loop.run_in_executor(None, next, chunks, done)
+                    if token is done:
+                        break
+                    yield token
+            finally:
+                # A consumer that stops early (client gone, job cancelled) leaves the stream open otherwise
+                await loop.run_in_executor(None, chunks.close)
+            return
+
+        key = self._cache_key(messages, tools, True)
+        if key is not None:
+            cached = await loop.run_in_executor(None, self._cached, key)
+            if cached is not None:
+                if cached.choices and cached.choices[0].message.content:
+                    yield cached.choices[0].message.content
+                return
+
+        try:
+            logger.info(f"Streaming async request to {self.model} with {len(tools) if tools else 0} tools")
+
+            stream = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                tools=tools if tools else [],
+                stream=True,
+                **self.sampling
+            )
+
+            content = []
+            async for chunk in stream:
+                record_usage(getattr(chunk, "usage", None))
+                if on_usage is not None and getattr(chunk, "usage", None) is not None:
+                    on_usage(chunk)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta is not None and delta.content:
+                    content.append(delta.content)
+                    yield delta.content
+
+            logger.info("Finished streaming response from Together AI")
+            REQUESTS.inc(outcome="ok")
+            if key is not None:
+                await loop.run_in_executor(None, self.cache.set, key, streamed_response(self.model, "".join(content)))
+
+        except Exception as e:
+            logger.error(f"Together AI API error: {e}")
+            REQUESTS.inc(outcome="error")
+            raise
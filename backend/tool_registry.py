@@ -0,0 +1,257 @@
+import ast
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# How often the server's source files are stat()ed for changes
+SOURCE_CHECK_INTERVAL = 1.0  # seconds
+
+
+def schema_hash(tools: List[Dict]) -> str:
+    """Stable short hash of a tool list, used as its schema version."""
+    canonical = json.dumps(tools, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+def file_hash(path: Optional[str]) -> Optional[str]:
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def server_modules(path: str) -> List[str]:
+    """The server script and the modules beside it that it imports, directly or not."""
+    directory = os.path.dirname(os.path.abspath(path))
+    found: List[str] = []
+    pending = [os.path.abspath(path)]
+    while pending:
+        current = pending.pop()
+        if current in found:
+            continue
+        found.append(current)
+        try:
+            with open(current, encoding="utf-8") as f:
+                tree = ast.parse(f.read(), current)
+        except (OSError, SyntaxError, ValueError):
+            # Unreadable or mid-edit; still watched, its imports are picked up once it parses
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = os.path.join(directory, name.split(".")[0] + ".py")
+                if os.path.isfile(candidate):
+                    pending.append(candidate)
+    return sorted(found)
+
+
+class ToolRegistry:
+    """Versioned cache of the OpenAI-style tool list exposed by the MCP server.
+
+    Tools are loaded once (ideally at startup via ``schedule_refresh``) and then
+    served from memory. When the TTL expires or the mtime and content hash of
+    the server script, or of any module beside it that it imports, change, a
+    refresh is scheduled in the background and callers keep getting the current
+    list, so discovery never blocks a request once the first load has completed.
+    Concurrent callers finding the cache empty share a single load, whichever
+    event loop they run on.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[List[Dict]]],
+        source_path: Optional[str],
+        ttl: float = 300.0,
+        spawn: Optional[Callable[[Awaitable[Any]], Any]] = None,
+        on_source_change: Optional[Callable[[], None]] = None,
+    ):
+        self.loader = loader
+        self.source_path = source_path
+        self.ttl = ttl
+        self.spawn = spawn
+        self.on_source_change = on_source_change
+
+        self._tools: Optional[List[Dict]] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._loading: Optional[concurrent.futures.Future] = None
+        self.version = 0
+        self.schema_hash: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+        self._source_paths = server_modules(source_path) if source_path else []
+        self._file_hashes: Dict[str, Optional[str]] = {}
+        self._source_mtimes = self._stat_sources()
+        self._source_hash = self._hash_sources()
+        self._source_checked_at = time.monotonic()
+
+    async def get(self) -> List[Dict]:
+        """Return the cached tools, loading them only if nothing is cached yet."""
+        if self._tools is None:
+            with self._lock:
+                self.misses += 1
+            return list(await self._load_shared())
+
+        with self._lock:
+            self.hits += 1
+        if self._is_stale():
+            self.schedule_refresh()
+        return list(self._tools)
+
+    async def refresh(self) -> List[Dict]:
+        """Reload the tool list from the server, keeping the old one on failure."""
+        try:
+            tools = await self.loader()
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Tool registry refresh failed: {e}")
+            if self._tools is None:
+                raise
+            return self._tools
+
+        new_hash = schema_hash(tools)
+        with self._lock:
+            self.refreshes += 1
+            self.loaded_at = time.time()
+            self.last_error = None
+            if new_hash != self.schema_hash:
+                self.version += 1
+                self.schema_hash = new_hash
+                logger.info(f"Tool schema version {self.version} ({new_hash}): {[t['function']['name'] for t in tools]}")
+            self._tools = tools
+        return tools
+
+    async def _load_shared(self) -> List[Dict]:
+        """Load an empty cache once for every caller waiting on it."""
+        while True:
+            with self._lock:
+                if self._tools is not None:
+                    return self._tools
+                future = self._loading
+                loads = future is None
+                if loads:
+                    future = self._loading = concurrent.futures.Future()
+            if loads:
+                try:
+                    tools = await self.refresh()
+                except Exception as e:
+                    future.set_exception(e)
+                    raise
+                except BaseException:
+                    # Cancelled: the waiting callers start a load of their own
+                    future.cancel()
+                    raise
+                finally:
+                    with self._lock:
+                        self._loading = None
+                future.set_result(tools)
+                return tools
+            try:
+                # Shielded so a waiter being cancelled does not cancel the shared load
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+    def schedule_refresh(self):
+        """Start a background refresh unless one is already running."""
+        with self._lock:
+            if self._refreshing or self.spawn is None:
+                return
+            self._refreshing = True
+        self.spawn(self._background_refresh())
+
+    async def _background_refresh(self):
+        try:
+            if self._tools is None:
+                await self._load_shared()
+            else:
+                await self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _is_stale(self) -> bool:
+        if self.loaded_at is not None and time.time() - self.loaded_at >= self.ttl:
+            return True
+        return self._source_changed()
+
+    def _source_changed(self) -> bool:
+        if not self._source_paths:
+            return False
+        now = time.monotonic()
+        if now - self._source_checked_at < SOURCE_CHECK_INTERVAL:
+            return False
+        self._source_checked_at = now
+
+        mtimes = self._stat_sources()
+        if mtimes == self._source_mtimes:
+            return False
+        self._source_mtimes = mtimes
+
+        # mtime moves on touch/checkout too; only a content change counts
+        old_hashes = self._file_hashes
+        new_hash = self._hash_sources()
+        if new_hash == self._source_hash:
+            return False
+        changed = [path for path, digest in self._file_hashes.items() if digest != old_hashes.get(path)]
+        # The change may add or drop imports
+        self._source_paths = server_modules(self.source_path)
+        self._source_mtimes = self._stat_sources()
+        self._source_hash = self._hash_sources()
+        logger.info(f"MCP server source changed: {', '.join(changed) or self.source_path}")
+        if self.on_source_change:
+            self.on_source_change()
+        return True
+
+    def _stat_sources(self) -> Dict[str, Optional[float]]:
+        mtimes: Dict[str, Optional[float]] = {}
+        for path in self._source_paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def _hash_sources(self) -> Optional[str]:
+        """One hash over the contents of every watched file; remembers each file's own."""
+        if not self._source_paths:
+            return None
+        self._file_hashes = {path: file_hash(path) for path in self._source_paths}
+        return hashlib.sha256(json.dumps(sorted(self._file_hashes.items())).encode("utf-8")).hexdigest()
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters and schema version for the debug endpoints."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "schema_version": self.version,
+            "schema_hash": self.schema_hash,
+            "loaded_at": self.loaded_at,
+            "age_seconds": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+            "ttl_seconds": self.ttl,
+            "source_path": self.source_path,
+            "source_files": len(self._source_paths),
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,179 @@
+"""Scrape engine benchmark: the scrape API versus fetching pages locally.
+
+Starts a fake website (``FakeSite``) and a fake scrape API, imports the MCP
+server's scrape path (``fetch_scrape``) and scrapes the same set of pages with
+each ``SCRAPE_ENGINE``. A share of the pages are JavaScript app shells, which
+the ``auto`` engine has to hand to the scrape API. Besides latency and
+throughput, the run measures event-loop lag (how late a 10 ms timer fires
+while pages are being extracted), which is what the process pool protects.
+
+    python benchmarks/bench_scrape_engine.py --pages 100 --concurrency 8
+    python benchmarks/bench_scrape_engine.py --engine local --page-kb 400 --workers 0
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from fake_services import FakeScrapeAPI, FakeSite  # noqa: E402
+from run_bench import BACKEND_DIR, RESULTS_DIR, git_commit, percentile, summarize  # noqa: E402
+
+ENGINES = ("remote", "local", "auto")
+
+
+async def loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.01):
+    """Record how late each ``interval`` sleep wakes up."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+async def run_engine(server, engine: str, urls: List[str], concurrency: int) -> Dict[str, Any]:
+    from local_scrape import ScrapePolicy
+
+    server.scrape_policy = ScrapePolicy(mode=engine)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+    content_chars = 0
+
+    async def scrape(url: str):
+        nonlocal errors, content_chars
+        params = {"url": url, "formats": ["markdown"], "onlyMainContent": True}
+        async with semaphore:
+            started = time.perf_counter()
+            result = await server.fetch_scrape(params, use_cache=False)
+            latencies.append(time.perf_counter() - started)
+        if not result.get("success", False):
+            errors += 1
+        content_chars += len(result.get("data", {}).get("markdown", ""))
+
+    lag: List[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.ensure_future(loop_lag(lag, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(scrape(url) for url in urls))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+
+    return {
+        "requests": len(urls),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_pps": round(len(urls) / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize(latencies),
+        "loop_lag_ms": {
+            "p50": round(percentile(lag, 50) * 1000, 2),
+            "p99": round(percentile(lag, 99) * 1000, 2),
+            "max": round(max(lag, default=0.0) * 1000, 2),
+        },
+        "content_chars": content_chars,
+        "policy": server.scrape_policy.stats(),
+    }
+
+
+def print_report(results: Dict[str, Any]):
+    config = results["config"]
+    print(
+        f"\nCommit {results['commit']}  ({config['pages']} pages of {config['page_kb']} KB, "
+        f"{config['js_share']:.0%} app shells, concurrency {config['concurrency']}, {config['workers']} workers)"
+    )
+    for engine, run in results["engines"].items():
+        latency = run["latency"]
+        lag = run["loop_lag_ms"]
+        print(
+            f"{engine:<7} {run['throughput_pps']:>7.2f} pages/s  p50 {latency['p50_ms']:>7.1f}  "
+            f"p95 {latency['p95_ms']:>7.1f} ms  loop lag p99 {lag['p99']:>6.1f} max {lag['max']:>6.1f} ms  "
+            f"errors {run['errors']}  fallbacks {sum(run['policy']['fallbacks'].values())}"
+        )
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Scrape API versus local engine benchmark")
+    parser.add_argument("--engine", action="append", choices=ENGINES, help="Engine to run (repeatable; default: all)")
+    parser.add_argument("--pages", type=int, default=60, help="Pages scraped per engine")
+    parser.add_argument("--concurrency", type=int, default=8, help="Scrapes in flight at once")
+    parser.add_argument("--page-kb", type=float, default=50, help="HTML size of the static pages")
+    parser.add_argument("--js-share", type=float, default=0.1, help="Share of pages that are JavaScript app shells")
+    parser.add_argument("--workers", type=int, default=2, help="Extraction processes (0: thread pool)")
+    parser.add_argument("--site-latency", type=float, default=0.02, help="Fake website response time (s)")
+    parser.add_argument("--scrape-latency", type=float, default=0.5, help="Fake scrape API latency (s)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/engine-<time>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    site = FakeSite(page_kb=args.page_kb, latency=args.site_latency).start()
+    scrape_api = FakeScrapeAPI(page_kb=args.page_kb, latency=args.scrape_latency).start()
+    os.environ.update({
+        "SCRAPE_API_ENDPOINT": scrape_api.endpoint,
+        "SCRAPE_CACHE_ENABLED": "false",
+        "SCRAPE_LOCAL_WORKERS": str(args.workers),
+        # The test site runs on 127.0.0.1
+        "SCRAPE_LOCAL_ALLOW_PRIVATE": "true",
+        "SCRAPE_MAX_CONNECTIONS": str(max(20, args.concurrency * 2)),
+        "FASTMCP_LOG_LEVEL": "WARNING",
+    })
+    sys.path.insert(0, BACKEND_DIR)
+    import logging
+    import scrape_mcp_server as server
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # App shells spread evenly through the static pages
+    apps = int(args.pages * args.js_share)
+    step = args.pages // apps if apps else 0
+    urls = [
+        site.url(f"/app/{i}" if step and i % step == step - 1 and i // step < apps else f"/article/{i}")
+        for i in range(args.pages)
+    ]
+
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "pages": args.pages,
+            "concurrency": args.concurrency,
+            "page_kb": args.page_kb,
+            "js_share": args.js_share,
+            "workers": args.workers,
+            "site_latency": args.site_latency,
+            "scrape_latency": args.scrape_latency,
+        },
+        "engines": {},
+    }
+
+    async def run():
+        try:
+            # Start the extraction processes outside the measurements
+            await server.local_scraper.extract("<p>warm up</p>", site.url("/"), ["markdown"], True)
+            for engine in args.engine or ENGINES:
+                results["engines"][engine] = await run_engine(server, engine, urls, args.concurrency)
+            results["local_engine"] = server.local_scraper.stats()
+        finally:
+            await server.close_http_client()
+            server.local_scraper.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        site.stop()
+        scrape_api.stop()
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"engine-{time.strftime('%Y%m%d-%H%M%S')}-{results['commit']}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_report(results)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""Local stand-ins for the scrape API, the Together completions API and a website.
+
+All run in background threads on 127.0.0.1 and need only the standard
+library, so benchmarks cost nothing and do not depend on external services.
+They can also be started on their own for manual testing:
+
+    python benchmarks/fake_services.py --scrape-port 8765 --llm-port 8766 --site-port 8767
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+URL_PATTERN = re.compile(r"https?://[^\s\"'<>]+")
+
+PARAGRAPH = (
+    "The quarterly report describes revenue growth across all regions, with the "
+    "strongest results in the enterprise segment and a steady rise in renewals. "
+)
+
+
+def section_text(index: int) -> str:
+    """Distinct paragraph for each section, so compaction cannot dedupe it away."""
+    return " ".join(
+        f"Item {index}.{n} notes that metric {(index * 31 + n * 7) % 997} moved "
+        f"{(index + n) % 19}.{n} percent against the previous period in region {n}."
+        for n in range(6)
+    )
+
+
+def build_markdown(url: str, size_bytes: int) -> str:
+    """Markdown page of roughly size_bytes with a navigation list and numbered sections."""
+    header = (
+        f"# Benchmark page\n\nSource: {url}\n\n"
+        "- [Home](/)\n- [Products](/products)\n- [Pricing](/pricing)\n\n"
+    )
+    sections = []
+    length = len(header)
+    index = 0
+    while length < size_bytes:
+        section = f"## Section {index}\n\n{section_text(index)}\n\n"
+        sections.append(section)
+        length += len(section)
+        index += 1
+    return header + "".join(sections)
+
+
+class _Server:
+    def __init__(self, handler_class, port: int):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler_class)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeScrapeAPI(_Server):
+    """Answers POST /scrape like the scrape service.
+
+    Page size and latency default to the constructor values and can be set
+    per URL with ``size_kb`` and ``latency_ms`` query parameters. URLs that
+    contain ``/fail`` get a 502.
+    """
+
+    def __init__(self, port: int = 0, page_kb: float = 20, latency: float = 0.05):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                url = body.get("url", "")
+                query = parse_qs(urlsplit(url).query)
+                time.sleep(float(query.get("latency_ms", [server.latency * 1000])[0]) / 1000)
+
+                if "/fail" in url:
+                    self._send(502, b"")
+                    return
+
+                size = int(float(query.get("size_kb", [server.page_kb])[0]) * 1024)
+                data = {
+                    "metadata": {"title": f"Benchmark page {urlsplit(url).path}", "description": "Synthetic page"},
+                    "markdown": build_markdown(url, size),
+                    "links": [f"{url.rstrip('/')}/child-{i}" for i in range(10)],
+                }
+                if "html" in body.get("formats", []):
+                    data["html"] = "<p>" + PARAGRAPH * (size // len(PARAGRAPH) + 1) + "</p>"
+                self._send(200, json.dumps({"success": True, "data": data}).encode("utf-8"))
+
+            def _send(self, status: int, payload: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.page_kb = page_kb
+        self.latency = latency
+        super().__init__(Handler, port)
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.port}/scrape"
+
+
+def build_html(path: str, size_bytes: int) -> str:
+    """Static article page of roughly size_bytes, wrapped in navigation, sidebar and footer."""
+    sections = []
+    length = 0
+    index = 0
+    while length < size_bytes:
+        section = f"<h2>Section {index}</h2>\n<p>{section_text(index)}</p>\n"
+        sections.append(section)
+        length += len(section)
+        index += 1
+    return (
+        f"<!doctype html><html lang=\"en\"><head><title>Benchmark page {path}</title>"
+        "<meta name=\"description\" content=\"Synthetic page\"><link rel=\"stylesheet\" href=\"/site.css\">"
+        "<script src=\"/analytics.js\" async></script></head><body>"
+        "<header class=\"site-header\"><nav><a href=\"/\">Home</a> <a href=\"/products\">Products</a> "
+        "<a href=\"/pricing\">Pricing</a></nav></header>"
+        "<div class=\"layout\"><aside class=\"sidebar\"><ul>"
+        + "".join(f"<li><a href=\"{path.rstrip('/')}/child-{i}\">Child {i}</a></li>" for i in range(10))
+        + f"</ul></aside><main><article><h1>Benchmark page {path}</h1>\n{''.join(sections)}</article></main></div>"
+        "<footer class=\"site-footer\"><p>Copyright Example Corp. All rights reserved.</p></footer></body></html>"
+    )
+
+
+APP_SHELL = (
+    "<!doctype html><html><head><title>Benchmark app</title><script src=\"/static/app.js\" defer></script></head>"
+    "<body><div id=\"root\"></div><noscript>You need to enable JavaScript to run this app.</noscript></body></html>"
+)
+
+
+class FakeSite(_Server):
+    """Serves HTML pages over GET, for the local scrape engine.
+
+    Paths under ``/app/`` return a JavaScript app shell with no content;
+    paths containing ``/fail`` return a 503 and ``/redirect?to=<url>``
+    redirects. Everything else is a static article. ``size_kb`` and ``latency_ms`` query parameters work as for
+    ``FakeScrapeAPI``.
+    """
+
+    def __init__(self, port: int = 0, page_kb: float = 20, latency: float = 0.02):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                query = parse_qs(parts.query)
+                time.sleep(float(query.get("latency_ms", [server.latency * 1000])[0]) / 1000)
+                server.requests += 1
+
+                if "/fail" in parts.path:
+                    self._send(503, b"")
+                    return
+                if parts.path == "/redirect":
+                    self.send_response(302)
+                    self.send_header("Location", query["to"][0])
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if parts.path.startswith("/app/"):
+                    page = APP_SHELL
+                else:
+                    page = build_html(parts.path, int(float(query.get("size_kb", [server.page_kb])[0]) * 1024))
+                self._send(200, page.encode("utf-8"))
+
+            def _send(self, status: int, payload: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.page_kb = page_kb
+        self.latency = latency
+        self.requests = 0
+        super().__init__(Handler, port)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+
+class FakeCompletionAPI(_Server):
+    """OpenAI-compatible ``/v1/chat/completions`` with scripted replies.
+
+    When tools are offered and the latest user message contains URLs, the
+    reply asks for one ``scrape_url`` call per URL; otherwise it answers with
+    text. Token usage is estimated from the prompt size. Streaming is
+    supported.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.2, token_delay: float = 0.0):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                time.sleep(server.latency)
+                message = server.reply(body)
+                prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+                base = {"id": "bench", "created": int(time.time()), "model": body.get("model", "bench")}
+
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    for word in (message.get("content") or "").split(" "):
+                        chunk = dict(base, object="chat.completion.chunk", choices=[
+                            {"index": 0, "delta": {"role": "assistant", "content": word + " "}, "finish_reason": None}
+                        ])
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                        if server.token_delay:
+                            time.sleep(server.token_delay)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.close_connection = True
+                    return
+
+                completion_tokens = len((message.get("content") or "").split()) + 1
+                payload = json.dumps(dict(
+                    base,
+                    object="chat.completion",
+                    choices=[{"index": 0, "message": message, "finish_reason": "stop"}],
+                    usage={
+                        "prompt_tokens": prompt_chars // 4,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_chars // 4 + completion_tokens,
+                    },
+                )).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.latency = latency
+        self.token_delay = token_delay
+        super().__init__(Handler, port)
+
+    @staticmethod
+    def reply(body: dict) -> dict:
+        messages = body.get("messages", [])
+        last = messages[-1] if messages else {}
+        if body.get("tools") and last.get("role") == "user":
+            urls = URL_PATTERN.findall(last.get("content") or "")
+            if urls:
+                return {"role": "assistant", "content": "", "tool_calls": [
+                    {
+                        "id": f"call_{i}",
+                        "type": "function",
+                        "function": {"name": "scrape_url", "arguments": json.dumps({"url": url})},
+                    }
+                    for i, url in enumerate(urls)
+                ]}
+            return {"role": "assistant", "content": "Hello! Send me a URL and I will summarize the page."}
+
+        tool_chars = sum(len(m.get("content") or "") for m in messages if m.get("role") == "tool")
+        return {"role": "assistant", "content": f"Summary of {tool_chars} characters of content. " + "Key point. " * 40}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Run the fake scrape and completion APIs")
+    parser.add_argument("--scrape-port", type=int, default=8765)
+    parser.add_argument("--llm-port", type=int, default=8766)
+    parser.add_argument("--site-port", type=int, default=8767)
+    parser.add_argument("--page-kb", type=float, default=20)
+    parser.add_argument("--scrape-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    scrape = FakeScrapeAPI(args.scrape_port, args.page_kb, args.scrape_latency).start()
+    llm = FakeCompletionAPI(args.llm_port, args.llm_latency).start()
+    site = FakeSite(args.site_port, args.page_kb).start()
+    print(f"SCRAPE_API_ENDPOINT={scrape.endpoint}")
+    print(f"TOGETHER_BASE_URL={llm.base_url}")
+    print(f"Static pages: {site.url('/article/1')}  App shell: {site.url('/app/1')}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scrape.stop()
+        llm.stop()
+        site.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""End-to-end /chat benchmark against local fakes of the scrape API and Together.
+
+Starts the fake services, points the backend at them through environment
+variables, and drives ``backend/app.py`` through the Flask test client. The
+chat pipeline is measured per stage (tool discovery, first LLM call, MCP tool
+calls, final LLM call) and overall; results are printed and written as JSON
+to ``benchmarks/results/`` so runs can be compared across commits.
+
+    python benchmarks/run_bench.py --requests 40 --concurrency 8
+    python benchmarks/run_bench.py --scenario large_page --baseline benchmarks/results/<old>.json
+"""
+import argparse
+import contextvars
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+sys.path.insert(0, BENCH_DIR)
+from fake_services import FakeCompletionAPI, FakeScrapeAPI  # noqa: E402
+
+SCENARIOS: Dict[str, Callable[[int], str]] = {
+    "single_url": lambda i: f"Summarize https://bench.example.com/article/{i}",
+    "multi_url": lambda i: (
+        f"Compare https://bench.example.com/a/{i} with https://bench.example.com/b/{i} "
+        f"and https://bench.example.com/c/{i}"
+    ),
+    "no_tool": lambda i: f"Hello, what can you help me with? ({i})",
+    "large_page": lambda i: f"Summarize https://bench.example.com/report/{i}?size_kb=400",
+}
+
+STAGES = ("tool_discovery", "llm_first", "mcp_call", "llm_summary", "llm_final")
+
+# Stage timings of the request being processed; tasks inherit the same dict
+_current_timings: "contextvars.ContextVar[Optional[Dict[str, List[float]]]]" = contextvars.ContextVar(
+    "bench_timings", default=None
+)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean_ms": round(1000 * sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 50), 2),
+        "p95_ms": round(1000 * percentile(values, 95), 2),
+        "p99_ms": round(1000 * percentile(values, 99), 2),
+    }
+
+
+def record(stage: str, seconds: float):
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.setdefault(stage, []).append(seconds)
+
+
+def instrument(app_module):
+    """Wrap the backend's client methods so each stage is timed per request."""
+    together = app_module.together_client
+    mcp = app_module.mcp_client
+    original_chat = together.achat_with_tools
+    original_stream = together.astream_chat
+    original_tools = mcp.get_available_tools
+    original_call = mcp.call_tool
+
+    async def timed_chat(messages, tools=None, **kwargs):
+        if tools:
+            stage = "llm_first"
+        elif any(m.get("role") == "tool" for m in messages):
+            stage = "llm_final"
+        else:
+            stage = "llm_summary"
+        start = time.perf_counter()
+        try:
+            return await original_chat(messages, tools, **kwargs)
+        finally:
+            record(stage, time.perf_counter() - start)
+
+    async def timed_stream(messages, tools=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            async for token in original_stream(messages, tools, **kwargs):
+                yield token
+        finally:
+            record("llm_final", time.perf_counter() - start)
+
+    async def timed_tools(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await original_tools(*args, **kwargs)
+        finally:
+            record("tool_discovery", time.perf_counter() - start)
+
+    async def timed_call(tool_name, arguments, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await original_call(tool_name, arguments, **kwargs)
+        finally:
+            record("mcp_call", time.perf_counter() - start)
+
+    together.achat_with_tools = timed_chat
+    together.astream_chat = timed_stream
+    mcp.get_available_tools = timed_tools
+    mcp.call_tool = timed_call
+
+
+def run_one(app_module, message: str) -> Dict[str, Any]:
+    timings: Dict[str, List[float]] = {}
+    token = _current_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = app_module.app.test_client().post("/chat", json={"message": message})
+        body = response.get_json(silent=True) or {}
+        ok = response.status_code == 200 and "error" not in body
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_timings.reset(token)
+    return {"ok": ok, "seconds": elapsed, "timings": timings}
+
+
+def run_scenario(app_module, name: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    make_message = SCENARIOS[name]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda i: run_one(app_module, make_message(i)), range(requests)))
+    wall = time.perf_counter() - start
+
+    stages: Dict[str, List[float]] = {}
+    for outcome in outcomes:
+        for stage, values in outcome["timings"].items():
+            # A request with several tool calls counts each call separately
+            stages.setdefault(stage, []).extend(values)
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for o in outcomes if not o["ok"]),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "latency": summarize([o["seconds"] for o in outcomes]),
+        "stages": {stage: summarize(stages[stage]) for stage in STAGES if stage in stages},
+    }
+
+
+def peak_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if platform.system() == "Darwin" else rss * 1024
+
+
+def server_rss_bytes(app_module) -> List[int]:
+    """RSS of each pooled MCP server as last reported by its stats resource."""
+    pool = app_module.mcp_client.stats()
+    return [
+        (server.get("server_stats") or {}).get("rss_bytes", 0)
+        for server in pool.get("servers", [])
+    ]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print(f"\nCommit {results['commit']}  (peak backend RSS {results['peak_rss_bytes'] / 2**20:.1f} MiB)")
+    for name, scenario in results["scenarios"].items():
+        latency = scenario["latency"]
+        line = (
+            f"{name:<12} {scenario['throughput_rps']:>7.2f} req/s  "
+            f"p50 {latency['p50_ms']:>8.1f}  p95 {latency['p95_ms']:>8.1f}  p99 {latency['p99_ms']:>8.1f} ms  "
+            f"errors {scenario['errors']}"
+        )
+        old = (baseline or {}).get("scenarios", {}).get(name)
+        if old and old["latency"]["p50_ms"]:
+            change = 100 * (latency["p50_ms"] - old["latency"]["p50_ms"]) / old["latency"]["p50_ms"]
+            line += f"  (p50 {change:+.1f}% vs {baseline['commit']})"
+        print(line)
+        for stage, stats in scenario["stages"].items():
+            print(f"    {stage:<15} n={stats['count']:<5} p50 {stats['p50_ms']:>8.1f}  p95 {stats['p95_ms']:>8.1f} ms")
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Offline /chat benchmark")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--page-kb", type=float, default=20, help="Default scraped page size")
+    parser.add_argument("--scrape-latency", type=float, default=0.05, help="Fake scrape API latency (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake completion latency (s)")
+    parser.add_argument("--cache", action="store_true", help="Keep the scrape result cache enabled")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    scrape_api = FakeScrapeAPI(page_kb=args.page_kb, latency=args.scrape_latency).start()
+    completion_api = FakeCompletionAPI(latency=args.llm_latency).start()
+
+    # The backend reads its configuration at import time; its stores live in a
+    # scratch directory so runs neither read nor leave behind the real data
+    data_dir = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        "FINGERPRINT_DB": os.path.join(data_dir, "fingerprints.sqlite3"),
+        "JOB_DB": os.path.join(data_dir, "jobs.sqlite3"),
+        "CONVERSATION_DB": os.path.join(data_dir, "conversations.sqlite3"),
+        "SEARCH_INDEX_DB": os.path.join(data_dir, "search_index.sqlite3"),
+        "SCRAPE_CACHE_DIR": os.path.join(data_dir, "scrape_cache"),
+        "COMPLETION_CACHE_DIR": os.path.join(data_dir, "completion_cache"),
+        "TOGETHER_API_KEY": "bench",
+        "TOGETHER_BASE_URL": completion_api.base_url,
+        "TOGETHER_NO_BANNER": "1",
+        "SCRAPE_API_ENDPOINT": scrape_api.endpoint,
+        "SCRAPE_CACHE_ENABLED": "true" if args.cache else "false",
+        "FASTMCP_LOG_LEVEL": "WARNING",
+        # Every request comes from the test client; measure the pipeline, not admission control
+        "RATE_LIMIT_PER_MINUTE": "0",
+        "CHAT_MAX_CONCURRENCY": "0",
+    })
+    sys.path.insert(0, BACKEND_DIR)
+    import logging
+    import app as app_module
+    logging.getLogger().setLevel(logging.WARNING)
+    instrument(app_module)
+
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "page_kb": args.page_kb,
+            "scrape_latency": args.scrape_latency,
+            "llm_latency": args.llm_latency,
+            "cache": args.cache,
+        },
+        "scenarios": {},
+    }
+    try:
+        # Spawn the pooled servers and load the tool list outside the measurements
+        app_module.app.test_client().get("/debug/tools")
+        for name in args.scenario or list(SCENARIOS):
+            results["scenarios"][name] = run_scenario(app_module, name, args.requests, args.concurrency)
+        results["peak_rss_bytes"] = peak_rss_bytes()
+        results["mcp_server_rss_bytes"] = server_rss_bytes(app_module)
+    finally:
+        app_module.mcp_client.close()
+        scrape_api.stop()
+        completion_api.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{results['commit']}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -64,10 +64,15 @@ cleanup() {
 # Set up signal handlers for graceful shutdown
 trap cleanup SIGINT SIGTERM
 
-# Start Flask backend
-echo "🔧 Starting Flask backend on port 9000..."
+# Start backend (BACKEND_SERVER=asgi serves the same API from one async event loop)
 cd backend
-python app.py > ../logs/backend.log 2>&1 &
+if [ "${BACKEND_SERVER:-flask}" = "asgi" ]; then
+    echo "🔧 Starting ASGI backend on port 9000..."
+    uvicorn asgi:app --port 9000 > ../logs/backend.log 2>&1 &
+else
+    echo "🔧 Starting Flask backend on port 9000..."
+    python app.py > ../logs/backend.log 2>&1 &
+fi
 BACKEND_PID=$!
 cd ..
 
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other as top-level modules (they run from backend/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+
+@pytest.fixture(scope="session")
+def backend_env(tmp_path_factory):
+    """Points the backend's stores at a temporary directory.
+
+    The backend modules read their configuration at import time, so fixtures
+    importing them depend on this one.
+    """
+    data = tmp_path_factory.mktemp("data")
+    os.environ.update({
+        "TOGETHER_API_KEY": os.environ.get("TOGETHER_API_KEY", "test"),
+        "TOGETHER_NO_BANNER": "1",
+        "FINGERPRINT_DB": str(data / "fingerprints.sqlite3"),
+        "CONVERSATION_DB": str(data / "conversations.sqlite3"),
+        "JOB_DB": str(data / "jobs.sqlite3"),
+        "SEARCH_INDEX_DB": str(data / "search_index.sqlite3"),
+        "SCRAPE_CACHE_DIR": str(data / "scrape_cache"),
+        "COMPLETION_CACHE_ENABLED": "false",
+        "RATE_LIMIT_PER_MINUTE": "0",
+    })
+    return data
+
+
+@pytest.fixture(scope="session")
+def app_module(backend_env):
+    """``backend/app.py``; tests stub its clients (``together_client``, ``mcp_client``)
+    rather than starting the MCP servers or calling Together."""
+    import app
+    return app
+
+
+@pytest.fixture(scope="session")
+def scrape_server(backend_env):
+    """``backend/scrape_mcp_server.py``; its tools are plain async functions."""
+    import scrape_mcp_server
+    return scrape_mcp_server
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import pytest
+from backend.admission import (
+    AdmissionControl,
+    ClientRateLimiter,
+    ConcurrencyLimiter,
+    Overloaded,
+    client_id,
+)
+
+
+def test_token_bucket_allows_bursts_and_refills(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("backend.admission.time.monotonic", lambda: now[0])
+    limiter = ClientRateLimiter(per_minute=60, burst=2)
+
+    assert limiter.check("a") == 0.0
+    assert limiter.check("a") == 0.0
+    assert limiter.check("a") == pytest.approx(1.0)
+    assert limiter.check("b") == 0.0
+
+    now[0] += 1.5
+    assert limiter.check("a") == 0.0
+    assert limiter.stats()["rejected"] == 1
+    assert ClientRateLimiter(per_minute=0).check("a") == 0.0
+
+
+def test_rate_limited_clients_get_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr("backend.admission.time.monotonic", lambda: 1000.0)
+    admission = AdmissionControl(ConcurrencyLimiter(4), ClientRateLimiter(per_minute=6, burst=1))
+
+    admission.admit("ip:10.0.0.1").release()
+    with pytest.raises(Overloaded) as refused:
+        admission.admit("ip:10.0.0.1")
+
+    assert (refused.value.status, refused.value.reason, refused.value.retry_after) == (429, "rate_limited", 10)
+    assert admission.limiter.stats()["in_flight"] == 0
+
+
+def test_waiters_get_slots_in_order_and_the_queue_is_bounded():
+    limiter = ConcurrencyLimiter(max_concurrency=1, max_queued=1, queue_timeout=5)
+    first = limiter.acquire()
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(limiter.acquire()))
+    waiter.start()
+    while limiter.queued == 0:
+        pass
+
+    with pytest.raises(Overloaded) as refused:
+        limiter.acquire()
+    assert (refused.value.status, refused.value.reason) == (503, "queue_full")
+
+    first.release()
+    waiter.join(5)
+    assert len(admitted) == 1
+    stats = limiter.stats()
+    assert (stats["in_flight"], stats["queued"], stats["admitted_after_wait"]) == (1, 0, 1)
+    admitted[0].release()
+    admitted[0].release()
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_waiting_past_the_deadline_is_shed():
+    limiter = ConcurrencyLimiter(max_concurrency=1, max_queued=4, queue_timeout=0.05)
+    ticket = limiter.acquire()
+
+    with pytest.raises(Overloaded) as refused:
+        limiter.acquire()
+
+    assert refused.value.reason == "timeout"
+    assert refused.value.retry_after >= 1
+    assert limiter.stats()["queued"] == 0
+    ticket.release()
+    assert limiter.stats()["shed"] == {"queue_full": 0, "timeout": 1}
+
+
+@pytest.mark.asyncio
+async def test_async_waiters_are_woken_by_releases_and_cancellation_frees_the_queue():
+    limiter = ConcurrencyLimiter(max_concurrency=1, max_queued=2, queue_timeout=5)
+    ticket = await limiter.acquire_async()
+    waiting = asyncio.ensure_future(limiter.acquire_async())
+    cancelled = asyncio.ensure_future(limiter.acquire_async())
+    await asyncio.sleep(0)
+    assert limiter.queued == 2
+
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    # Released from another thread, as Flask's request threads would
+    await asyncio.to_thread(ticket.release)
+    second = await asyncio.wait_for(waiting, 1)
+
+    assert limiter.stats()["in_flight"] == 1
+    second.release()
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_client_id_prefers_a_configured_key_header():
+    headers = {"X-API-Key": "secret", "X-Forwarded-For": "203.0.113.7, 10.0.0.2"}
+
+    assert client_id(headers, "10.0.0.2") == "ip:10.0.0.2"
+    assert client_id(headers, "10.0.0.2", trust_proxy=True) == "ip:203.0.113.7"
+    key = client_id(headers, "10.0.0.2", key_header="X-API-Key")
+    assert key.startswith("key:") and "secret" not in key
+    assert client_id({"Authorization": "Bearer secret"}, None, key_header="Authorization") == key
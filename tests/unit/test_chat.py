@@ -0,0 +1,364 @@
+import asyncio
+import json
+import logging
+import time
+from types import SimpleNamespace
+
+import pytest
+from together.types.chat_completions import FunctionCall, ToolCalls
+
+SCRAPE_URL_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "scrape_url",
+        "description": "Scrape a web page",
+        "parameters": {"type": "object", "properties": {"url": {"type": "string"}}, "required": ["url"]},
+    },
+}
+
+
+class FakeMCP:
+    """Stands in for the app's MCP client.
+
+    ``pages`` maps URLs to scraped text, or to an exception the call raises;
+    ``delays`` maps URLs to seconds the call takes. Like the scrape server,
+    pages are served from ``cache`` unless the call asks for a fresh copy.
+    """
+
+    def __init__(self, pages=None, delays=None):
+        self.pages = pages or {}
+        self.delays = delays or {}
+        self.cache = {}
+        self.calls = []
+
+    async def get_available_tools(self):
+        return [SCRAPE_URL_TOOL]
+
+    async def call_tool(self, tool_name, arguments, **kwargs):
+        self.calls.append((tool_name, arguments))
+        url = arguments["url"]
+        await asyncio.sleep(self.delays.get(url, 0.01))
+        if url in self.cache and arguments.get("use_cache", True) and not arguments.get("force_refresh"):
+            return self.cache[url]
+        page = self.pages[url]
+        if isinstance(page, Exception):
+            raise page
+        self.cache[url] = page
+        return page
+
+
+def scrape_call(call_id, url):
+    return ToolCalls(
+        id=call_id, type="function", function=FunctionCall(name="scrape_url", arguments=json.dumps({"url": url}))
+    )
+
+
+def completion(content="", tool_calls=None):
+    message = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+@pytest.fixture
+def chat(app_module, monkeypatch):
+    """Stubs the app's clients; returns (app, fake MCP client, streamed reply tokens)."""
+    mcp = FakeMCP()
+    tokens = ["Fresh ", "summary"]
+
+    async def astream_chat(messages, tools=None, **kwargs):
+        for token in tokens:
+            yield token
+
+    monkeypatch.setattr(app_module.mcp_client, "get_available_tools", mcp.get_available_tools)
+    monkeypatch.setattr(app_module.mcp_client, "call_tool", mcp.call_tool)
+    monkeypatch.setattr(app_module.together_client, "astream_chat", astream_chat)
+    return app_module, mcp, tokens
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_run_concurrently_and_results_keep_the_models_order(chat):
+    app, mcp, _ = chat
+    urls = [f"https://example.com/{i}" for i in range(3)]
+    mcp.pages.update({url: f"page {i}" for i, url in enumerate(urls)})
+    # The first call finishes last
+    mcp.delays.update({urls[0]: 0.3, urls[1]: 0.1, urls[2]: 0.2})
+    events = []
+
+    started = time.perf_counter()
+    results = await app.execute_tool_calls(
+        [scrape_call(f"call_{i}", url) for i, url in enumerate(urls)], app.mcp_client, events.append
+    )
+
+    assert results == ["page 0", "page 1", "page 2"]
+    assert time.perf_counter() - started < 0.5
+    assert [e["index"] for e in events if e["event"] == "scrape_finished"] == [1, 2, 0]
+
+
+@pytest.mark.asyncio
+async def test_a_failing_or_slow_tool_call_does_not_cancel_the_others(chat, monkeypatch):
+    app, mcp, _ = chat
+    monkeypatch.setattr(app, "TOOL_CALL_TIMEOUT", 0.2)
+    mcp.pages.update({
+        "https://example.com/ok": "fine",
+        "https://example.com/broken": RuntimeError("connection reset"),
+        "https://example.com/slow": "never seen",
+        "https://example.com/later": "also fine",
+    })
+    mcp.delays["https://example.com/slow"] = 5
+    mcp.delays["https://example.com/later"] = 0.1
+    calls = [
+        scrape_call("a", "https://example.com/ok"),
+        scrape_call("b", "https://example.com/broken"),
+        scrape_call("c", "https://example.com/slow"),
+        ToolCalls(id="d", type="function", function=FunctionCall(name="scrape_url", arguments="{not json")),
+        scrape_call("e", "https://example.com/later"),
+    ]
+
+    results = await app.execute_tool_calls(calls, app.mcp_client)
+
+    assert results[0] == "fine"
+    assert results[1] == "Error calling tool: connection reset"
+    assert results[2] == "Error: scrape_url timed out after 0 seconds"
+    assert results[3].startswith("Error: invalid arguments for scrape_url")
+    assert results[4] == "also fine"
+
+
+@pytest.mark.asyncio
+async def test_model_chosen_tool_results_reach_the_final_call_in_tool_call_order(chat, monkeypatch):
+    app, mcp, _ = chat
+    mcp.pages.update({"https://a.example.com/": "Alpha page", "https://b.example.com/": "Beta page"})
+    mcp.delays["https://a.example.com/"] = 0.1
+    requests = []
+
+    async def achat_with_tools(messages, tools=None, **kwargs):
+        requests.append(list(messages))
+        if tools:
+            return completion(tool_calls=[
+                scrape_call("call_a", "https://a.example.com/"), scrape_call("call_b", "https://b.example.com/")
+            ])
+        return completion("Alpha is longer than Beta")
+
+    monkeypatch.setattr(app.together_client, "achat_with_tools", achat_with_tools)
+
+    result = await app.process_chat(
+        "Which is longer, https://a.example.com/ or https://b.example.com/?", app.mcp_client
+    )
+
+    assert result["response"] == "Alpha is longer than Beta"
+    assert result["tool_used"] and result["tool_results"] == "Alpha page"
+    final_messages = requests[-1]
+    assert [m["role"] for m in final_messages[-3:]] == ["assistant", "tool", "tool"]
+    assert [(m["tool_call_id"], m["content"]) for m in final_messages[-2:]] == [
+        ("call_a", "Alpha page"), ("call_b", "Beta page")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_chat_events_report_tool_progress_then_stream_the_reply(chat):
+    app, mcp, tokens = chat
+    url = "https://events.example.com/post"
+    mcp.pages[url] = "A short post. " * 20
+
+    events = await collect(app.chat_events(f"Summarize {url}", app.mcp_client))
+
+    names = [event["event"] for event in events]
+    assert names == ["tool_selected", "scrape_started", "scrape_finished", "token", "token", "done"]
+    assert events[0]["routed"] and events[0]["tools"][0]["name"] == "scrape_url"
+    assert events[2]["bytes"] == len(mcp.pages[url]) and not events[2]["error"]
+    assert [event["content"] for event in events[3:5]] == tokens
+    assert events[-1]["result"]["response"] == "".join(tokens)
+
+
+@pytest.mark.asyncio
+async def test_a_changed_page_is_summarized_without_scraping_it_again(chat):
+    app, mcp, _ = chat
+    url = "https://changed.example.com/post"
+    old_page = "The launch is planned for spring. " * 50
+    app.fingerprint_store.put(url, app.normalize_question(f"Summarize {url}"), old_page, "Old summary")
+    mcp.pages[url] = "Completely different text about quarterly revenue and hiring plans. " * 50
+
+    events = await collect(app.chat_events(f"Summarize {url}", app.mcp_client))
+
+    done = events[-1]["result"]
+    assert done["fingerprint"]["status"] == "changed"
+    assert done["response"] == "Fresh summary"
+    assert done["tool_results"] == mcp.pages[url]
+    # The fingerprint check's page is the tool result; the URL is fetched once
+    assert mcp.calls == [("scrape_url", {"url": url, "force_refresh": True})]
+
+
+@pytest.mark.asyncio
+async def test_a_page_edited_within_the_scrape_cache_ttl_is_not_reported_unchanged(chat):
+    app, mcp, _ = chat
+    url = "https://status.example.com/"
+    old_page = "\n".join(f"Service {i}: operational" for i in range(40))
+    app.fingerprint_store.put(url, app.normalize_question(f"Summarize {url}"), old_page, "All services are up")
+    # The scrape cache still holds the page as it was summarized
+    mcp.cache[url] = old_page
+    mcp.pages[url] = old_page.replace("Service 7: operational", "Service 7: degraded")
+
+    events = await collect(app.chat_events(f"Summarize {url}", app.mcp_client))
+
+    result = events[-1]["result"]
+    assert result["fingerprint"]["status"] != "unchanged"
+    assert "+Service 7: degraded" in result["fingerprint"]["changed_since"]
+
+
+def stream_events(app, message):
+    response = app.app.test_client().post("/chat/stream", json={"message": message})
+    try:
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    finally:
+        # Servers close the response when the stream ends, which frees the admission slot
+        response.close()
+
+
+def test_chat_stream_sends_tool_events_then_tokens_then_done(chat):
+    app, mcp, tokens = chat
+    url = "https://stream.example.com/post"
+    mcp.pages[url] = "Streamed page. " * 20
+
+    events = stream_events(app, f"Summarize {url}")
+
+    assert [event["event"] for event in events] == [
+        "tool_selected", "scrape_started", "scrape_finished", "token", "token", "done"
+    ]
+    assert events[1] == {"event": "scrape_started", "index": 0, "tool": "scrape_url", "url": url}
+    assert "".join(event["content"] for event in events if event["event"] == "token") == "".join(tokens)
+    assert events[-1]["result"]["response"] == "".join(tokens)
+    assert events[-1]["result"]["routed"]
+
+
+def test_chat_stream_marks_failed_scrapes_and_still_replies(chat):
+    app, mcp, tokens = chat
+    url = "https://down.example.com/post"
+    mcp.pages[url] = RuntimeError("scrape API unavailable")
+
+    events = stream_events(app, f"Summarize {url}")
+
+    finished = next(event for event in events if event["event"] == "scrape_finished")
+    assert finished["error"]
+    assert events[-1]["result"]["tool_results"] == "Error calling tool: scrape API unavailable"
+    assert events[-1]["result"]["response"] == "".join(tokens)
+
+
+
+def test_streamed_token_usage_is_counted_on_the_request(chat, monkeypatch, caplog):
+    app, mcp, tokens = chat
+    url = "https://usage.example.com/post"
+    mcp.pages[url] = "Page text. " * 20
+
+    async def astream_chat(messages, tools=None, on_usage=None, **kwargs):
+        for token in tokens:
+            yield token
+        on_usage(SimpleNamespace(usage=SimpleNamespace(prompt_tokens=120, completion_tokens=2)))
+
+    monkeypatch.setattr(app.together_client, "astream_chat", astream_chat)
+    # Log every request's breakdown
+    monkeypatch.setattr(app, "SLOW_REQUEST_SECONDS", 0.000001)
+
+    with caplog.at_level(logging.WARNING):
+        stream_events(app, f"Summarize {url}")
+
+    assert '"tokens": {"prompt": 120, "completion": 2}' in caplog.text
+
+def test_chat_stream_ends_with_an_error_result_when_the_model_fails(chat, monkeypatch):
+    app, mcp, _ = chat
+    url = "https://model-down.example.com/post"
+    mcp.pages[url] = "Page text. " * 20
+
+    async def astream_chat(messages, tools=None, **kwargs):
+        yield "Partial "
+        raise RuntimeError("Together API returned 503")
+
+    monkeypatch.setattr(app.together_client, "astream_chat", astream_chat)
+
+    events = stream_events(app, f"Summarize {url}")
+
+    assert [event["event"] for event in events[-2:]] == ["token", "done"]
+    assert events[-1]["result"]["error"] == "Together API returned 503"
+    assert not events[-1]["result"]["tool_used"]
+
+
+def test_chat_stream_rejects_an_empty_message(app_module):
+    response = app_module.app.test_client().post("/chat/stream", json={"message": ""})
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "No message provided"}
+
+
+@pytest.fixture
+def asgi_client(chat, monkeypatch):
+    """A Starlette test client for ``backend/asgi.py``, run through its lifespan."""
+    from starlette.testclient import TestClient
+
+    app, _, _ = chat
+    import asgi
+
+    lifespan = []
+    monkeypatch.setattr(app.together_client, "enable_async", lambda: lifespan.append("enable_async"))
+    monkeypatch.setattr(app.mcp_client, "warm_up", lambda: lifespan.append("warm_up"))
+    monkeypatch.setattr(app.job_queue, "start", lambda: lifespan.append("jobs_started"))
+    monkeypatch.setattr(app.job_queue, "close", lambda: lifespan.append("jobs_closed"))
+
+    async def cleanup():
+        lifespan.append("cleanup")
+
+    monkeypatch.setattr(app.mcp_client, "cleanup", cleanup)
+    with TestClient(asgi.app) as client:
+        assert lifespan == ["enable_async", "warm_up", "jobs_started"]
+        yield client
+    assert lifespan[3:] == ["jobs_closed", "cleanup"]
+
+
+def test_asgi_health(asgi_client):
+    response = asgi_client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "healthy"}
+
+
+def test_asgi_chat_returns_the_whole_result_and_frees_its_slot(chat, asgi_client, monkeypatch):
+    app, mcp, _ = chat
+    url = "https://asgi.example.com/post"
+    mcp.pages[url] = "ASGI page. " * 20
+
+    final_messages = []
+
+    async def achat_with_tools(messages, tools=None, **kwargs):
+        final_messages.extend(messages)
+        return completion("ASGI summary")
+
+    monkeypatch.setattr(app.together_client, "achat_with_tools", achat_with_tools)
+
+    response = asgi_client.post("/chat", json={"message": f"Summarize {url}"})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["response"] == "ASGI summary"
+    assert result["tool_results"] == mcp.pages[url] and result["routed"]
+    assert final_messages[-1]["role"] == "tool" and final_messages[-1]["tool_call_id"] == "route_0"
+    assert app.admission.stats()["concurrency"]["in_flight"] == 0
+    assert asgi_client.post("/chat", json={}).status_code == 400
+
+
+def test_asgi_chat_stream_sends_ndjson_events(chat, asgi_client):
+    app, mcp, tokens = chat
+    url = "https://asgi-stream.example.com/post"
+    mcp.pages[url] = "Streamed over ASGI. " * 20
+
+    with asgi_client.stream("POST", "/chat/stream", json={"message": f"Summarize {url}"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert [event["event"] for event in events] == [
+        "tool_selected", "scrape_started", "scrape_finished", "token", "token", "done"
+    ]
+    assert events[-1]["result"]["response"] == "".join(tokens)
+    assert app.admission.stats()["concurrency"]["in_flight"] == 0
@@ -0,0 +1,44 @@
+import pytest
+from backend.compaction import ContentCompactor, dedupe_blocks, estimate_tokens, strip_boilerplate
+
+PAGE = """# Example
+
+- [Home](/)
+- [About](/about)
+- [Blog](/blog)
+
+![logo](/logo.png)
+
+Read the [full report](https://example.com/report) for details.
+
+Subscribe to our newsletter for weekly updates.
+
+Subscribe to our newsletter for weekly updates.
+"""
+
+
+def test_strip_boilerplate_and_dedupe():
+    cleaned = dedupe_blocks(strip_boilerplate(PAGE))
+
+    assert "[Home]" not in cleaned and "logo" not in cleaned
+    assert "Read the full report for details." in cleaned
+    assert cleaned.count("Subscribe to our newsletter") == 1
+    assert estimate_tokens(cleaned) < estimate_tokens(PAGE)
+
+
+@pytest.mark.asyncio
+async def test_large_results_are_summarized_in_chunks():
+    calls = []
+
+    async def summarize(chunk):
+        calls.append(chunk)
+        return f"summary {len(calls)}"
+
+    page = "\n\n".join(f"Paragraph {i} " + "word " * 200 for i in range(20))
+    compactor = ContentCompactor(summarize, token_budget=500, chunk_tokens=1000)
+    result = await compactor.compact_all([page, "Error: fetch failed"])
+
+    assert len(calls) == result["map_reduce_chunks"] > 1
+    assert result["contents"][0].startswith(f"[Part 1/{len(calls)}]")
+    assert result["contents"][1] == "Error: fetch failed"
+    assert result["tokens_after"] < result["tokens_before"]
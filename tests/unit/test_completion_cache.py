@@ -0,0 +1,157 @@
+from types import SimpleNamespace
+
+import pytest
+from backend.together_client import CACHE_LOOKUPS, TogetherAIClient, completion_key
+from together.types import ChatCompletionResponse
+
+TOOLS = [{"type": "function", "function": {"name": "scrape_url", "parameters": {"type": "object"}}}]
+
+
+def tool_turn(call_id):
+    return [
+        {"role": "user", "content": "Summarize https://example.com"},
+        {"role": "assistant", "content": None, "tool_calls": [
+            {"id": call_id, "type": "function", "function": {"name": "scrape_url", "arguments": "{}"}}
+        ]},
+        {"role": "tool", "tool_call_id": call_id, "content": "# Example"},
+    ]
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if kwargs["stream"]:
+            chunks = [
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], usage=None)
+                for token in ("Example ", "Domain")
+            ]
+            # Usage arrives on a final chunk without choices
+            usage = SimpleNamespace(prompt_tokens=10, completion_tokens=2)
+            return iter(chunks + [SimpleNamespace(choices=[], usage=usage)])
+        return ChatCompletionResponse.model_validate({
+            "id": f"r{len(self.requests)}",
+            "model": kwargs["model"],
+            "choices": [{"index": 0, "finish_reason": "tool_calls", "message": {
+                "role": "assistant", "content": "Scraping",
+                "tool_calls": [{"id": "call_x", "type": "function",
+                                "function": {"name": "scrape_url", "arguments": "{\"url\": \"https://example.com\"}"}}],
+            }}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        })
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setenv("TOGETHER_API_KEY", "test")
+    monkeypatch.setenv("COMPLETION_CACHE_ENABLED", "true")
+    monkeypatch.setenv("COMPLETION_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("TOGETHER_TEMPERATURE", "0")
+
+    def make():
+        client = TogetherAIClient()
+        completions = FakeCompletions()
+        client.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        return client, completions
+
+    return make
+
+
+def test_repeated_request_is_served_from_cache(client):
+    together, completions = client()
+    hits = CACHE_LOOKUPS.value(result="hit")
+
+    first = together.chat_with_tools([{"role": "user", "content": "hi"}], TOOLS)
+    second = together.chat_with_tools([{"role": "user", "content": "hi"}], TOOLS)
+
+    assert len(completions.requests) == 1
+    assert completions.requests[0]["temperature"] == 0
+    assert CACHE_LOOKUPS.value(result="hit") - hits == 1
+    assert second.cached and second.usage is None
+    assert second.choices[0].message.content == first.choices[0].message.content
+    assert second.choices[0].message.tool_calls[0].function.name == "scrape_url"
+
+    # A different tool set, or cache=False, goes to the API
+    together.chat_with_tools([{"role": "user", "content": "hi"}])
+    together.chat_with_tools([{"role": "user", "content": "hi"}], TOOLS, cache=False)
+    assert len(completions.requests) == 3
+
+
+def test_disk_tier_survives_a_restart(client):
+    together, _ = client()
+    together.chat_with_tools([{"role": "user", "content": "hi"}], TOOLS)
+
+    restarted, completions = client()
+    response = restarted.chat_with_tools([{"role": "user", "content": "hi"}], TOOLS)
+
+    assert completions.requests == []
+    assert response.cached
+    assert restarted.cache_stats()["disk_hits"] == 1
+
+
+def test_sampled_requests_are_not_cached_unless_asked(client, monkeypatch):
+    monkeypatch.setenv("TOGETHER_TEMPERATURE", "0.7")
+    together, completions = client()
+    together.chat_with_tools([{"role": "user", "content": "hi"}])
+    together.chat_with_tools([{"role": "user", "content": "hi"}])
+    assert len(completions.requests) == 2
+
+    monkeypatch.setenv("TOGETHER_SEED", "42")
+    seeded, completions = client()
+    seeded.chat_with_tools([{"role": "user", "content": "hi"}])
+    seeded.chat_with_tools([{"role": "user", "content": "hi"}])
+    assert len(completions.requests) == 1
+
+
+def test_streamed_replies_are_cached_whole(client):
+    together, completions = client()
+
+    assert list(together.stream_chat([{"role": "user", "content": "hi"}])) == ["Example ", "Domain"]
+    assert list(together.stream_chat([{"role": "user", "content": "hi"}])) == ["Example Domain"]
+    assert together.chat_with_tools([{"role": "user", "content": "hi"}]).choices[0].message.content == "Example Domain"
+    assert len(completions.requests) == 1
+
+
+
+@pytest.mark.asyncio
+async def test_streamed_usage_is_passed_to_the_caller(client):
+    together, _ = client()
+    usages = []
+
+    stream = together.astream_chat([{"role": "user", "content": "hi"}], on_usage=usages.append)
+    tokens = [token async for token in stream]
+
+    assert tokens == ["Example ", "Domain"]
+    assert [(chunk.usage.prompt_tokens, chunk.usage.completion_tokens) for chunk in usages] == [(10, 2)]
+
+
+@pytest.mark.asyncio
+async def test_a_stream_abandoned_early_is_closed(client):
+    together, completions = client()
+    closed = []
+
+    def stream(**kwargs):
+        try:
+            for token in ("One ", "two ", "three"):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], usage=None)
+        finally:
+            closed.append(True)
+
+    completions.create = stream
+    tokens = together.astream_chat([{"role": "user", "content": "count"}])
+
+    assert await tokens.__anext__() == "One "
+    await tokens.aclose()
+
+    assert closed == [True]
+    # A partial reply is never cached
+    assert together.cache_stats()["writes"] == 0
+
+def test_key_ignores_tool_call_ids_but_not_sampling():
+    sampling = {"temperature": 0}
+
+    assert completion_key("m", tool_turn("call_abc"), TOOLS, sampling) == completion_key("m", tool_turn("call_xyz"), TOOLS, sampling)
+    assert completion_key("m", tool_turn("a"), TOOLS, sampling) != completion_key("m", tool_turn("a"), TOOLS, {"temperature": 0, "seed": 1})
+    assert completion_key("m", tool_turn("a"), TOOLS, sampling) != completion_key("n", tool_turn("a"), TOOLS, sampling)
@@ -0,0 +1,48 @@
+import asyncio
+
+from backend.conversations import ConversationStore, render_history
+
+
+def page(url, words):
+    return {"name": "scrape_url", "arguments": f'{{"url": "{url}"}}', "url": url, "content": "word " * words}
+
+
+def test_history_keeps_newest_tool_payloads_within_budget(tmp_path):
+    store = ConversationStore(str(tmp_path / "conv.sqlite3"), summarize=None, budget=1000)
+    store.append("s1", "Summarize https://a.example", "A is about apples.", [page("https://a.example", 600)])
+    store.append("s1", "Summarize https://b.example", "B is about bees.", [page("https://b.example", 600)])
+
+    messages = asyncio.run(store.history("s1"))
+    tool_messages = [message["content"] for message in messages if message["role"] == "tool"]
+
+    assert tool_messages[0].startswith("[Result of scrape_url for https://a.example")
+    assert tool_messages[1] == "word " * 600
+    assert [message["role"] for message in messages[:4]] == ["user", "assistant", "tool", "assistant"]
+    assert messages[1]["tool_calls"][0]["id"] == messages[2]["tool_call_id"]
+
+
+def test_old_turns_are_folded_into_the_summary(tmp_path):
+    calls = []
+
+    async def summarize(summary, turns):
+        calls.append(turns)
+        return "Discussed turns 0-1."
+
+    store = ConversationStore(str(tmp_path / "conv.sqlite3"), summarize=summarize, budget=8000, max_turns=2)
+    for index in range(4):
+        store.append("s1", f"question {index}", f"answer {index}", [])
+
+    messages = asyncio.run(store.history("s1"))
+
+    assert messages[0] == {"role": "system", "content": "Summary of the earlier conversation:\nDiscussed turns 0-1."}
+    assert [message["content"] for message in messages[1:]] == ["question 2", "answer 2", "question 3", "answer 3"]
+    assert "question 1" in calls[0] and "question 2" not in calls[0]
+    assert store.stats() == {"sessions": 1, "turns": 2, "folds": 1}
+
+    asyncio.run(store.history("s1"))
+    assert len(calls) == 1
+    assert store.delete("s1") and store.load("s1")["turns"] == []
+
+
+def test_render_without_history_is_empty():
+    assert render_history("", [], 100) == []
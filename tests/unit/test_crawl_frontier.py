@@ -0,0 +1,28 @@
+from backend.crawl_frontier import CrawlFrontier
+
+
+def test_frontier_dedupes_and_stays_on_site():
+    frontier = CrawlFrontier("https://docs.example.com/guide")
+
+    assert frontier.add("https://docs.example.com/guide", 0)
+    assert not frontier.add("https://DOCS.example.com/guide#intro", 1)
+    assert not frontier.add("https://other.example.org/page", 1)
+    assert not frontier.add("https://docs.example.com/logo.png", 1)
+    assert not frontier.add("mailto:team@example.com", 1)
+    assert frontier.add("https://www.docs.example.com/guide/install", 1)
+
+    assert frontier.seen == 2
+    assert len(frontier) == 2
+
+
+def test_frontier_prefers_shallow_pages_under_the_seed_path():
+    frontier = CrawlFrontier("https://docs.example.com/guide/")
+    frontier.add("https://docs.example.com/guide/a/b/deep", 2)
+    frontier.add("https://docs.example.com/blog/post", 1)
+    frontier.add("https://docs.example.com/guide/setup", 1)
+
+    assert [frontier.pop()[0] for _ in range(3)] == [
+        "https://docs.example.com/guide/setup",
+        "https://docs.example.com/blog/post",
+        "https://docs.example.com/guide/a/b/deep",
+    ]
@@ -0,0 +1,86 @@
+import asyncio
+import signal
+
+import pytest
+import uvicorn
+from backend.drain import DrainingServer, InFlightRequests
+
+
+def http_scope(method: str = "POST"):
+    return {"type": "http", "method": method, "path": "/mcp", "headers": []}
+
+
+async def call(app, scope):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent
+
+
+@pytest.mark.asyncio
+async def test_counts_posts_in_flight_but_not_event_streams():
+    release = asyncio.Event()
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(scope["method"])
+        await release.wait()
+
+    requests = InFlightRequests(app)
+    tasks = [asyncio.ensure_future(call(requests, http_scope(method))) for method in ("POST", "POST", "GET")]
+    await asyncio.sleep(0.01)
+    assert requests.active == 2
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert requests.active == 0
+    assert sorted(seen) == ["GET", "POST", "POST"]
+
+
+@pytest.mark.asyncio
+async def test_draining_turns_new_requests_away():
+    async def app(scope, receive, send):
+        raise AssertionError("should not be called while draining")
+
+    requests = InFlightRequests(app)
+    requests.draining = True
+    sent = await call(requests, http_scope())
+
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"1") in sent[0]["headers"]
+    assert requests.rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_shutdown_waits_for_in_flight_requests():
+    requests = InFlightRequests(lambda scope, receive, send: None)
+    server = DrainingServer(uvicorn.Config(requests), requests, drain_timeout=30)
+    requests.active = 1
+
+    server.handle_exit(signal.SIGTERM, None)
+    assert requests.draining
+    await server.on_tick(1)
+    assert not server.should_exit
+
+    requests.active = 0
+    assert await server.on_tick(2)
+
+
+@pytest.mark.asyncio
+async def test_shutdown_proceeds_after_drain_timeout_or_second_signal():
+    requests = InFlightRequests(lambda scope, receive, send: None)
+    server = DrainingServer(uvicorn.Config(requests), requests, drain_timeout=0)
+    requests.active = 1
+    server.handle_exit(signal.SIGTERM, None)
+    assert await server.on_tick(1)
+
+    other = DrainingServer(uvicorn.Config(requests), requests, drain_timeout=30)
+    other.handle_exit(signal.SIGTERM, None)
+    other.handle_exit(signal.SIGTERM, None)
+    assert other.should_exit
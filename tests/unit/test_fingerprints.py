@@ -0,0 +1,45 @@
+from backend.fingerprints import (
+    FingerprintStore,
+    changed_since,
+    extract_urls,
+    hamming,
+    normalize_question,
+    simhash,
+)
+
+PAGE = "\n".join(f"Paragraph {i} explains how the widget handles case number {i}." for i in range(40))
+
+
+def test_question_normalization_ignores_url_and_punctuation():
+    message = "Summarize https://example.com/docs, please!"
+    assert extract_urls(message) == ["https://example.com/docs"]
+    assert normalize_question(message) == normalize_question("summarize   https://example.com/other please")
+
+
+def test_simhash_separates_small_edits_from_rewrites():
+    edited = PAGE.replace("case number 7.", "case number 7 (updated).")
+    rewritten = "\n".join(f"Release {i} shipped a new database driver." for i in range(40))
+
+    assert hamming(simhash(PAGE), simhash(edited)) <= 3
+    assert hamming(simhash(PAGE), simhash(rewritten)) > 10
+
+
+def test_store_roundtrip_and_expiry(tmp_path):
+    store = FingerprintStore(str(tmp_path / "fp.sqlite3"), max_age=60)
+    store.put("https://Example.com/docs#top", "summarize", PAGE, "A widget guide.")
+
+    entry = store.get("https://example.com/docs", "summarize")
+    assert entry["summary"] == "A widget guide."
+    assert entry["content"] == PAGE
+    assert entry["simhash"] == simhash(PAGE)
+    assert store.get("https://example.com/docs", "list the sections") is None
+
+    store.max_age = 0
+    assert store.get("https://example.com/docs", "summarize") is None
+    assert store.stats() == {"entries": 1, "hits": 1, "misses": 2, "writes": 1}
+    store.close()
+
+
+def test_changed_since_lists_added_and_removed_lines():
+    diff = changed_since("intro\nold line\noutro", "intro\nnew line\noutro")
+    assert diff == "-old line\n+new line"
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.job_queue import JobQueue, JobStore, QueueFull
+
+
+async def fake_chat(message, session_id=None):
+    yield {"event": "scrape_started", "index": 0, "tool": "scrape_url", "url": message}
+    await asyncio.sleep(0)
+    yield {"event": "done", "result": {"response": f"summary of {message}", "tool_used": True}}
+
+
+def wait_for(store, job_id, status="succeeded", timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while store.get(job_id)["status"] != status:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_job_runs_and_records_events(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    queue = JobQueue(store, fake_chat, workers=1)
+    job = queue.submit("https://example.com", "high")
+    wait_for(store, job["id"])
+
+    finished = store.get(job["id"])
+    assert finished["result"]["response"] == "summary of https://example.com"
+    assert [event["event"] for event in store.events(job["id"])] == ["scrape_started", "done"]
+    assert [event["seq"] for event in store.events(job["id"], after=1)] == [2]
+    assert queue.stats()["completed"]["succeeded"] == 1
+    queue.close()
+
+
+def test_lane_depth_limit_and_priority_validation(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    blocked = threading.Event()
+
+    async def slow_chat(message, session_id=None):
+        while not blocked.is_set():
+            await asyncio.sleep(0.01)
+        yield {"event": "done", "result": {"response": message}}
+
+    queue = JobQueue(store, slow_chat, workers=1, max_queued=1)
+    queue.submit("first", "low")
+    time.sleep(0.1)  # the worker takes the first job
+    queue.submit("second", "low")
+    with pytest.raises(QueueFull):
+        queue.submit("third", "low")
+    queue.submit("urgent", "high")
+    with pytest.raises(ValueError):
+        queue.submit("x", "urgent")
+    assert queue.stats()["rejected"] == 1
+    blocked.set()
+    queue.close()
+
+
+def test_unfinished_jobs_are_requeued_on_start(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    # A worker that died: its lease on the running job has already run out
+    store = JobStore(path, lease=0)
+    job = store.create("https://example.com", "normal")
+    assert store.mark_running(job["id"], "dead-worker")
+    store.close()
+
+    store = JobStore(path)
+    queue = JobQueue(store, fake_chat, workers=1)
+    queue.start()
+    wait_for(store, job["id"])
+    assert store.get(job["id"])["result"]["tool_used"] is True
+    queue.close()
+
+
+
+def test_a_resumed_job_replaces_the_partial_events_of_its_interrupted_run(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path, lease=0)
+    job = store.create("https://example.com", "normal")
+    assert store.mark_running(job["id"], "dead-worker")
+    # The dead worker got as far as scraping and half the reply
+    store.append_event(job["id"], 1, {"event": "scrape_started", "index": 0, "tool": "scrape_url", "url": "x"})
+    store.append_event(job["id"], 2, {"event": "token", "content": "Half an ans"})
+    store.close()
+
+    store = JobStore(path)
+    queue = JobQueue(store, fake_chat, workers=1)
+    queue.start()
+    wait_for(store, job["id"])
+    queue.close()
+
+    events = store.events(job["id"])
+    assert [(event["seq"], event["event"]) for event in events] == [
+        (3, "restarted"), (4, "scrape_started"), (5, "done")
+    ]
+    # A reader that had seen the old run continues with the marker
+    assert store.events(job["id"], after=2)[0]["event"] == "restarted"
+    assert not any(event.get("content") == "Half an ans" for event in events)
+
+def test_jobs_leased_by_a_live_worker_are_not_run_twice(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    release = threading.Event()
+    runs = []
+
+    async def blocking_chat(message, session_id=None):
+        runs.append(message)
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        yield {"event": "done", "result": {"response": message}}
+
+    first = JobQueue(JobStore(path, lease=0.3), blocking_chat, workers=1)
+    job = first.submit("https://example.com")
+    wait_for(first.store, job["id"], status="running")
+
+    # A second process starting on the same database while the first still renews its lease
+    second = JobQueue(JobStore(path, lease=0.3), blocking_chat, workers=1)
+    second.start()
+    time.sleep(0.5)
+    assert not second.store.mark_running(job["id"], second.owner)
+    release.set()
+    wait_for(first.store, job["id"])
+
+    assert runs == ["https://example.com"]
+    first.close()
+    second.close()
+
+
+def test_a_stalled_workers_job_is_taken_over_when_its_lease_expires(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    release = threading.Event()
+
+    async def stuck_chat(message, session_id=None):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        yield {"event": "done", "result": {"response": "from the stalled worker"}}
+
+    stalled = JobQueue(JobStore(path, lease=0.2), stuck_chat, workers=1)
+    stalled.store.renew = lambda job_id, owner: True  # stops renewing, as a hung process would
+    job = stalled.submit("https://example.com")
+    wait_for(stalled.store, job["id"], status="running")
+
+    healthy = JobQueue(JobStore(path, lease=0.2), fake_chat, workers=1)
+    healthy.start()
+    wait_for(healthy.store, job["id"])
+    release.set()
+    time.sleep(0.2)
+
+    assert healthy.stats()["reclaimed"] == 1
+    assert healthy.store.get(job["id"])["result"]["response"] == "summary of https://example.com"
+    stalled.close()
+    healthy.close()
+
+
+def test_reply_tokens_are_stored_in_batches(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+
+    async def streaming_chat(message, session_id=None):
+        yield {"event": "scrape_started", "index": 0, "tool": "scrape_url", "url": message}
+        for word in ("The ", "page ", "says ", "hello."):
+            yield {"event": "token", "content": word}
+        yield {"event": "done", "result": {"response": "The page says hello."}}
+
+    queue = JobQueue(store, streaming_chat, workers=1, token_interval=60)
+    job = queue.submit("https://example.com")
+    wait_for(store, job["id"])
+
+    events = store.events(job["id"])
+    assert [event["event"] for event in events] == ["scrape_started", "token", "done"]
+    assert events[1]["content"] == "The page says hello."
+    queue.close()
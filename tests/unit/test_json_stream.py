@@ -0,0 +1,50 @@
+import json
+
+from backend.json_stream import JsonProjector
+
+FIELDS = {"success": True, "data": {"markdown": True, "metadata": True}}
+DOC = {
+    "success": True,
+    "data": {
+        "markdown": 'Café "menu" \\ ☃\n' * 50,
+        "html": "<p class=\"x\">" * 1000,
+        "metadata": {"title": "Menu", "statusCode": 200, "tags": [1, 2.5, None, False]},
+    },
+}
+
+
+def feed(projector, raw, size):
+    for start in range(0, len(raw), size):
+        projector.feed(raw[start:start + size])
+    return projector.finish()
+
+
+def test_projection_is_independent_of_chunk_boundaries():
+    expected = {"success": True, "data": {"markdown": DOC["data"]["markdown"], "metadata": DOC["data"]["metadata"]}}
+    for ensure_ascii in (True, False):
+        raw = json.dumps(DOC, ensure_ascii=ensure_ascii).encode("utf-8")
+        for size in (1, 2, 5, 4096):
+            projector = JsonProjector(FIELDS)
+            assert feed(projector, raw, size) == expected
+            assert projector.done
+
+
+def test_long_strings_and_lists_are_capped():
+    raw = json.dumps({"data": {"markdown": "x" * 500, "links": list(range(10))}}).encode()
+    projector = JsonProjector({"data": {"markdown": True, "links": True}}, max_string_chars=100, max_items=3)
+    result = feed(projector, raw, 64)
+
+    assert result["data"]["markdown"] == "x" * 100 + "\n\n[... truncated 400 characters]"
+    assert result["data"]["links"] == [0, 1, 2]
+    assert projector.dropped_items == 7
+
+
+def test_cut_off_document_keeps_what_was_read():
+    raw = json.dumps(DOC).encode()
+    projector = JsonProjector(FIELDS)
+    projector.feed(raw[:120])
+    result = projector.finish("response truncated at 1 KiB")
+
+    assert result["success"] is True
+    assert result["data"]["markdown"].endswith("\n\n[... response truncated at 1 KiB]")
+    assert not projector.done
@@ -0,0 +1,194 @@
+import os
+import sys
+
+import pytest
+from backend.local_scrape import LocalScraper, ScrapePolicy, extract_page, route_scrape
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "benchmarks"))
+from fake_services import FakeSite  # noqa: E402
+
+PAGE = """<!doctype html><html lang="en"><head><title>Release notes</title>
+<meta name="description" content="What changed"><base href="/docs/"></head><body>
+<header class="site-header"><nav><a href="/">Home</a></nav></header>
+<div class="layout"><aside class="sidebar"><a href="sidebar">Sidebar link</a></aside>
+<article><h1>Version 1.3</h1><p>Adds <strong>streaming</strong> and <a href="api#stream">a new API</a>.<p>Line one<br>line two
+<ul><li>Item one<ul><li>Nested</li></ul></li><li>Item <em>two</em></ul>
+<pre><code>def f():
+    return 1</code></pre>
+<table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td>2</td></tr></table></article></div>
+<footer class="site-footer">Copyright <a href="https://other.example/#top">Other</a></footer>
+<script>document.write("<p>not content</p>")</script></body></html>"""
+
+
+def test_extracts_main_content_as_markdown():
+    data = extract_page(PAGE, "https://example.com/releases/1.3", ["markdown", "links"])
+
+    assert data["markdown"] == (
+        "# Version 1.3\n\n"
+        "Adds **streaming** and [a new API](https://example.com/docs/api#stream).\n\n"
+        "Line one\nline two\n\n"
+        "- Item one\n  - Nested\n- Item *two*\n\n"
+        "```\ndef f():\n    return 1\n```\n\n"
+        "| A | B |\n| --- | --- |\n| 1 | 2 |"
+    )
+    assert data["metadata"] == {"title": "Release notes", "description": "What changed", "language": "en"}
+    # Links come from the whole page, absolute and without fragments
+    assert data["links"] == [
+        "https://example.com/", "https://example.com/docs/sidebar",
+        "https://example.com/docs/api", "https://other.example/",
+    ]
+
+
+def test_keeps_page_furniture_when_asked_for_the_whole_page():
+    markdown = extract_page(PAGE, "https://example.com/", ["markdown"], only_main_content=False)["markdown"]
+
+    assert "Sidebar link" in markdown and "Copyright" in markdown
+    assert "not content" not in markdown
+
+
+def test_without_article_picks_the_container_with_most_paragraph_text():
+    html = (
+        "<body><div class='menu'><p>Home Products Pricing About us Contact us today</p></div>"
+        "<div id='content'><p>" + "Body text of the post. " * 20 + "</p><p>" + "More of it. " * 20 + "</p></div>"
+        "<div class='social-share'><p>Share this post on every network you know</p></div></body>"
+    )
+    markdown = extract_page(html, "https://example.com/", ["markdown"])["markdown"]
+
+    assert markdown.startswith("Body text of the post.")
+    assert "Home Products" not in markdown and "Share this" not in markdown
+
+
+
+def test_deeply_nested_pages_are_extracted_without_hitting_the_recursion_limit():
+    page = (
+        "<html><body>" + "<div>" * 3000 + "<p>Deep text</p>" + "</div>" * 3000
+        + "<blockquote>" * 3000 + "Quoted" + "</blockquote>" * 3000
+        + "<p>" + "<b>" * 3000 + "Bold" + "</b>" * 3000 + "</p><p>After</p></body></html>"
+    )
+
+    data = extract_page(page, "https://example.com/", ["markdown"], only_main_content=False)
+
+    markdown = data["markdown"]
+    assert markdown.startswith("Deep text\n\n> > >")
+    assert "Quoted" in markdown and "Bold" in markdown
+    assert markdown.endswith("After")
+
+def test_policy_routes_by_mode_domain_and_options():
+    url = {"url": "https://docs.example.com/a", "formats": ["markdown"]}
+
+    assert ScrapePolicy("remote").choose(url) == "remote"
+    assert ScrapePolicy("remote", local_domains=["example.com"]).choose(url) == "local"
+    assert ScrapePolicy("auto").choose(url) == "local"
+    assert ScrapePolicy("auto", remote_domains=["docs.example.com"]).choose(url) == "remote"
+    assert ScrapePolicy("local").choose(dict(url, waitFor=1000)) == "remote"
+    assert ScrapePolicy("local").choose(dict(url, formats=["markdown", "html"])) == "remote"
+    with pytest.raises(ValueError):
+        ScrapePolicy("browser")
+
+
+def test_policy_remembers_hosts_that_keep_needing_the_scrape_api():
+    policy = ScrapePolicy("auto", remember_after=2)
+    params = {"url": "https://app.example.com/x"}
+
+    policy.record_fallback("https://app.example.com/1", "client_rendered")
+    policy.record_success("https://app.example.com/2")
+    policy.record_fallback("https://app.example.com/3", "client_rendered")
+    assert policy.choose(params) == "local"
+
+    policy.record_fallback("https://app.example.com/4", "client_rendered")
+    assert policy.choose(params) == "remote"
+    assert policy.stats()["fallbacks"] == {"client_rendered": 3}
+
+
+@pytest.fixture
+def site():
+    site = FakeSite(latency=0).start()
+    yield site
+    site.stop()
+
+
+@pytest.mark.asyncio
+async def test_static_pages_are_scraped_locally_and_app_shells_fall_back(site):
+    from backend.scrape_http import close_http_client
+
+    remote_calls = []
+
+    async def remote(params):
+        remote_calls.append(params["url"])
+        return {"success": True, "data": {"metadata": {"title": "Rendered"}, "markdown": "Rendered app"}}
+
+    policy = ScrapePolicy("auto")
+    local = LocalScraper(workers=1, allow_private=True)
+    try:
+        article = await route_scrape(
+            {"url": site.url("/article/1?size_kb=4"), "formats": ["markdown", "links"]}, policy, local, remote
+        )
+        app = await route_scrape({"url": site.url("/app/1"), "formats": ["markdown"]}, policy, local, remote)
+        failed = await route_scrape({"url": site.url("/fail"), "formats": ["markdown"]}, policy, local, remote)
+    finally:
+        local.close()
+        await close_http_client()
+
+    data = article["data"]
+    assert data["metadata"]["title"] == "Benchmark page /article/1"
+    assert data["metadata"]["statusCode"] == 200
+    assert data["markdown"].startswith("# Benchmark page /article/1\n\n## Section 0")
+    assert "Copyright" not in data["markdown"]
+    assert site.url("/article/1/child-0") in data["links"]
+
+    assert app["data"]["markdown"] == "Rendered app"
+    assert failed["success"]
+    assert remote_calls == [site.url("/app/1"), site.url("/fail")]
+    assert policy.stats()["fallbacks"] == {"client_rendered": 1, "http_503": 1}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/",
+    "http://localhost:8080/admin",
+    "http://10.1.2.3/",
+    "http://192.168.0.1/",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/",
+    "http://[fe80::1]/",
+    "http://[::ffff:127.0.0.1]/",
+    "file:///etc/passwd",
+])
+async def test_non_public_addresses_are_refused_without_a_request(url):
+    remote_calls = []
+
+    async def remote(params):
+        remote_calls.append(params["url"])
+        return {"success": True, "data": {"markdown": "internal"}}
+
+    local = LocalScraper(workers=0)
+    result = await route_scrape({"url": url, "formats": ["markdown"]}, ScrapePolicy("auto"), local, remote)
+
+    assert not result["success"]
+    assert remote_calls == []
+    assert local.stats()["blocked"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redirects_to_non_public_addresses_are_refused(site, monkeypatch):
+    from backend import local_scrape
+    from backend.scrape_http import close_http_client
+
+    resolve_host = local_scrape.resolve_host
+
+    async def site_is_public(host, port):
+        # Stand in for a public site that redirects into the internal network
+        return ["93.184.216.34"] if host == "127.0.0.1" else await resolve_host(host, port)
+
+    monkeypatch.setattr(local_scrape, "resolve_host", site_is_public)
+    local = LocalScraper(workers=0)
+    try:
+        result, reason = await local.scrape({"url": site.url("/redirect?to=http://169.254.169.254/latest/meta-data/")})
+        followed, _ = await local.scrape({"url": site.url("/redirect?to=/article/2")})
+    finally:
+        await close_http_client()
+
+    assert reason == "blocked_address"
+    assert "169.254.169.254" in result["error"]
+    assert site.requests == 3
+    assert followed["data"]["metadata"]["url"] == site.url("/article/2")
@@ -0,0 +1,43 @@
+import logging
+
+from backend.metrics import Histogram, Registry, RequestTimer
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("stage_seconds", "Stage time", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="llm")
+    histogram.observe(0.5, stage="llm")
+    histogram.observe(5, stage="llm")
+    registry.counter("requests_total", "Requests").inc()
+
+    text = registry.render()
+
+    assert "# TYPE stage_seconds histogram" in text
+    assert 'stage_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="llm",le="1"} 2' in text
+    assert 'stage_seconds_bucket{stage="llm",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="llm"} 3' in text
+    assert "requests_total 1" in text
+
+
+def test_snapshot_round_trip_adds_process_labels():
+    histogram = Histogram("scrape_seconds", "Scrape time", ["outcome"], buckets=(1.0,))
+    histogram.observe(0.5, outcome="2xx")
+
+    copy = Histogram.from_snapshot(histogram.snapshot())
+    text = Registry().render([({"server": "0"}, copy)])
+
+    assert 'scrape_seconds_count{outcome="2xx",server="0"} 1' in text
+
+
+def test_slow_requests_log_their_stage_breakdown(caplog):
+    timer = RequestTimer(slow_threshold=0.000001)
+    with timer.stage("llm_first"):
+        pass
+
+    with caplog.at_level(logging.WARNING):
+        timer.finish("direct")
+
+    assert "Slow chat request" in caplog.text
+    assert '"stage": "llm_first"' in caplog.text
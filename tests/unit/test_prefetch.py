@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from backend.prefetch import PREFETCHES, ScrapePrefetch, prefetchable
+
+
+def recording_call(delay: float = 0.05):
+    calls = []
+
+    async def call(tool_name, arguments, **kwargs):
+        calls.append((tool_name, arguments))
+        await asyncio.sleep(delay)
+        return f"content of {arguments.get('url') or arguments.get('urls')}"
+
+    return call, calls
+
+
+def test_only_default_scrape_url_calls_are_prefetchable():
+    assert prefetchable("scrape_url", {"url": "https://Example.com/a"}) == "https://example.com/a"
+    assert prefetchable("scrape_url", {"url": "https://example.com/a", "only_main_content": True}) is not None
+    assert prefetchable("scrape_url", {"url": "https://example.com/a", "get_full_content": False}) is None
+    assert prefetchable("scrape_url", {"url": "https://example.com/a", "force_refresh": True}) is None
+    assert prefetchable("scrape_advanced", {"url": "https://example.com/a"}) is None
+
+
+@pytest.mark.asyncio
+async def test_matching_tool_call_reuses_the_running_scrape():
+    call, calls = recording_call()
+    prefetch = ScrapePrefetch(call, ["https://example.com/a"])
+    prefetch.start()
+    hits = PREFETCHES.value(outcome="hit")
+
+    result = await prefetch.claim_call("scrape_url", {"url": "https://example.com/a"})
+
+    assert result == "content of https://example.com/a"
+    assert calls == [("scrape_url", {"url": "https://example.com/a"})]
+    assert PREFETCHES.value(outcome="hit") - hits == 1
+
+    # Claimed once; a second identical call scrapes again
+    await prefetch.claim_call("scrape_url", {"url": "https://example.com/a"})
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_unclaimed_prefetches_are_cancelled():
+    call, calls = recording_call(delay=10)
+    prefetch = ScrapePrefetch(call, ["https://example.com/a", "https://example.com/b"])
+    prefetch.start()
+    await asyncio.sleep(0)
+    unused = PREFETCHES.value(outcome="unused")
+
+    assert prefetch.claim("scrape_url", {"url": "https://example.com/c"}) is None
+    await asyncio.wait_for(prefetch.aclose(), 1)
+
+    assert len(calls) == 2
+    assert PREFETCHES.value(outcome="unused") - unused == 2
+
+
+def test_messages_with_too_many_urls_are_not_prefetched():
+    call, _ = recording_call()
+    urls = [f"https://example.com/{i}" for i in range(3)]
+
+    assert ScrapePrefetch(call, urls, limit=2).urls == {}
+    assert list(ScrapePrefetch(call, urls + urls[:1], limit=3).urls) == urls
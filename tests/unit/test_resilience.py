@@ -0,0 +1,52 @@
+from backend.resilience import CircuitBreaker, LatencyTracker, backoff_delay
+
+
+def test_breaker_opens_fails_fast_and_probes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("backend.resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure("HTTP 502")
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow()          # the single half-open probe
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats()["rejected"] == 2
+
+
+def test_failed_probe_reopens_breaker(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("backend.resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure("timeout")
+
+    now[0] += 10
+    assert breaker.allow()
+    breaker.record_failure("timeout")
+
+    assert breaker.state == "open"
+    assert breaker.retry_after() == 10
+    assert breaker.times_opened == 2
+
+
+def test_adaptive_timeout_tracks_latency():
+    tracker = LatencyTracker(min_samples=5, multiplier=3, min_timeout=1, max_timeout=30)
+    assert tracker.timeout_for("example.com") == 30
+
+    for _ in range(5):
+        tracker.observe("example.com", 0.5)
+    assert tracker.timeout_for("example.com") == 1.5
+
+    for _ in range(5):
+        tracker.observe("slow.example.com", 20)
+    assert tracker.timeout_for("slow.example.com") == 30
+
+
+def test_backoff_is_capped():
+    assert all(0 <= backoff_delay(attempt, 0.25, 2) <= 2 for attempt in range(10))
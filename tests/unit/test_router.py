@@ -0,0 +1,60 @@
+import pytest
+from backend.router import SAVED_SECONDS, ScrapeRouter
+
+TOOLS = [{"type": "function", "function": {"name": name}} for name in ("scrape_url", "scrape_many", "crawl_site")]
+
+
+@pytest.mark.parametrize("message", [
+    "Summarize https://example.com/post",
+    "https://example.com/post",
+    "What are the key points of https://example.com/post?",
+    "Can you analyze this article: https://example.com/post.",
+])
+def test_routes_simple_single_url_requests(message):
+    route = ScrapeRouter().decide(message, TOOLS, [])
+
+    assert route == {"tool": "scrape_url", "reason": "single_url", "arguments": {"url": "https://example.com/post"}}
+
+
+def test_routes_several_urls_to_one_scrape_many_call():
+    route = ScrapeRouter().decide(
+        "Summarize https://a.example/1, https://b.example/2 and https://a.example/1", TOOLS, []
+    )
+
+    assert route["tool"] == "scrape_many"
+    assert route["arguments"] == {"urls": ["https://a.example/1", "https://b.example/2"]}
+
+
+@pytest.mark.parametrize("message, reason", [
+    ("How do I write a web scraper?", "no_url"),
+    ("Crawl the docs at https://example.com/docs", "needs_model"),
+    ("List the links on https://example.com", "needs_model"),
+    ("Translate https://example.com into French", "no_intent"),
+])
+def test_leaves_ambiguous_requests_to_the_model(message, reason):
+    route = ScrapeRouter().decide(message, TOOLS, [])
+
+    assert route["tool"] is None
+    assert route["reason"] == reason
+
+
+def test_defers_to_earlier_results_and_respects_limits():
+    history = [{"role": "tool", "content": "# Post\nURL: https://example.com/post"}]
+    assert ScrapeRouter().decide("Summarize https://example.com/post", TOOLS, history)["reason"] == "in_history"
+
+    urls = " ".join(f"https://example.com/{i}" for i in range(4))
+    assert ScrapeRouter(max_urls=3).decide(f"Summarize {urls}", TOOLS, [])["reason"] == "too_many_urls"
+    assert ScrapeRouter(enabled=False).decide("Summarize https://example.com", TOOLS, [])["reason"] == "disabled"
+    assert ScrapeRouter().decide("Summarize https://example.com", TOOLS[2:], [])["reason"] == "tool_unavailable"
+
+
+def test_counts_the_selection_time_a_routed_request_skips():
+    router = ScrapeRouter(smoothing=0.5)
+    router.observe_selection(2.0)
+    router.observe_selection(4.0)
+    assert router.selection_seconds == 3.0
+
+    before = SAVED_SECONDS.value()
+    route = router.decide("Summarize https://example.com", TOOLS, [])
+    router.record(route, [{"role": "user", "content": "Summarize https://example.com"}], TOOLS)
+    assert SAVED_SECONDS.value() - before == 3.0
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+from backend.scrape_cache import MemoryLRU, ScrapeCache, cache_key, canonicalize_url
+
+
+def test_canonicalize_url_normalizes_equivalent_spellings():
+    assert canonicalize_url("HTTPS://Example.COM:443/docs?b=2&a=1&utm_source=x#intro") == \
+        "https://example.com/docs?a=1&b=2"
+    assert canonicalize_url("http://example.com") == "http://example.com/"
+    assert canonicalize_url("http://example.com:8080/x") == "http://example.com:8080/x"
+
+
+def test_cache_key_depends_on_scrape_options():
+    base = {"url": "https://example.com/", "formats": ["markdown", "html"], "onlyMainContent": True}
+    reordered = {"url": "https://EXAMPLE.com", "formats": ["html", "markdown"], "onlyMainContent": True}
+    mobile = dict(base, mobile=True)
+
+    assert cache_key(base) == cache_key(reordered)
+    assert cache_key(base) != cache_key(mobile)
+
+
+def test_memory_lru_evicts_least_recently_used_by_size():
+    lru = MemoryLRU(max_bytes=100)
+    expires = time.time() + 60
+    lru.set("a", "A", 40, expires)
+    lru.set("b", "B", 40, expires)
+    lru.get("a")
+    lru.set("c", "C", 40, expires)
+
+    assert lru.get("b") is None
+    assert lru.get("a")[0] == "A"
+    assert lru.bytes == 80
+    assert lru.evictions == 1
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_restart(tmp_path):
+    result = {"success": True, "data": {"markdown": "# Hello" * 100}}
+    cache = ScrapeCache(disk_dir=str(tmp_path))
+    await cache.set("k", result)
+
+    restarted = ScrapeCache(disk_dir=str(tmp_path))
+    assert await restarted.get("k") == result
+    assert restarted.disk_hits == 1
+    assert await restarted.get("k") == result
+    assert restarted.memory_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_their_ttl(tmp_path):
+    cache = ScrapeCache(disk_dir=str(tmp_path))
+    await cache.set("k", {"success": True}, ttl=-1)
+
+    assert await cache.get("k") is None
+    assert cache.misses == 1
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from backend import scrape_http
+from backend.scrape_http import PoolStats, close_http_client, get_http_client
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "benchmarks"))
+from fake_services import FakeSite  # noqa: E402
+
+
+@pytest.fixture
+def site():
+    site = FakeSite(latency=0.05).start()
+    yield site
+    site.stop()
+
+
+async def get(url, stats):
+    trace, done = stats.request_trace()
+    try:
+        response = await get_http_client().get(url, extensions={"trace": trace})
+        return response.status_code
+    finally:
+        done()
+
+
+@pytest.mark.asyncio
+async def test_the_pooled_client_is_shared_until_closed():
+    client = get_http_client()
+    try:
+        assert get_http_client() is client
+    finally:
+        await close_http_client()
+
+    assert client.is_closed
+    replacement = get_http_client()
+    try:
+        assert replacement is not client
+    finally:
+        await close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_sequential_requests_reuse_one_kept_alive_connection(site):
+    stats = PoolStats()
+    try:
+        for i in range(3):
+            assert await get(site.url(f"/article/{i}?size_kb=1"), stats) == 200
+    finally:
+        await close_http_client()
+
+    snapshot = stats.snapshot()
+    assert snapshot["requests"] == 3
+    assert snapshot["connections_opened"] == 1
+    assert snapshot["connections_reused"] == 2
+    assert snapshot["in_flight"] == 0 and snapshot["waiting"] == 0
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_the_pool_limit_are_counted_as_waiting(site, monkeypatch):
+    monkeypatch.setattr(scrape_http, "MAX_CONNECTIONS", 1)
+    await close_http_client()
+    stats = PoolStats()
+    try:
+        statuses = await asyncio.gather(*(get(site.url(f"/article/{i}?size_kb=1"), stats) for i in range(3)))
+    finally:
+        await close_http_client()
+
+    assert statuses == [200, 200, 200]
+    snapshot = stats.snapshot()
+    assert snapshot["peak_waiting"] == 3
+    assert snapshot["connections_opened"] == 1
+    assert snapshot["connections_reused"] == 2
+    assert snapshot["in_flight"] == 0 and snapshot["waiting"] == 0
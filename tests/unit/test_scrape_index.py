@@ -0,0 +1,75 @@
+import pytest
+from backend.scrape_index import ScrapeIndex, chunk_markdown, match_expression
+
+RELEASES = """# Release notes
+
+Version 1.3 adds streaming responses to the chat endpoint.
+
+## Installation
+
+Install the package with pip and set the API key in the environment.
+
+## Pricing
+
+The free tier allows one hundred requests per day; paid plans start at ten dollars."""
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ScrapeIndex(str(tmp_path / "index.sqlite3"), chunk_chars=200)
+    yield index
+    index.close()
+
+
+def test_chunks_follow_headings_and_size():
+    chunks = chunk_markdown(RELEASES, max_chars=200)
+
+    assert chunks[0] == "# Release notes\n\nVersion 1.3 adds streaming responses to the chat endpoint."
+    assert chunks[2].startswith("## Pricing\n\nThe free tier")
+
+    long_section = "## Details\n\n" + "\n\n".join(f"Paragraph {i} has some words in it." for i in range(20))
+    chunks = chunk_markdown(long_section, max_chars=120)
+    assert len(chunks) > 1
+    assert all(chunk.startswith("## Details") for chunk in chunks)
+    assert all(len(chunk) <= 120 for chunk in chunks)
+
+
+def test_match_expression_drops_stopwords_and_quotes_words():
+    assert match_expression("What is the price of the PRO plan?") == '"price" OR "pro" OR "plan"'
+    assert match_expression("what is it?") is None
+
+
+def test_search_ranks_matching_passages(index):
+    index.add_page("https://example.com/releases", "Release notes", RELEASES)
+    index.add_page("https://example.com/blog", "Blog", "A post about gardening and tomatoes in the spring.")
+
+    results = index.search("how much does a paid plan cost per day?", top_k=2)
+
+    assert results[0]["url"] == "https://example.com/releases"
+    assert results[0]["content"].startswith("## Pricing")
+    assert results[0]["chunks"] == 3
+    assert index.search("tomatoes", url="https://example.com/releases") == []
+    assert index.search("tomatoes")[0]["title"] == "Blog"
+
+
+def test_pages_are_reindexed_only_when_they_change(index):
+    assert index.add_page("https://example.com/releases", "Release notes", RELEASES) == 3
+    assert index.add_page("https://EXAMPLE.com/releases#top", "Release notes", RELEASES) == 0
+
+    index.add_page("https://example.com/releases", "Release notes", "Version 2.0 removes streaming support.")
+
+    assert index.search("streaming")[0]["content"] == "Version 2.0 removes streaming support."
+    assert index.search("pricing") == []
+    stats = index.stats()
+    assert (stats["pages"], stats["chunks"], stats["pages_unchanged"]) == (1, 1, 1)
+
+
+def test_least_recently_indexed_pages_are_pruned(tmp_path):
+    index = ScrapeIndex(str(tmp_path / "index.sqlite3"), max_pages=2)
+    for name in ("alpha", "beta", "gamma"):
+        index.add_page(f"https://example.com/{name}", name, f"The {name} page talks about {name} things.")
+
+    assert index.search("alpha") == []
+    assert [r["title"] for r in index.search("gamma")] == ["gamma"]
+    assert index.stats()["pages_pruned"] == 1
+    index.close()
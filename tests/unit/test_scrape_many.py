@@ -0,0 +1,124 @@
+import asyncio
+from urllib.parse import urlsplit
+
+import pytest
+from backend.host_limiter import HostLimiter
+
+
+class FakeScrapes:
+    """Replaces ``fetch_scrape``; tracks calls and how many run at once per host.
+
+    ``outcomes`` maps URLs to a result dict, an exception to raise, or a
+    number of seconds to hang for.
+    """
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.outcomes = {}
+        self.urls = []
+        self.running = {}
+        self.peak = {}
+
+    async def __call__(self, params, use_cache=True, force_refresh=False, ttl=None):
+        url = params["url"]
+        host = urlsplit(url).hostname
+        self.urls.append(url)
+        self.running[host] = self.running.get(host, 0) + 1
+        self.peak[host] = max(self.peak.get(host, 0), self.running[host])
+        try:
+            outcome = self.outcomes.get(url)
+            await asyncio.sleep(outcome if isinstance(outcome, (int, float)) else self.delay)
+            if isinstance(outcome, Exception):
+                raise outcome
+            if isinstance(outcome, dict):
+                return outcome
+            return {"success": True, "data": {"metadata": {"title": f"Page {url}"}, "markdown": f"Text of {url}"}}
+        finally:
+            self.running[host] -= 1
+
+
+@pytest.fixture
+def scrapes(scrape_server, monkeypatch):
+    fake = FakeScrapes()
+    monkeypatch.setattr(scrape_server, "fetch_scrape", fake)
+    monkeypatch.setattr(scrape_server, "host_limiter", HostLimiter(per_host_concurrency=2, min_interval=0))
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_urls_are_deduplicated_on_their_canonical_form(scrape_server, scrapes):
+    result = await scrape_server.scrape_many([
+        "https://Example.com/a#intro", "https://example.com/b", "https://example.com:443/a", "https://example.com/b"
+    ])
+
+    assert scrapes.urls == ["https://Example.com/a#intro", "https://example.com/b"]
+    assert result.startswith("# Scraped 2 of 2 pages")
+
+
+@pytest.mark.asyncio
+async def test_failed_and_timed_out_pages_are_reported_alongside_the_rest(scrape_server, scrapes, monkeypatch):
+    monkeypatch.setattr(scrape_server, "SCRAPE_MANY_TIMEOUT", 0.3)
+    scrapes.outcomes.update({
+        "https://one.example.com/error": {"success": False, "error": "HTTP 404"},
+        "https://two.example.com/raises": RuntimeError("connection reset"),
+        "https://three.example.com/hangs": 5,
+    })
+
+    result = await scrape_server.scrape_many([
+        "https://one.example.com/error",
+        "https://ok.example.com/page",
+        "https://two.example.com/raises",
+        "https://three.example.com/hangs",
+    ])
+
+    assert result.startswith("# Scraped 1 of 4 pages")
+    assert "## [1] Page https://ok.example.com/page" in result
+    assert "- https://one.example.com/error: HTTP 404" in result
+    assert "- https://two.example.com/raises: connection reset" in result
+    assert "- https://three.example.com/hangs: timed out after 0 seconds" in result
+
+
+@pytest.mark.asyncio
+async def test_scrape_many_keeps_to_the_per_host_limit(scrape_server, scrapes):
+    urls = [f"https://busy.example.com/{i}" for i in range(6)] + ["https://other.example.com/a", "https://other.example.com/b"]
+
+    result = await scrape_server.scrape_many(urls)
+
+    assert result.startswith("# Scraped 8 of 8 pages")
+    assert scrapes.peak == {"busy.example.com": 2, "other.example.com": 2}
+
+
+
+@pytest.mark.asyncio
+async def test_a_saturated_host_does_not_hold_up_the_others(scrape_server, scrapes, monkeypatch):
+    monkeypatch.setattr(scrape_server, "SCRAPE_MANY_CONCURRENCY", 3)
+    monkeypatch.setattr(scrape_server, "host_limiter", HostLimiter(per_host_concurrency=1, min_interval=0))
+    busy = [f"https://busy.example.com/{i}" for i in range(4)]
+    scrapes.outcomes.update({url: 0.2 for url in busy})
+    others = ["https://one.example.com/a", "https://two.example.com/a", "https://one.example.com/b"]
+
+    result = await scrape_server.scrape_many(busy + others)
+
+    assert result.startswith("# Scraped 7 of 7 pages")
+    # Every other page is scraped while the busy host works through its first page
+    assert scrapes.urls[:len(others) + 1] == [busy[0]] + others
+    assert scrapes.peak["busy.example.com"] == 1
+
+@pytest.mark.asyncio
+async def test_host_limiter_spaces_out_request_starts_per_host():
+    limiter = HostLimiter(per_host_concurrency=4, min_interval=0.05)
+    loop = asyncio.get_running_loop()
+    starts = {}
+
+    async def request(url):
+        async with limiter.slot(url):
+            starts.setdefault(urlsplit(url).hostname, []).append(loop.time())
+
+    await asyncio.gather(*(request(f"https://{host}.example.com/{i}") for host in ("a", "b") for i in range(3)))
+
+    for times in starts.values():
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        assert all(gap >= 0.045 for gap in gaps)
+    # Hosts do not wait for each other
+    assert abs(starts["a.example.com"][0] - starts["b.example.com"][0]) < 0.03
+    assert limiter.stats() == {"hosts_seen": 2}
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from backend.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+
+    async def scrape():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"success": True}
+
+    results = await asyncio.gather(*(flight.do("k", scrape) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert all(result == {"success": True} for result in results)
+    assert flight.stats() == {"leaders": 1, "coalesced": 4, "cancelled": 0, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def scrape():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*(flight.do("k", scrape) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_call_is_cancelled_only_when_all_waiters_leave():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def scrape():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    first = asyncio.ensure_future(flight.do("k", scrape))
+    second = asyncio.ensure_future(flight.do("k", scrape))
+    await started.wait()
+
+    first.cancel()
+    await asyncio.sleep(0)
+    assert not cancelled.is_set()
+
+    second.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert flight.stats()["cancelled"] == 1
+    assert flight.stats()["in_flight"] == 0
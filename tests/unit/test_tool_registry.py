@@ -0,0 +1,149 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from backend.tool_registry import ToolRegistry, schema_hash
+
+TOOLS = [{"type": "function", "function": {"name": "scrape_url", "description": "", "parameters": {}}}]
+
+
+@pytest.mark.asyncio
+async def test_registry_caches_after_first_load(tmp_path):
+    """Only the first lookup should reach the server"""
+    source = tmp_path / "server.py"
+    source.write_text("v1")
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return TOOLS
+
+    registry = ToolRegistry(loader, str(source), ttl=300)
+    assert await registry.get() == TOOLS
+    assert await registry.get() == TOOLS
+
+    assert len(calls) == 1
+    assert registry.misses == 1
+    assert registry.hits == 1
+    assert registry.version == 1
+    assert registry.schema_hash == schema_hash(TOOLS)
+
+
+@pytest.mark.asyncio
+async def test_registry_refreshes_in_background_when_an_imported_module_changes(tmp_path, monkeypatch):
+    source = tmp_path / "server.py"
+    source.write_text("import json\nfrom helpers import scrape\n")
+    helpers = tmp_path / "helpers.py"
+    helpers.write_text("import cache\n")
+    (tmp_path / "cache.py").write_text("v1")
+    (tmp_path / "unrelated.py").write_text("v1")
+    scheduled = []
+    changed = []
+
+    async def loader():
+        return TOOLS
+
+    registry = ToolRegistry(
+        loader, str(source), ttl=300,
+        spawn=scheduled.append, on_source_change=lambda: changed.append(1)
+    )
+    await registry.get()
+    assert registry.stats()["source_files"] == 3
+
+    monkeypatch.setattr("backend.tool_registry.SOURCE_CHECK_INTERVAL", 0)
+    (tmp_path / "unrelated.py").write_text("v2")
+    assert await registry.get() == TOOLS
+    assert changed == [] and scheduled == []
+
+    # A touch alone is not a change
+    os.utime(tmp_path / "cache.py", (1, 1))
+    assert await registry.get() == TOOLS
+    assert changed == []
+
+    (tmp_path / "cache.py").write_text("v2")
+    os.utime(tmp_path / "cache.py", (2, 2))
+    assert await registry.get() == TOOLS
+    assert changed == [1]
+    assert len(scheduled) == 1
+    await scheduled[0]
+    assert registry.refreshes == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_on_a_cold_cache_share_one_load(tmp_path):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return TOOLS
+
+    registry = ToolRegistry(loader, None)
+    results = await asyncio.gather(*(registry.get() for _ in range(10)))
+
+    assert results == [TOOLS] * 10
+    assert len(calls) == 1
+    assert registry.misses == 10
+
+
+def test_callers_on_different_event_loops_share_one_load():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return TOOLS
+
+    registry = ToolRegistry(loader, None)
+    # Flask requests each run their own event loop
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: asyncio.run(registry.get()), range(4)))
+
+    assert results == [TOOLS] * 4
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_a_direct_refresh_does_not_let_a_second_background_refresh_start():
+    release = asyncio.Event()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        if len(calls) == 2:
+            await release.wait()
+        return TOOLS
+
+    scheduled = []
+    registry = ToolRegistry(loader, None, spawn=lambda coro: scheduled.append(asyncio.ensure_future(coro)))
+    await registry.get()
+
+    registry.schedule_refresh()
+    await asyncio.sleep(0)
+    await registry.refresh()
+    registry.schedule_refresh()
+    assert len(scheduled) == 1
+
+    release.set()
+    await scheduled[0]
+    registry.schedule_refresh()
+    assert len(scheduled) == 2
+    await scheduled[1]
+
+
+@pytest.mark.asyncio
+async def test_registry_keeps_last_good_tools_on_failure(tmp_path):
+    source = tmp_path / "server.py"
+    source.write_text("v1")
+    results = [TOOLS]
+
+    async def loader():
+        if not results:
+            raise RuntimeError("server down")
+        return results.pop()
+
+    registry = ToolRegistry(loader, str(source))
+    await registry.get()
+    assert await registry.refresh() == TOOLS
+    assert registry.last_error == "server down"
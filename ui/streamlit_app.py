@@ -1,7 +1,9 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
+import uuid
 from datetime import datetime
 
 # Page configuration - MUST be first Streamlit command
@@ -159,12 +161,49 @@ st.markdown("""
 
 # Backend configuration
 BACKEND_URL = "http://localhost:9000"
+HISTORY_PAGE_SIZE = 20  # chat messages rendered per page of history
+JOB_WAIT_SECONDS = 300  # stop following a chat job after this long
+JOB_MAX_RECONNECTS = 10  # event streams that may drop before giving up
+
+
+@st.cache_resource
+def backend_session() -> requests.Session:
+    """One pooled HTTP session shared by every rerun and browser tab"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_backend_status() -> bool:
+    """Backend health, checked at most every 10 seconds so a slow backend cannot stall reruns"""
+    try:
+        return backend_session().get(f"{BACKEND_URL}/health", timeout=2).status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+
+@st.cache_data(ttl=600, max_entries=200, show_spinner=False)
+def fetch_tool_results(job_id: str) -> str:
+    """Tool output of a finished job; only fetched when its details are opened"""
+    response = backend_session().get(f"{BACKEND_URL}/jobs/{job_id}", timeout=10)
+    response.raise_for_status()
+    return (response.json().get("result") or {}).get("tool_results", "")
+
 
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "session_start_time" not in st.session_state:
     st.session_state.session_start_time = datetime.now()
+# The backend keeps this conversation's history under this id
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+# How many pages of history are shown, newest first
+if "history_pages" not in st.session_state:
+    st.session_state.history_pages = 1
 
 # Sidebar with professional layout
 with st.sidebar:
@@ -173,13 +212,8 @@ with st.sidebar:
     # System Status
     st.markdown("### 🔧 System Status")
     
-    # Backend health check
-    backend_status = False
-    try:
-        health_response = requests.get(f"{BACKEND_URL}/health", timeout=5)
-        backend_status = health_response.status_code == 200
-    except:
-        backend_status = False
+    # Backend health check (cached briefly)
+    backend_status = fetch_backend_status()
     
     status_class = "status-online" if backend_status else "status-offline"
     status_text = "Online" if backend_status else "Offline"
@@ -217,12 +251,19 @@ with st.sidebar:
     col1, col2 = st.columns(2)
     with col1:
         if st.button("🧹 Clear Chat", use_container_width=True):
+            try:
+                backend_session().delete(f"{BACKEND_URL}/sessions/{st.session_state.session_id}", timeout=5)
+            except requests.exceptions.RequestException:
+                pass  # a fresh id below starts a new history anyway
             st.session_state.messages = []
+            st.session_state.session_id = uuid.uuid4().hex
             st.session_state.session_start_time = datetime.now()
+            st.session_state.history_pages = 1
             st.rerun()
     
     with col2:
         if st.button("🔄 Refresh Status", use_container_width=True):
+            fetch_backend_status.clear()
             st.rerun()
     
     # Debug Tools (collapsible)
@@ -230,7 +271,7 @@ with st.sidebar:
         if st.button("Test MCP Connection"):
             with st.spinner("Testing MCP..."):
                 try:
-                    debug_response = requests.get(f"{BACKEND_URL}/debug/mcp", timeout=10)
+                    debug_response = backend_session().get(f"{BACKEND_URL}/debug/mcp", timeout=10)
                     if debug_response.status_code == 200:
                         result = debug_response.json()
                         if result.get("status") == "success":
@@ -246,7 +287,7 @@ with st.sidebar:
         if st.button("Test Together AI"):
             with st.spinner("Testing Together AI..."):
                 try:
-                    debug_response = requests.get(f"{BACKEND_URL}/debug/together", timeout=10)
+                    debug_response = backend_session().get(f"{BACKEND_URL}/debug/together", timeout=10)
                     if debug_response.status_code == 200:
                         result = debug_response.json()
                         st.success("✅ Together AI: Connected")
@@ -273,8 +314,15 @@ with st.sidebar:
 # Main chat interface
 st.markdown("### 💬 Chat Interface")
 
-# Display chat history with professional styling
-for i, message in enumerate(st.session_state.messages):
+# Display the newest pages of chat history; older messages stay unrendered
+messages = st.session_state.messages
+first_shown = max(0, len(messages) - st.session_state.history_pages * HISTORY_PAGE_SIZE)
+if first_shown:
+    if st.button(f"⬆️ Show earlier messages ({first_shown} hidden)", use_container_width=True):
+        st.session_state.history_pages += 1
+        st.rerun()
+
+for i, message in enumerate(messages[first_shown:], start=first_shown):
     if message["role"] == "user":
         st.markdown(f"""
         <div class="chat-message user-message">
@@ -291,8 +339,15 @@ for i, message in enumerate(st.session_state.messages):
         """, unsafe_allow_html=True)
         
         if message.get("tool_used"):
-            with st.expander("🔧 Tool Usage Details", expanded=False):
-                st.code(message.get("tool_results", ""), language="json")
+            # Tool output can be large; fetch it from the job only when asked for
+            if st.toggle("🔧 Tool Usage Details", key=f"tool_details_{i}"):
+                tool_results = message.get("tool_results")
+                if tool_results is None:
+                    try:
+                        tool_results = fetch_tool_results(message["job_id"])
+                    except requests.exceptions.RequestException as e:
+                        tool_results = f"Tool results unavailable: {e}"
+                st.code(tool_results, language="json")
 
 # Chat input with enhanced styling
 st.markdown("### 📝 New Message")
@@ -308,47 +363,113 @@ if st.button("🚀 Send Message", type="primary", use_container_width=True):
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": prompt})
         
-        # Get AI response with enhanced loading
-        with st.spinner("🤖 AI is analyzing your request..."):
-            try:
-                # Call backend
-                response = requests.post(
-                    f"{BACKEND_URL}/chat",
-                    json={"message": prompt},
-                    timeout=60
-                )
+        # Run the chat as a background job and follow its progress events and
+        # reply tokens; a dropped connection resumes from the last event seen
+        status = st.status("🤖 AI is analyzing your request...", expanded=True)
+        response_placeholder = st.empty()
+        try:
+            job_response = backend_session().post(
+                f"{BACKEND_URL}/jobs",
+                json={"message": prompt, "session_id": st.session_state.session_id},
+                timeout=10
+            )
+            if job_response.status_code == 202:
+                job_id = job_response.json()["id"]
+                status.write(f"🗂️ Queued as job `{job_id[:8]}`")
+                result = None
+                ai_response = ""
+                last_seq = 0
+                deadline = time.monotonic() + JOB_WAIT_SECONDS
+                reconnects = 0
+                while result is None and reconnects <= JOB_MAX_RECONNECTS:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        with backend_session().get(
+                            f"{BACKEND_URL}/jobs/{job_id}/events",
+                            params={"after": last_seq},
+                            stream=True,
+                            timeout=(5, min(60, remaining))
+                        ) as response:
+                            response.raise_for_status()
+                            for line in response.iter_lines(decode_unicode=True):
+                                if not line:
+                                    continue
+                                event = json.loads(line)
+                                last_seq = event["seq"]
+                                kind = event.get("event")
+                                
+                                if kind == "restarted":
+                                    # The backend runs an interrupted job again from the start
+                                    status.write("🔁 Job restarted after a backend restart")
+                                    ai_response = ""
+                                    response_placeholder.empty()
+                                elif kind == "tool_selected":
+                                    names = ", ".join(tool["name"] for tool in event["tools"])
+                                    status.write(f"🔧 Selected tools: {names}")
+                                elif kind == "scrape_started":
+                                    status.write(f"🌐 Scraping {event.get('url') or event['tool']}...")
+                                elif kind == "tool_progress":
+                                    total = f"/{event['total']:.0f}" if event.get("total") else ""
+                                    status.update(label=f"{event.get('message') or event['tool']} ({event['progress']:.0f}{total})")
+                                elif kind == "scrape_finished":
+                                    icon = "⚠️" if event.get("error") else "✅"
+                                    status.write(f"{icon} Scrape finished ({event['bytes']:,} bytes)")
+                                elif kind == "token":
+                                    ai_response += event["content"]
+                                    response_placeholder.markdown(ai_response + "▌")
+                                elif kind == "done":
+                                    result = event["result"]
+                    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                            requests.exceptions.ChunkedEncodingError):
+                        status.write("⏳ Still working, reconnecting...")
+                        time.sleep(1)
+                    # Also counts streams that ended without a result
+                    if result is None:
+                        reconnects += 1
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    ai_response = result["response"]
-                    tool_used = result.get("tool_used", False)
-                    tool_results = result.get("tool_results", "")
-                    
-                    # Add to chat history
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": ai_response,
-                        "tool_used": tool_used,
-                        "tool_results": tool_results
-                    })
-                    
-                    st.success("✅ Response received successfully!")
-                    st.rerun()
-                else:
-                    error_msg = f"Error: {response.status_code} - {response.text}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": error_msg
-                    })
-                    
-            except requests.exceptions.RequestException as e:
-                error_msg = f"Connection error: {str(e)}"
+                if result is None:
+                    raise TimeoutError(
+                        f"Job `{job_id[:8]}` did not finish in time; it may still complete "
+                        f"(see {BACKEND_URL}/jobs/{job_id})"
+                    )
+                
+                # Add to chat history; tool output stays on the backend until viewed
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": result.get("response") or ai_response,
+                    "tool_used": result.get("tool_used", False),
+                    "job_id": job_id
+                })
+                
+                status.update(label="✅ Response received successfully!", state="complete", expanded=False)
+                st.rerun()
+            else:
+                error_msg = f"Error: {job_response.status_code} - {job_response.text}"
+                status.update(label="❌ Request failed", state="error")
                 st.error(error_msg)
                 st.session_state.messages.append({
                     "role": "assistant",
                     "content": error_msg
                 })
+                    
+        except requests.exceptions.RequestException as e:
+            error_msg = f"Connection error: {str(e)}"
+            status.update(label="❌ Connection error", state="error")
+            st.error(error_msg)
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": error_msg
+            })
+        except TimeoutError as e:
+            error_msg = str(e)
+            status.update(label="⌛ No response in time", state="error")
+            st.error(error_msg)
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": error_msg
+            })
     else:
         st.warning("Please enter a message before sending.")
 